@@ -93,29 +93,31 @@ ns_wkt = geometry.ExportToWkt()  # Getting a Well-known text representation
 print 'Give me all flights where the track intersects the North Sea Polygon'
 
 # Give me all flights where the track intersects the North Sea Polygon. Now that
-# we have the Geometry in wkt format we can use it to create a sql query that we
-# can send to the spatialite DB.
+# we have the Geometry in wkt format we can pass it to the query method of the
+# DB. The spatial index is used to find the flight tracks whose boundary box
+# overlaps with the polygon, only those are checked in detail.
 
-sql = "SELECT FT.fid FROM flight_tracks FT where "
-sql += "ST_Intersects( GeomFromText('%s'), FT.the_geom) " % (ns_wkt,)
-sql += "ORDER BY FT.fid;" 
-cur = db.conn.cursor()                       # connect
-cur.execute(sql)                             # execute
-fids = [i[0] for i in cur.fetchall()]        # flatten the result
+result = db.flights_intersecting(ns_wkt)
+fids = list(result['fid'])
 
 print ''
 print 'Number of flights that intersect the North Sea: %i' % (len(fids),)
 print ''
 print 'List flights that intersect the North Sea: %s\n' % (','.join(fids),)
 
+# The same query limited to the flights from 2015
+result = db.flights_intersecting(ns_wkt, start='2015-01-01', end='2015-12-31')
+print 'Flights that crossed the North Sea in 2015: %s\n' % (','.join(result['fid']),)
+
 
 # Now that we have all the fids that intersected the North Sea, we want
 # to look at them using google-earth. Spatialite has the capability of
 # formatting the geometries into a kml string (askml)
 
 sql = "SELECT askml(Simplify(FT.the_geom, 0.01)) FROM flight_tracks FT WHERE"
-sql += " FT.fid IN (%s)" % (str(','.join(["'%s'" % fid for fid in fids])))
-cur.execute(sql)
+sql += " FT.fid IN (%s)" % (','.join(['?']*len(fids)))
+cur = db.conn.cursor()
+cur.execute(sql, fids)
 flight_tracks_kml = cur.fetchall()
 
 
@@ -176,17 +178,12 @@ print '\n'*3
 # converted into a dictionary with 'coordinates' being one of the keys
 MAX_HEIGHT = 11000
 print 'TASK: Finding flights exceeding %i m altitude' % (int(MAX_HEIGHT,))
-sql = """SELECT fid, AsGeoJSON(the_geom) from flight_tracks;"""
-cur = db.conn.cursor()                       # connect
-cur.execute(sql)                             # execute
-result = cur.fetchall()
+# The coordinates for all flights are returned as numpy arrays
+tracks = db.get_flight_tracks()
 fid_max_alt_list = []
-for r in result:
-    fid = r[0]
-    # get the coordinates from the geojson
-    coords = np.array(json.loads(r[1])['coordinates'])   
+for fid, coords in tracks.items():
     # the alt coordinate is the 3rd column
-    alt_max = np.nanmax(coords[:,2])                     
+    alt_max = np.nanmax(coords[:,2])
     fid_max_alt_list.append((fid, alt_max))
 
 fids = sorted([i[0] for i in fid_max_alt_list if i[1] > MAX_HEIGHT])
@@ -254,3 +251,38 @@ for year in sorted(dist_dict.keys()):
 print('%7s: %3s' % ('total', total))
 
 #=== End Example 5 ============================================================
+
+#=== Start Example 6 ============================================================
+
+# The same analysis as in Example 5, but the spatial index is used to find the
+# flights first. Only flights whose track came within MAX_DISTANCE of Cranfield
+# are read from the database, which is a lot quicker for a large database.
+# The years without any of those flights are not listed.
+print('TASK: Finding flights that took off in Cranfield in every year (spatial index)')
+lat1, lon1 = Cranfield_Coords
+# The spatial index gives us all the flights that came close to Cranfield;
+# only for those we check where the flight track starts
+result = db.flights_within_distance(lon1, lat1, MAX_DISTANCE)
+tracks = db.get_flight_tracks(list(result['fid']))
+dist_dict = {}
+for fid, date in zip(result['fid'], result['date']):
+    year = date.split('-')[0]
+    dist_dict.setdefault(year, [])
+    coords = tracks[fid]
+    # pull coordinates form the very first array
+    lon2 = coords[0, 0]
+    lat2 = coords[0, 1]
+    dist = calc_distance(lat1, lon1, lat2, lon2)
+    if dist < MAX_DISTANCE:
+        dist_dict[year].append((fid, dist))
+
+# print summary
+total = 0
+# print the number for every year
+for year in sorted(dist_dict.keys()):
+    n = len(dist_dict[year])
+    total += n
+    print('%7s: %3s' % (year, n))
+print('%7s: %3s' % ('total', total))
+
+#=== End Example 6 ============================================================
@@ -10,6 +10,7 @@ when clicked on the Sonde icon.
 """
 
 import datetime
+import io
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
@@ -17,14 +18,16 @@ import netCDF4
 import numpy as np
 import os
 import re
-import shutil
 import sys
-import tempfile
-import zipfile
 import time
 
 import faampy
 from faampy._3rdparty.haversine import points2distance
+from faampy.core.kml_writer import KML_Writer, format_coordinates
+
+
+_ICON_FILE = os.path.join(os.path.dirname(faampy.__file__), '..',
+                          'files', 'icons', 'dropsonde_32x32.png')
 
 
 _KML_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
@@ -91,16 +94,8 @@ class Dropsonde(object):
     def __init__(self):
         self.kmz_filename = None
         self.kmz_path = None
-        # creates directory structure for the kmz
-        self.kmz_tmp_directory = tempfile.mkdtemp()
-        os.mkdir(os.path.join(self.kmz_tmp_directory, 'icons'))
-        os.mkdir(os.path.join(self.kmz_tmp_directory, 'figures'))
-        # copy the dropsonde icon
-        src = os.path.join(os.path.dirname(faampy.__file__), '..',
-                           'files', 'icons', 'dropsonde_32x32.png')
-        dst = os.path.join(self.kmz_tmp_directory, 'icons',
-                           'dropsonde_32x32.png')
-        shutil.copy(src, dst)
+        # the figures are kept in memory and added to the kmz directly
+        self.fig_data = None
 
     def __decdeg2dms__(self, dd):
         """
@@ -110,17 +105,6 @@ class Dropsonde(object):
         deg, mnt = divmod(mnt, 60)
         return deg, mnt, sec
 
-    def __zip__(self):
-        files4zipping = []
-        for root, subFolders, files in os.walk(self.kmz_tmp_directory):
-            for f in files:
-                files4zipping.append(os.path.join(root, f))
-        outfile = os.path.join(self.kmz_path, self.kmz_filename)
-        zip = zipfile.ZipFile(outfile, mode='w')
-        for f in files4zipping:
-            zipname = f[len(self.kmz_tmp_directory) + (len(os.sep)):]
-            zip.write(f, zipname)
-
     def close(self):
         self.ds.close()
 
@@ -132,16 +116,21 @@ class Dropsonde(object):
             self.kmz_path = path
 
     def process(self):
-        self.kml = _KML_HEADER
+        kml = None
         for ncfile in self.FileList:
             self.read(ncfile)
+            if kml is None:
+                kml = KML_Writer(os.path.join(self.kmz_path, self.kmz_filename), header=False)
+                kml.write(_KML_HEADER)
+                kml.add_file('icons/dropsonde_32x32.png', filename=_ICON_FILE)
             self.calc_drift()
             self.create_figure()
             self.create_kml()
+            self.write_kmz(kml)
             self.close()
-        self.kml += _KML_FOOTER
-        self.write_kmz()
-        self.__zip__()
+        if kml is not None:
+            kml.write(_KML_FOOTER)
+            kml.close()
 
     def read(self, file):
         """Wrapper for the netcdf or text file read functions"""
@@ -284,11 +273,7 @@ class Dropsonde(object):
                       "</p> <h3>Profiles</h3>" + \
                       "<img src=" + \
                       '"' + 'figures/' + os.path.basename(self.fig_filename) + '">]]>'
-        lat_lon_alt = ""
-        for i in range(len(self.lat)):
-            lat_lon_alt += '%f,%f,%f\n' % (float(self.lon[i]),
-                                           float(self.lat[i]),
-                                           float(self.alt[i]))
+        lat_lon_alt = format_coordinates(np.column_stack((self.lon, self.lat, self.alt)))
 
         # point feature; location of the icon
         pt_lat = float(self.lat[-1])
@@ -367,19 +352,34 @@ class Dropsonde(object):
         labs = [l.get_label() for l in lines]
         ax2_b.legend(lines, labs, loc='upper right')
 
-        self.fig_filename = os.path.join(self.kmz_tmp_directory,
-                                         'figures', self.id + '.png')
-        plt.savefig(self.fig_filename)
+        self.fig_filename = 'figures/' + self.id + '.png'
+        buf = io.BytesIO()
+        plt.savefig(buf, format='png')
+        self.fig_data = buf.getvalue()
         fig_label = '%s: %s' % (self.__get_fid__(),
                                 self.launch_time.strftime('%Y-%m-%d %H:%M:%SZ'))
         fig.text(0.05, 0.96, fig_label, va='top', ha='left', transform=fig.transFigure)
         fig.canvas.draw()
         return fig
 
-    def write_kml(self):
-        f = open(os.path.join(self.kmz_tmp_directory, 'doc.kml'), 'w')
-        f.write(self.kml)
-        f.close()
+    def write_kmz(self, writer=None):
+        """
+        Writes the placemark and the figure of the current sonde. Without
+        a *writer* a kmz file with just this sonde is created.
+
+        :param writer: open writer, e.g. for a kmz with several sondes
+        :type writer: faampy.core.kml_writer.KML_Writer
+        """
+        kml = writer or KML_Writer(os.path.join(self.kmz_path, self.kmz_filename), header=False)
+        if writer is None:
+            kml.write(_KML_HEADER)
+            kml.add_file('icons/dropsonde_32x32.png', filename=_ICON_FILE)
+        kml.write(self.kml)
+        if self.fig_data is not None:
+            kml.add_file(self.fig_filename, data=self.fig_data)
+        if writer is None:
+            kml.write(_KML_FOOTER)
+            kml.close()
 
     def calc_drift(self):
         start_point = (self.__decdeg2dms__(self.lon[-1]),
@@ -423,8 +423,7 @@ def process(iput, opath):
                 pass
             d.create_figure()
             d.create_kml()
-            d.write_kml()
-            d.__zip__()
+            d.write_kmz()
         except:
             pass
 
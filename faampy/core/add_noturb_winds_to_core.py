@@ -4,6 +4,8 @@ import ctypes
 import netCDF4
 import numpy as np
 
+from faampy.core.calclib import _per_second_, _nanmax_abs_
+
 
 def add_hdg_offset(hdg, hdg_offset):
     """function takes care of angle calculations and substracts 360 if
@@ -68,11 +70,10 @@ def calc_noturb_flag(ds, roll_threshold=None):
     gspd_east_flag = np.max(ds.variables['VELE_GIN_FLAG'], axis=1)
     dit_flag = np.max(ds.variables['TAT_DI_R_FLAG'][:], axis=1)
 
-    #flag all data points 3, that exceed roll_threshold
-    roll_gin = ds.variables['ROLL_GIN'][:]
-    roll_flag = np.where(np.abs(roll_gin) < roll_threshold,
-                         roll_gin*0, 
-                         roll_gin*0+3)
+    #flag all data points 3, that exceed roll_threshold or where the roll
+    #angle is missing
+    roll_gin = _per_second_(ds.variables['ROLL_GIN'][:], _nanmax_abs_)
+    roll_flag = np.where(np.abs(roll_gin) < roll_threshold, 0, 3)
 
     flag_data = np.column_stack((tas_rvsm_flag,
                             hdg_gin_flag,
@@ -121,16 +122,13 @@ def add_var_to_core(ds, u_noturb_data, v_noturb_data, flag_data):
 
 
 def process(ncfile, hdg_offset, tas_scale_factor):
+    # imported here, because the registry uses the functions in this module
+    from faampy.core.derived import get_derived
     ds = netCDF4.Dataset(ncfile, 'a')    
-    u_noturb, v_noturb = calc_noturb_wspd(ds.variables['TAS_RVSM'][:],
-                                  ds.variables['HDG_GIN'][:],
-                                  ds.variables['VELN_GIN'][:],
-                                  ds.variables['VELE_GIN'][:],
-                                  ds.variables['TAT_DI_R'][:],
-                                  hdg_offset=hdg_offset,
-                                  tas_scale_factor=tas_scale_factor)
-    u_noturb = np.mean(u_noturb, axis=1)
-    v_noturb = np.mean(v_noturb, axis=1)
+    u_noturb = get_derived(ds, 'U_NOTURB', hdg_offset=hdg_offset, tas_scale_factor=tas_scale_factor)
+    v_noturb = get_derived(ds, 'V_NOTURB', hdg_offset=hdg_offset, tas_scale_factor=tas_scale_factor)
+    u_noturb = np.where(np.isfinite(u_noturb), u_noturb, -9999.)
+    v_noturb = np.where(np.isfinite(v_noturb), v_noturb, -9999.)
     flag_data = calc_noturb_flag(ds)
     add_var_to_core(ds, u_noturb, v_noturb, flag_data)
     ds.close()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent cache for products that are derived from a core file, like the
+estimated WOW_IND, the datetime64 index or the filtered flight track.
+
+Each core file gets its own directory in the cache, which is named after a
+key built from the file path, size, modification time and a hash of the
+file content. The hash is calculated from the first and last MB of the file,
+which is enough to detect reprocessed files without reading the whole file.
+
+The derived arrays are stored as .npy files and loaded using memory mapping,
+so that only the parts that are accessed are read from disk. The cache has
+a size limit and the least recently used entries are removed first.
+
+>>> from faampy.core.cache import Derived_Cache
+>>> cache = Derived_Cache()
+>>> key = cache.get_key('core_faam_20161130_v004_r0_b991.nc')
+>>> cache.put(key, 'WOW_IND', wow_ind)
+>>> cache.get(key, 'WOW_IND')
+
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import faampy
+
+
+CACHE_PATH = os.path.join(faampy.FAAMPY_DATA_PATH, 'cache')
+
+_HASH_BLOCK_SIZE = 1024*1024
+
+# os.replace does not exist in python 2, where os.rename already replaces
+# the destination on POSIX systems
+_replace_ = getattr(os, 'replace', os.rename)
+
+
+def _dir_size_(path):
+    result = 0
+    for f in os.listdir(path):
+        try:
+            result += os.path.getsize(os.path.join(path, f))
+        except OSError:
+            # temporary file that was renamed by another process
+            pass
+    return result
+
+
+class Derived_Cache(object):
+    """
+    Sidecar cache for derived arrays of core files.
+    """
+
+    def __init__(self, path=None, max_size=500*1024**2):
+        """
+        :param str path: directory for the cache. By default the cache is
+          stored in the faampy data directory
+        :param int max_size: maximum size of the cache in bytes
+        """
+        if not path:
+            path = CACHE_PATH
+        self.path = path
+        self.max_size = max_size
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        # total size of the cache in bytes; it is tracked by put and only
+        # recalculated from the directory when it exceeds the limit. None
+        # means that the size is not known yet
+        self._size = None
+
+    def get_key(self, filename):
+        """
+        Creates the cache key for a file from its path, size, modification
+        time and a hash of the first and last block of the file.
+
+        :param str filename: path to the core file
+        :return: key
+        :rtype: str
+        """
+        filename = os.path.abspath(filename)
+        stat = os.stat(filename)
+        h = hashlib.sha1()
+        h.update(('%s %i %f' % (filename, stat.st_size, stat.st_mtime)).encode('utf-8'))
+        with open(filename, 'rb') as f:
+            h.update(f.read(_HASH_BLOCK_SIZE))
+            if stat.st_size > _HASH_BLOCK_SIZE:
+                f.seek(max(_HASH_BLOCK_SIZE, stat.st_size-_HASH_BLOCK_SIZE))
+                h.update(f.read(_HASH_BLOCK_SIZE))
+        return h.hexdigest()
+
+    def _get_filename_(self, key, name):
+        return os.path.join(self.path, key, '%s.npy' % name)
+
+    def has(self, key, *names):
+        """
+        Checks if all products *names* are cached for *key*
+        """
+        return all([os.path.exists(self._get_filename_(key, name)) for name in names])
+
+    def get(self, key, name):
+        """
+        Returns the memory mapped array or None if it is not in the cache
+
+        :param str key: cache key of the file
+        :param str name: name of the product
+        """
+        filename = self._get_filename_(key, name)
+        if not os.path.exists(filename):
+            return None
+        try:
+            data = np.load(filename, mmap_mode='r')
+        except (IOError, ValueError):
+            # broken entry
+            return None
+        # the modification time of the directory is used for the LRU logic
+        os.utime(os.path.join(self.path, key), None)
+        return data
+
+    def put(self, key, name, data):
+        """
+        Stores an array in the cache
+
+        :param str key: cache key of the file
+        :param str name: name of the product
+        :param data: array
+        :type data: numpy.array
+        """
+        path = os.path.join(self.path, key)
+        if not os.path.exists(path):
+            try:
+                os.makedirs(path)
+            except OSError:
+                # created by another process in the meantime
+                if not os.path.isdir(path):
+                    raise
+        filename = self._get_filename_(key, name)
+        # write to a temporary file first, so that a half written file
+        # is never read. The name is unique, because several processes
+        # may store the same product at the same time
+        fd, tmp_filename = tempfile.mkstemp(dir=path, prefix='.%s.' % name, suffix='.npy')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asarray(data))
+            size = os.path.getsize(tmp_filename)
+            if os.path.exists(filename):
+                size -= os.path.getsize(filename)
+            _replace_(tmp_filename, filename)
+        except:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+        os.utime(path, None)
+        if self._size is None:
+            self._size = self.get_size()
+        else:
+            self._size += size
+        if self._size > self.max_size:
+            self.evict()
+
+    def get_size(self):
+        """
+        Total size of the cache in bytes as found on disk
+        """
+        total = 0
+        for key in os.listdir(self.path):
+            path = os.path.join(self.path, key)
+            if os.path.isdir(path):
+                total += _dir_size_(path)
+        return total
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is smaller
+        than the size limit. The cache directory is scanned, because other
+        processes may have added entries
+        """
+        entries = []
+        for key in os.listdir(self.path):
+            path = os.path.join(self.path, key)
+            if os.path.isdir(path):
+                entries.append((os.path.getmtime(path), _dir_size_(path), path))
+        total = sum([e[1] for e in entries])
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        self._size = total
+
+    def clean(self):
+        """
+        Removes all entries from the cache
+        """
+        for key in os.listdir(self.path):
+            shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+        self._size = 0
@@ -1,3 +1,5 @@
+import warnings
+
 import numpy as np
 
 
@@ -22,6 +24,160 @@ def is_slr(ds, s_ix, e_ix, roll_threshold=1.5, press_threshold=2):
     return result
 
 
+def _rolling_window_(a, window):
+    """
+    Strided view of *a* with one row for every window position; no data
+    are copied
+    """
+    a = np.ascontiguousarray(a)
+    n = a.shape[0]-window+1
+    if n < 1:
+        return np.empty((0, window), dtype=a.dtype)
+    return np.lib.stride_tricks.as_strided(a, shape=(n, window), strides=(a.strides[0], a.strides[0]))
+
+
+def _per_second_(data, func):
+    data = np.array(data, dtype=np.float64)
+    data[data == -9999.] = np.nan
+    if data.ndim == 1:
+        return data
+    # seconds where all samples are NaN are expected
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return func(data, axis=1)
+
+
+def _nanmax_abs_(data, axis=None):
+    return np.nanmax(np.abs(data), axis=axis)
+
+
+def _runs_(mask, min_length=1):
+    """
+    Start and end (exclusive) index of every run of True values that is at
+    least *min_length* long
+    """
+    d = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+    starts = np.where(d == 1)[0]
+    ends = np.where(d == -1)[0]
+    keep = (ends-starts) >= min_length
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+def _close_gaps_(mask, gap):
+    """
+    Sets short runs of False values (shorter than *gap*) to True if they
+    are enclosed by True values
+    """
+    mask = np.array(mask, dtype=bool)
+    if gap < 1:
+        return mask
+    for s, e in _runs_(~mask):
+        if s > 0 and e < mask.size and (e-s) < gap:
+            mask[s:e] = True
+    return mask
+
+
+def segments_to_mask(segments, n):
+    """
+    Converts a list of (start, end) index pairs into a boolean mask
+
+    :param segments: list of (start, end) tuples; end is exclusive
+    :param int n: length of the mask
+    """
+    d = np.zeros(n+1, dtype=np.int32)
+    if segments:
+        se = np.array(segments, dtype=np.int64)
+        np.add.at(d, se[:, 0], 1)
+        np.add.at(d, se[:, 1], -1)
+    return np.cumsum(d[:-1]) > 0
+
+
+def segment_flight(ds, roll_threshold=1.5, press_threshold=2, window=60, min_length=60,
+                   profile_rate=0.25, turn_gap=5):
+    """
+    Segments a whole flight into straight and level runs, turns and
+    profiles in one pass. The checks are the same as in is_slr, but
+    they are applied to a moving window that is shifted second by second.
+
+    A straight and level run consists of all the windows where the roll
+    angle stays within *roll_threshold* and the static pressure changes by
+    less than *press_threshold*. A turn is a period with a roll angle
+    greater than *roll_threshold*. A profile is a period where the mean
+    rate of change of the static pressure over the window is greater than
+    *profile_rate*. Only periods when the aircraft was airborne are used
+    if WOW_IND is available. The static pressure is taken from P9_STAT or,
+    if that is not available, from PS_RVSM. Without a pressure variable the
+    pressure checks are skipped and no profiles are found.
+
+    :param ds: core data
+    :type ds: netCDF4.Dataset or FAAM_Dataset
+    :param float roll_threshold: maximum roll angle in degrees
+    :param float press_threshold: maximum pressure range in mb
+    :param int window: window length in seconds
+    :param int min_length: minimum length of runs and profiles in seconds
+    :param float profile_rate: minimum rate of pressure change for profiles
+      in mb/s
+    :param int turn_gap: turns that are less than turn_gap seconds apart
+      are merged
+    :return: dictionary with the lists of (start, end) index pairs for
+      'slr', 'turn', 'profile' and 'airborne'. The end index is exclusive
+    :rtype: dict
+
+    >>> segments = segment_flight(ds)
+    >>> segments['slr'][:2]
+    Out[1]: [(1865, 2511), (2702, 3444)]
+    """
+    # the missing values (-9999) are replaced before the absolute value is
+    # taken, otherwise they would count as steep turns
+    roll_abs = np.abs(_per_second_(ds.variables['ROLL_GIN'][:], _nanmax_abs_))
+    n = roll_abs.size
+    for name in ('P9_STAT', 'PS_RVSM'):
+        if name in ds.variables:
+            p_stat = np.asarray(ds.variables[name][:], dtype=np.float64)
+            p_min = _per_second_(p_stat, np.nanmin)
+            p_max = _per_second_(p_stat, np.nanmax)
+            p_mean = _per_second_(p_stat, np.nanmean)
+            break
+    else:
+        p_min = p_max = p_mean = np.zeros(n)
+
+    if 'WOW_IND' in ds.variables:
+        airborne = np.asarray(ds.variables['WOW_IND'][:]).ravel()[:n] == 0
+    else:
+        airborne = np.ones(n, dtype=bool)
+    airborne &= np.isfinite(roll_abs) & np.isfinite(p_mean)
+
+    window = int(max(1, min(window, n)))
+    # the checks for every window start position
+    roll_ok = np.nan_to_num(_rolling_window_(roll_abs, window)).max(axis=1) <= roll_threshold
+    press_range = np.nan_to_num(_rolling_window_(p_max, window)).max(axis=1) - \
+                  np.nan_to_num(_rolling_window_(p_min, window)).min(axis=1)
+    # cumulative sum gives the number of airborne seconds in every window
+    c = np.concatenate(([0], np.cumsum(airborne)))
+    airborne_ok = (c[window:]-c[:-window]) == window
+    window_ok = roll_ok & (press_range <= press_threshold) & airborne_ok
+
+    # a second is part of a run if it is covered by at least one good window
+    c = np.concatenate(([0], np.cumsum(window_ok)))
+    covered = np.zeros(n, dtype=bool)
+    ix = np.arange(n)
+    covered[:] = (c[np.minimum(ix+1, window_ok.size)]-c[np.maximum(ix-window+1, 0)]) > 0
+
+    turning = _close_gaps_((np.nan_to_num(roll_abs) > roll_threshold) & airborne, turn_gap)
+
+    rate = np.zeros(n)
+    if n > window:
+        half = window//2
+        p = np.nan_to_num(p_mean)
+        rate[half:n-window+half] = np.abs(p[window:]-p[:-window])/float(window)
+    profiling = (rate > profile_rate) & airborne & ~covered
+
+    return {'slr': _runs_(covered, min_length),
+            'turn': _runs_(turning),
+            'profile': _runs_(profiling, min_length),
+            'airborne': _runs_(airborne)}
+
+
 def calc_flight_level(pressure):
     """
     :param float pressure: air pressure in mb
@@ -52,6 +208,52 @@ def calc_qnh(pressure, height_amsl):
     return qnh
 
 
+def dp2vp(dp, p=[], temp=[], enhance=False):
+    """
+    Convert a dew point to a vapour pressure using the ITS-90 correction
+    of Wexler's formula. Optional enhancement factors for non ideal gas.
+
+    :param dp: dew point in K
+    :param p: air pressure in mb; only needed for the enhancement factors
+    :param temp: air temperature in K; defaults to the dew point
+    :param boolean enhance: apply the enhancement factors
+    :return: vapour pressure in mb
+    """
+    dp = np.atleast_1d(dp)
+    g = np.array([-2.8365744e3, -6.028076559e3, 1.954263612e1, -2.737830188e-2,
+                  1.6261698e-5, 7.0229056e-10, -1.8680009e-13, 2.7150305], dtype='f8')
+    lnes = np.log(dp)*g[7]
+    for i in range(7):
+        lnes = lnes+g[i]*(dp**(i-2.0))
+    vp = np.exp(lnes)/1e2
+    if enhance and len(p) > 0:
+        A = np.array([-1.6302041e-1, 1.8071570e-3, -6.7703064e-6, 8.5813609e-9], dtype='f8')
+        B = np.array([-5.9890467e1, 3.4378043e-1, -7.7326396e-4, 6.3405286e-7], dtype='f8')
+        if len(temp) == 0:
+            temp = dp
+        alpha = np.zeros(dp.shape)
+        beta = np.zeros(dp.shape)
+        for i in range(4):
+            alpha = alpha+(A[i]*(temp**i))
+            beta = beta+(B[i]*(temp**i))
+        beta = np.exp(beta)
+        ef = np.exp(alpha*(1-vp/p)+beta*(p/vp-1))
+        vp = vp*ef
+    return vp
+
+
+def vp2vmr(vp, p):
+    """
+    Convert a vapour pressure to a volume mixing ratio
+
+    :param vp: vapour pressure in mb
+    :param p: air pressure in mb
+    :return: volume mixing ratio
+    """
+    vmr = vp/(p-vp)
+    return vmr
+
+
 testing = False
 if testing:
     print(calc_flight_level(np.array([1000, 900, 800, 700, 400])))
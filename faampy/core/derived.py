@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+"""
+Registry for derived variables.
+
+Derived variables are quantities that are calculated from core variables,
+like the winds from the aircraft instruments (U_NOTURB, V_NOTURB), the
+flight level or the volume mixing ratio from the General Eastern dew point.
+Every derived variable declares its inputs, which can be core variables or
+other derived variables. When a derived variable is requested, its inputs
+are resolved recursively, the result is calculated once and kept for as long
+as the dataset object exists.
+
+Missing values (-9999) and samples with a flag outside 0-3 are set to NaN
+before the calculation. If the inputs have different frequencies the first
+sample of every second is used, i.e. the result is 1Hz.
+
+The registry works with the FAAM_Dataset and the netCDF4.Dataset. For the
+FAAM_Dataset the derived variables are available via item access.
+
+>>> ds = FAAM_Dataset('core_faam_20161130_v004_r0_b991.nc')
+>>> ds['U_NOTURB'].shape
+Out[1]: (37137,)
+>>> from faampy.core.derived import get_derived
+>>> u_bulk = get_derived(ds, 'U_BULK', hdg_offset=0.35)
+
+New variables are added with the register decorator:
+
+>>> @register('TAT_DIFF', ['TAT_DI_R', 'TAT_ND_R'], units='K')
+... def calc_tat_diff(tat_di_r, tat_nd_r):
+...     return tat_di_r-tat_nd_r
+
+"""
+
+import weakref
+
+import numpy as np
+
+from faampy.core import flags
+from faampy.core.add_noturb_winds_to_core import calc_noturb_wspd, correct_tas_rvsm
+from faampy.core.calclib import calc_flight_level, calc_qnh, dp2vp, vp2vmr
+
+
+REGISTRY = {}
+
+_MEMO = weakref.WeakKeyDictionary()
+
+
+class Derived_Variable(object):
+    """
+    Entry in the registry. A function can calculate several variables at
+    once (e.g. the u and v wind component), in which case *names* has more
+    than one entry and the function returns a tuple.
+    """
+
+    def __init__(self, names, inputs, func, options={}, units='', long_name=''):
+        self.names = tuple(names)
+        self.inputs = tuple(inputs)
+        self.func = func
+        self.options = dict(options)
+        self.units = units
+        self.long_name = long_name
+
+    def __call__(self, *args, **options):
+        kwargs = dict(self.options)
+        kwargs.update([(k, v) for k, v in options.items() if k in self.options])
+        result = self.func(*args, **kwargs)
+        if len(self.names) == 1:
+            return (result,)
+        return tuple(result)
+
+
+def register(names, inputs, options={}, units='', long_name=''):
+    """
+    Decorator that adds a function to the registry.
+
+    :param names: name of the derived variable or list of names if the
+      function returns more than one variable
+    :param inputs: list of the input variables; they are passed to the
+      function in the same order
+    :type inputs: list
+    :param options: keyword arguments of the function with their default
+      values, which can be overwritten in get_derived
+    :type options: dict
+    :param str units: units of the result
+    :param str long_name: description of the result
+    """
+    if isinstance(names, str):
+        names = [names, ]
+
+    def decorator(func):
+        entry = Derived_Variable(names, inputs, func, options=options, units=units, long_name=long_name)
+        for name in entry.names:
+            REGISTRY[name] = entry
+        return func
+    return decorator
+
+
+def _common_rate_(arrays):
+    """
+    Brings arrays with different frequencies to 1Hz using the first sample
+    of every second
+    """
+    shapes = set([a.shape for a in arrays])
+    if len(shapes) == 1:
+        return arrays
+    result = []
+    for a in arrays:
+        if a.ndim > 1:
+            a = a[:, 0]
+        result.append(a)
+    return result
+
+
+def _get_options_(name, options, seen=None):
+    """
+    Options that are relevant for *name* and its dependencies; used as part
+    of the key for the memo
+    """
+    if seen is None:
+        seen = set()
+    if name not in REGISTRY or name in seen:
+        return set()
+    seen.add(name)
+    entry = REGISTRY[name]
+    result = set([k for k in entry.options if k in options])
+    for inp in entry.inputs:
+        result.update(_get_options_(inp, options, seen))
+    return result
+
+
+def _is_available_(ds, name, stack=()):
+    if name in REGISTRY and name not in stack:
+        return all([_is_available_(ds, inp, stack+(name,)) for inp in REGISTRY[name].inputs])
+    return name in ds.variables
+
+
+def available(ds):
+    """
+    Returns the names of all derived variables that can be calculated from
+    the variables in the dataset
+    """
+    return sorted([name for name in REGISTRY if _is_available_(ds, name)])
+
+
+def _resolve_(ds, name, options, memo, stack):
+    key = (name, tuple(sorted([(k, options[k]) for k in _get_options_(name, options)])))
+    if key in memo:
+        return memo[key]
+    if name not in REGISTRY:
+        raise KeyError('%s is neither a variable in the dataset nor a derived variable' % name)
+    if name in stack:
+        raise ValueError('Circular dependency: %s' % ' -> '.join(stack+(name,)))
+    entry = REGISTRY[name]
+    stack = stack+(name,)
+
+    # core variables are read in one go
+    raw = [inp for inp in entry.inputs if inp not in REGISTRY]
+    missing = [inp for inp in raw if inp not in ds.variables]
+    if missing:
+        raise KeyError('%s requires %s' % (name, ', '.join(missing)))
+    data = flags.get_masked(ds, raw, fill='nan')
+    args = []
+    for inp in entry.inputs:
+        if inp in data:
+            args.append(np.asarray(data[inp], dtype=np.float64))
+        else:
+            args.append(_resolve_(ds, inp, options, memo, stack))
+    result = entry(*_common_rate_(args), **options)
+    for n, value in zip(entry.names, result):
+        memo[(n, key[1])] = value
+    return memo[key]
+
+
+def get_derived(ds, name, **options):
+    """
+    Calculates a derived variable. The result is memoised for the dataset,
+    so that it is only calculated once.
+
+    :param ds: core data
+    :type ds: FAAM_Dataset or netCDF4.Dataset
+    :param str name: name of the derived variable
+    :param options: options for the calculation, e.g. hdg_offset
+    :return: derived variable
+    :rtype: numpy.array
+    """
+    if ds not in _MEMO:
+        _MEMO[ds] = {}
+    return _resolve_(ds, name, options, _MEMO[ds], ())
+
+
+def clear(ds):
+    """
+    Removes all memoised derived variables for a dataset
+    """
+    _MEMO.pop(ds, None)
+
+
+@register(['U_BULK', 'V_BULK'],
+          ['TAS_RVSM', 'HDG_GIN', 'VELN_GIN', 'VELE_GIN', 'TAT_DI_R'],
+          options={'hdg_offset': None, 'tas_scale_factor': None},
+          units='m s-1',
+          long_name='Wind components derived from aircraft instruments and GIN at full frequency')
+def _calc_bulk_wind_(tas_rvsm, hdg_gin, veln_gin, vele_gin, tat_di_r, hdg_offset=None, tas_scale_factor=None):
+    return calc_noturb_wspd(tas_rvsm, hdg_gin, veln_gin, vele_gin, tat_di_r,
+                            hdg_offset=hdg_offset, tas_scale_factor=tas_scale_factor)
+
+
+@register(['U_NOTURB', 'V_NOTURB'],
+          ['U_BULK', 'V_BULK'],
+          units='m s-1',
+          long_name='Wind components derived from aircraft instruments and GIN')
+def _calc_noturb_wind_(u_bulk, v_bulk):
+    if u_bulk.ndim == 1:
+        return (u_bulk, v_bulk)
+    return (np.nanmean(u_bulk, axis=1), np.nanmean(v_bulk, axis=1))
+
+
+@register('WSPD_NOTURB', ['U_NOTURB', 'V_NOTURB'], units='m s-1',
+          long_name='Horizontal wind speed derived from aircraft instruments and GIN')
+def _calc_wspd_noturb_(u, v):
+    return np.hypot(u, v)
+
+
+@register('TAS_RVSM_CORR', ['TAS_RVSM', 'TAT_DI_R'], options={'tas_scale_factor': None},
+          units='m s-1', long_name='True air speed corrected for temperature effects')
+def _calc_tas_rvsm_corr_(tas_rvsm, tat_di_r, tas_scale_factor=None):
+    return correct_tas_rvsm(tas_rvsm, tat_di_r, tas_scale_factor=tas_scale_factor)
+
+
+@register('FLIGHT_LEVEL', ['PS_RVSM'], units='1',
+          long_name='Flight level from the static pressure of the RVSM system')
+def _calc_flight_level_(ps_rvsm):
+    result = np.empty(ps_rvsm.shape)
+    result.fill(np.nan)
+    ix = np.isfinite(ps_rvsm)
+    result[ix] = calc_flight_level(ps_rvsm[ix])
+    return result
+
+
+@register('QNH', ['PS_RVSM', 'ALT_GIN'], units='hPa',
+          long_name='QNH from the static pressure and the GIN altitude')
+def _calc_qnh_(ps_rvsm, alt_gin):
+    return calc_qnh(ps_rvsm, alt_gin)
+
+
+@register('VP_GE', ['TDEW_GE'], units='hPa',
+          long_name='Water vapour pressure from the General Eastern dew point')
+def _calc_vp_ge_(tdew_ge):
+    return dp2vp(tdew_ge).reshape(tdew_ge.shape)
+
+
+@register('VMR_GE', ['VP_GE', 'PS_RVSM'], units='ppmv',
+          long_name='Water vapour volume mixing ratio from the General Eastern dew point')
+def _calc_vmr_ge_(vp_ge, ps_rvsm):
+    return vp2vmr(vp_ge, ps_rvsm)*1E6
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+"""
+The FAAM_Campaign class presents many FAAM core files as one dataset along
+the time axis. It is the FAAM version of xarray's open_mfdataset.
+
+When the campaign is created only the headers of the files are read. Data
+are read when they are requested and only from the files that overlap with
+the selected time period. The variable names are reconciled in the same
+way as in FAAM_Dataset, i.e. old names like 'PARA0515' are translated.
+
+Because the frequency of a variable can differ between flights, all
+variables are resampled to a common frequency (1Hz by default) before they
+are concatenated.
+
+>>> from faampy.core.faam_campaign import open_many
+>>> fc = open_many('/mnt/faamarchive/badcMirror/data/2015/')
+>>> print(fc.fids[:3])
+['b893', 'b894', 'b895']
+>>> df = fc.as_dataframe(['CO_AERO', 'O3_TECO'], start='2015-03-01', end='2015-04-01', max_flag=0)
+
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from faampy.core.faam_data import FAAM_Dataset, scan_metadata
+
+
+def _to_datetime64_(t):
+    if t is None:
+        return None
+    return np.datetime64(t, 's')
+
+
+class FAAM_Campaign(object):
+    """
+    Multi-flight dataset built from several core files.
+    """
+
+    def __init__(self, filenames, cache=False, processes=None):
+        """
+        :param filenames: list of core filenames
+        :type filenames: list
+        :param cache: passed on to FAAM_Dataset
+        :param int processes: number of processes for reading the headers
+        """
+        self.cache = cache
+        metadata = scan_metadata(list(filenames), processes=processes)
+        metadata = [md for md in metadata if md.date]
+        self.Metadata = sorted(metadata, key=lambda md: (md.date, md.fid))
+
+    def __len__(self):
+        return len(self.Metadata)
+
+    def __str__(self):
+        output = ''
+        for md in self.Metadata:
+            output += '%s: %s %s\n' % (md.fid, md.date.strftime('%Y-%m-%d'), os.path.basename(md.filename))
+        return output
+
+    @property
+    def fids(self):
+        return [md.fid for md in self.Metadata]
+
+    @property
+    def var_names(self):
+        """
+        Sorted list of all variable names that are available in at least
+        one of the files
+        """
+        result = set()
+        for md in self.Metadata:
+            result.update(md.var_names)
+        return sorted(result)
+
+    def _overlaps_(self, md, start, end):
+        # flights can go past midnight so a flight date covers two days
+        date = np.datetime64(md.date, 's')
+        if start is not None and date+np.timedelta64(2, 'D') <= start:
+            return False
+        if end is not None and date >= end:
+            return False
+        return True
+
+    def select(self, start=None, end=None, fids=[]):
+        """
+        Returns a new campaign with only the files that overlap with the time
+        period and/or have one of the flight ids. No data are read.
+
+        :param start: start of the time period
+        :type start: datetime.datetime, numpy.datetime64 or str
+        :param end: end of the time period
+        :param fids: list of flight ids
+        :type fids: list
+        :rtype: FAAM_Campaign
+        """
+        start, end = _to_datetime64_(start), _to_datetime64_(end)
+        result = FAAM_Campaign([], cache=self.cache)
+        for md in self.Metadata:
+            if fids and md.fid not in fids:
+                continue
+            if self._overlaps_(md, start, end):
+                result.Metadata.append(md)
+        return result
+
+    def iter_datasets(self, start=None, end=None):
+        """
+        Generator that opens the files one after the other and yields the
+        metadata and the FAAM_Dataset. The dataset is closed when the next
+        one is requested.
+        """
+        start, end = _to_datetime64_(start), _to_datetime64_(end)
+        for md in self.Metadata:
+            if not self._overlaps_(md, start, end):
+                continue
+            ds = FAAM_Dataset(md.filename, cache=self.cache)
+            try:
+                yield md, ds
+            finally:
+                ds.close()
+
+    def _get_slice_(self, ds, start, end):
+        index = ds.index
+        s_ix, e_ix = 0, index.size
+        if start is not None:
+            s_ix = int(np.searchsorted(index, start, side='left'))
+        if end is not None:
+            e_ix = int(np.searchsorted(index, end, side='left'))
+        return slice(s_ix, e_ix)
+
+    def get(self, varnames, start=None, end=None, freq=1, how='mean', max_flag=None):
+        """
+        Reads variables from all files that overlap with the time period and
+        concatenates them. Variables that do not exist in a file are filled
+        with NaNs.
+
+        :param varnames: list of variable names
+        :type varnames: list
+        :param start: start of the time period
+        :param end: end of the time period
+        :param freq: frequency of the output, see FAAM_Dataset.resample
+        :param str how: method used for resampling
+        :param int max_flag: samples with a flag greater than max_flag are
+          set to NaN
+        :return: dictionary with the variables, the timestamps ('index') and
+          the flight id for each timestamp ('fid')
+        :rtype: dict
+        """
+        start, end = _to_datetime64_(start), _to_datetime64_(end)
+        chunks = dict([(v, []) for v in varnames])
+        index, fids = [], []
+        for md, ds in self.iter_datasets(start=start, end=end):
+            slc = self._get_slice_(ds, start, end)
+            n = len(range(*slc.indices(ds.index.size)))
+            if not n:
+                continue
+            index.append(np.asarray(ds.index[slc], dtype='datetime64[s]'))
+            fids.append(np.array([md.fid]*n))
+            for v in varnames:
+                if v in ds.variables:
+                    data = ds._resample_chunk_(v, slc, freq, how, max_flag)
+                    if v.endswith('_FLAG'):
+                        data = data.astype(np.float64)
+                        data[data < 0] = np.nan
+                else:
+                    shape = (n,) if freq <= 1 else (n, int(freq))
+                    data = np.empty(shape)
+                    data.fill(np.nan)
+                chunks[v].append(data)
+        if freq < 1:
+            step = int(round(1./freq))
+            index = [i[::step] for i in index]
+            fids = [f[::step] for f in fids]
+        result = {}
+        for v in varnames:
+            if chunks[v]:
+                result[v] = np.concatenate(chunks[v])
+            else:
+                result[v] = np.empty(0)
+        if index:
+            result['index'] = np.concatenate(index)
+            result['fid'] = np.concatenate(fids)
+        else:
+            result['index'] = np.empty(0, dtype='datetime64[s]')
+            result['fid'] = np.empty(0, dtype=str)
+        return result
+
+    def as_dataframe(self, varnames, start=None, end=None, how='mean', max_flag=None):
+        """
+        Returns the variables as one pandas.DataFrame at 1Hz with the
+        timestamp as index and the flight id as extra column 'fid'.
+
+        :param varnames: list of variable names
+        :type varnames: list
+        :param start: start of the time period
+        :param end: end of the time period
+        :param str how: method used for resampling to 1Hz
+        :param int max_flag: samples with a flag greater than max_flag are
+          set to NaN
+        :rtype: pandas.DataFrame
+        """
+        data = self.get(varnames, start=start, end=end, freq=1, how=how, max_flag=max_flag)
+        index = pd.DatetimeIndex(data.pop('index'))
+        columns = dict([(v, data[v]) for v in varnames])
+        columns['fid'] = data['fid']
+        return pd.DataFrame(columns, index=index, columns=['fid', ]+list(varnames))
+
+    def export(self, path, fmt='parquet', varnames=[], max_flag=2, include_flags=True):
+        """
+        Exports all flights into one columnar store, see FAAM_Dataset.export
+
+        :param str path: directory of the store
+        :param str fmt: 'parquet' or 'zarr'
+        :return: list of exported flight ids
+        """
+        result = []
+        for md, ds in self.iter_datasets():
+            sys.stdout.write('Exporting %s ...\n' % md.fid)
+            result.append(ds.export(path, fmt=fmt, varnames=varnames, max_flag=max_flag,
+                                    include_flags=include_flags))
+        return result
+
+
+def open_many(files, cache=False, processes=None):
+    """
+    Opens many core files as one FAAM_Campaign.
+
+    :param files: a directory, which is searched for the latest revisions
+      of the core-hires files, a File_List or a list of filenames
+    :param cache: passed on to FAAM_Dataset
+    :param int processes: number of processes for reading the headers
+    :rtype: FAAM_Campaign
+    """
+    if isinstance(files, str) and os.path.isdir(files):
+        from faampy.utils.file_list import File_List
+        files = File_List(files)
+        files.filter_by_data_type('core-hires')
+        files.filter_latest_revision()
+    if hasattr(files, 'get_filenames'):
+        files = files.get_filenames()
+    return FAAM_Campaign(files, cache=cache, processes=processes)
@@ -5,28 +5,49 @@ The FAAM_Dataset class handles the core_faam*nc files and smoothes out the
 reading process of the data and ensures that older files are read in the same
 way as newer ones. The class copies the behaviour of netCDF4.Dataset class.
 
+Variables are read lazily. Opening a file only reads the header; the data of
+a variable are read (and NaNs replaced by -9999) the first time it is sliced
+and are kept in memory from then on.
+
 A nifty method of the class is the merge method, which allows you to merge data
-from other data sources. The data type that can be merged is a numpy.recarray.
-The index for the procedure is the timestamp, of the FAAM_Dataset.
+from other data sources. The data types that can be merged are numpy.recarray
+and pandas.DataFrame and several of them can be merged in one go. The index
+for the procedure is the timestamp, of the FAAM_Dataset. Data can be matched
+to the nearest timestamp or averaged and merged at 1Hz or higher frequencies.
 Care is taken off gaps in the recarray.
 
 A convenient option is exporting the Dataset into a pandas DataFrame, which
 then gives you all the amazing features of pandas. Due to the fact that pandas
 can not deal with multidimensional arrays, only the first measurement within a
-row is used for the DataFrame.
+row is used for the DataFrame by default. Alternatively the variables can be
+exported at their native frequency into one DataFrame per frequency.
 """
 
-import itertools
 import netCDF4
 import numpy as np
 import datetime
+import multiprocessing
 import os
 import osgeo.ogr
 import pandas as pd
 import re
 import sys
-
-from faampy._3rdparty import rdp             #  Ramer-Douglas-Peucker algorithm (RDP)
+import threading
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from faampy.core.simplify import rdp_mask, local_xyz     #  Ramer-Douglas-Peucker algorithm (RDP)
+from faampy.core.resample import resample_array, resample_flag, _blocks_
+from faampy.core.cache import Derived_Cache
+from faampy.core.faam_store import export_dataset
+from faampy.core.kml_writer import KML_Writer, linestring_to_kml, format_coordinates
+from faampy.core import flags
+from faampy.core.derived import get_derived
+from faampy.core.utils import TimeIndex, variables_to_dataframe, get_fid
+from faampy.utils.file_info import get_fid_from_filename
 
 DEBUG = False
 
@@ -171,12 +192,173 @@ class Translator(dict):
             self[k] = v
 
 
-class Coords(list):
+def get_flight_date(ds):
+    """
+    Gets the flight date from a core file. Over the years the date has been
+    stored in different ways, which are all tried.
+
+    :param ds: core_faam dataset
+    :type ds: netCDF4.Dataset or FAAM_Metadata
+    :return: flight date
+    :rtype: datetime.datetime
+    """
+    if 'Time' in ds.variables.keys():
+        dt = datetime.datetime.strptime(str(ds.variables['Time'].units).strip(), 'seconds since %Y-%m-%d 00:00:00 +0000')
+    elif 'TIME' in ds.variables.keys():
+        dt = datetime.datetime.strptime(str(ds.variables['TIME'].units).strip(), 'seconds since %Y-%m-%d 00:00:00 +0000')
+    elif 'time' in ds.variables.keys():
+        dt = datetime.datetime.strptime(re.findall('\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', ds.variables['time'].units)[0], '%Y-%m-%d 00:00:00')
+    elif hasattr(ds, 'Flight_Date'):
+        dt = datetime.datetime.strptime(ds.Flight_Date, '%d-%b-%y')
+    elif 'PARA0515' in ds.variables.keys():
+        dt = datetime.datetime.strptime(ds.title.split()[-1], '%d-%b-%y')
+    else:
+        dt = datetime.datetime(ds.DATE[2], ds.DATE[1], ds.DATE[0])
+    return dt
+
+
+class Lazy_Variable(object):
+    """
+    Proxy for a netCDF4.Variable that defers reading the data until the
+    variable is sliced for the first time. At this point NaNs are replaced
+    by the fill value and the result is kept, so that the file is read at
+    most once per variable.
+
+    Attributes like *units*, *dimensions* or *datatype* are passed through
+    to the underlying netCDF4.Variable without touching the data.
+
+    Instead of a netCDF4.Variable a *loader* function can be given, which
+    is called without arguments and returns the full data array. This is
+    used for variables that are derived from others (e.g. WOW_IND).
+    """
+
+    def __init__(self, ncvar=None, loader=None, fill_value=-9999.):
+        """
+        :param ncvar: variable from the netCDF4.Dataset
+        :type ncvar: netCDF4.Variable
+        :param loader: function that returns the data array
+        :param float fill_value: value that replaces NaNs
+        """
+        self._ncvar = ncvar
+        self._loader = loader
+        self._fill_value = fill_value
+        self._data = None
+        # number of changes; used to find out if a cached filter mask
+        # is still valid
+        self._version = 0
+
+    def __getattr__(self, name):
+        # only called if the attribute was not found on the proxy itself
+        if name.startswith('_') or self._ncvar is None:
+            raise AttributeError(name)
+        return getattr(self._ncvar, name)
+
+    def _load_(self):
+        if self._data is None:
+            if self._loader:
+                data = np.asarray(self._loader())
+            else:
+                data = np.asarray(self._ncvar[:])
+            if data.dtype.kind == 'f':
+                data[np.isnan(data)] = self._fill_value
+            self._data = data
+        return self._data
+
+    def read(self, key=slice(None)):
+        """
+        Returns the data for *key*. If the variable has not been loaded yet
+        only the requested part is read from the file and it is not kept in
+        memory. This is useful for processing a variable in chunks.
+        """
+        if self._data is not None or self._ncvar is None:
+            return self._load_()[key]
+        data = np.asarray(self._ncvar[key])
+        if data.dtype.kind == 'f':
+            data[np.isnan(data)] = self._fill_value
+        return data
+
+    def is_loaded(self):
+        """
+        Returns True if the data have already been read
+        """
+        return self._data is not None
+
+    @property
+    def shape(self):
+        if self._data is None and self._ncvar is not None:
+            return self._ncvar.shape
+        return self._load_().shape
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def dtype(self):
+        if self._data is None and self._ncvar is not None:
+            return self._ncvar.dtype
+        return self._load_().dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        return self._load_()[key]
 
-    def __init__(self, epsilon=0.01):
-        self.Simple_mask = []
+    def __setitem__(self, key, value):
+        self._load_()[key] = value
+        self._version += 1
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self._load_()
+        return self._load_().astype(dtype)
+
+
+class Coords(object):
+    """
+    Flight track coordinates. The points are stored in an array with shape
+    (n, 3) with the columns longitude, latitude and altitude, together with
+    their timestamps.
+
+    """
+
+    def __init__(self, xyz=None, timestamp=None, epsilon=30.0):
+        """
+        :param xyz: coordinates with shape (n, 3)
+        :type xyz: numpy.array
+        :param timestamp: timestamps for the coordinates
+        :type timestamp: numpy.array of numpy.datetime64
+        :param float epsilon: epsilon for the RDP simplification in metres
+        """
+        if xyz is None:
+            self.xyz = np.empty((0, 3), dtype=np.float64)
+        else:
+            self.xyz = np.asarray(xyz, dtype=np.float64).reshape((-1, 3))
+        if timestamp is not None:
+            timestamp = np.asarray(timestamp)
+        self.timestamp = timestamp
+        self.Simple_mask = None
         self.Epsilon = epsilon
 
+    def __len__(self):
+        return self.xyz.shape[0]
+
+    def __getitem__(self, key):
+        return self.xyz[key]
+
+    def __iter__(self):
+        return iter(map(tuple, self.xyz.tolist()))
+
+    def __bool__(self):
+        return self.__len__() > 0
+
+    __nonzero__ = __bool__
+
     def as_wkt(self, simplified=False, as_type='MULTIPOINT'):
         """
         Returns the coordinates in well-known text format
@@ -188,14 +370,14 @@ class Coords(list):
         if simplified:
             xyz = self.simplified()
         else:
-            xyz = self
+            xyz = self.xyz
 
         if as_type.upper().startswith('LINESTRING'):
-            return "LINESTRINGZ(" + ','.join(['%f %f %f' % tuple(item) for item in xyz]) + ")"
+            return "LINESTRINGZ(" + format_coordinates(xyz, fmt='%f %f %f', sep=',') + ")"
         elif as_type.upper() == 'MULTIPOINT':
-            return "MULTIPOINT(" + ','.join(['%f %f %f' % tuple(item) for item in xyz]) + ")"
+            return "MULTIPOINT(" + format_coordinates(xyz, fmt='%f %f %f', sep=',') + ")"
         elif as_type.upper() == 'POINT':
-            return ["POINT(%f %f %f)" % tuple(item) for item in xyz]
+            return format_coordinates(xyz, fmt='POINT(%f %f %f)', sep='\n').split('\n')
 
     def as_kml(self, simplified=True, extrude=1, tessellate=1):
         """
@@ -206,19 +388,23 @@ class Coords(list):
         if simplified:
             xyz = self.simplified()
         else:
-            xyz=self
-        kml = "<LineString>"
-        kml += "<extrude>"
-        kml += str(extrude)
-        kml += "</extrude>"
-        kml += "<tessellate>"
-        kml += str(tessellate)
-        kml += "</tessellate>"
-        kml +="<coordinates>"
-        kml += '\n'.join(['%f,%f,%f' % tuple(item) for item in xyz])
-        kml +="</coordinates>"
-        kml += "</LineString>"
-        return kml
+            xyz = self.xyz
+        return linestring_to_kml(xyz, extrude=extrude, tessellate=tessellate)
+
+    def as_geojson(self, simplified=False, as_type='LineString'):
+        """
+        Returns the coordinates as GeoJSON geometry
+
+        :param boolean simplified: If set returns a geometry with a reduced
+          number of points
+        :param str as_type: GeoJSON geometry type (LineString or MultiPoint)
+        :return: GeoJSON string
+        """
+        if simplified:
+            xyz = self.simplified()
+        else:
+            xyz = self.xyz
+        return '{"type": "%s", "coordinates": [%s]}' % (as_type, format_coordinates(xyz, fmt='[%f, %f, %f]', sep=', '))
 
     def get_bbox(self):
         """
@@ -227,52 +413,226 @@ class Coords(list):
         :return tuple:  corner coordinates (llcrnrlat, urcrnrlat, llcrnrlon,
           urcrnrlon)
         """
-        x, y, z = zip(self)
-        llcrnrlat = np.nanmin(y)
-        urcrnrlat = np.nanmax(y)
-        llcrnrlon = np.nanmin(x)
-        urcrnrlon = np.nanmax(x)
+        llcrnrlon, llcrnrlat = np.nanmin(self.xyz[:, 0:2], axis=0)
+        urcrnrlon, urcrnrlat = np.nanmax(self.xyz[:, 0:2], axis=0)
         return (llcrnrlat,
                 urcrnrlat,
                 llcrnrlon,
                 urcrnrlon)
 
-    def _simplify_(self, step=10):
+    def _simplify_(self):
         """
         Simplifies the coordinates by reducing the number using the
-        Ramer-Douglas-Peucker algorithm (RDP). The list of coordinates
-        itself is not shrinked, but rather a mask array is produced. If
-        *self.simplified* is called the mask is used as an index.
-
-        :param int step: step size for array slicing. Using only every
-          10th value for example speeds things up considerably.
+        Ramer-Douglas-Peucker algorithm (RDP). The coordinates themselves
+        are not shrinked, but rather a boolean mask array is produced. If
+        *self.simplified* is called the mask is used as an index. The
+        distances are calculated in metres, so that the horizontal and
+        vertical deviation from the simplified track is treated the same.
         """
-
-        xyz = [list(i) for i in self]  # copy the coordinates into a list
-        if not xyz:
-            return
-        # in the case that the first and the last coordinate are identical the
-        # rdp algorithmen fails; a quick pop fixes that
-        while xyz[0] == xyz[-1]:
-            xyz.pop()
-            self.pop()
-        # use only every 10th value to speed things up
-        # TODO: impact should be checked at some point
-        m = rdp.rdp(xyz[::step], epsilon=self.Epsilon, return_mask=True)
-        # flatten = lambda l: [item for sublist in l for item in sublist]
-        m = flatten([[m, ]+(step-1)*[False] for i in m])
-        while len(m) < self.__len__():
-            m.append(False)
-        self.Simple_mask = m
+        self.Simple_mask = rdp_mask(local_xyz(self.xyz), epsilon=self.Epsilon, metric='3d')
         return
 
     def simplified(self):
         """
         Returns the reduced number of coordinates
         """
-        if not self.Simple_mask:
+        if self.Simple_mask is None:
             self._simplify_()
-        return list(itertools.compress(self, self.Simple_mask))
+        return self.xyz[self.Simple_mask]
+
+
+# netCDF4/HDF5 is not thread-safe; header reads from threads go through
+# this lock. scan_metadata uses processes instead
+_NETCDF_LOCK = threading.Lock()
+
+
+class Variable_Info(object):
+    """
+    Header information of a netCDF variable without any data. The variable
+    attributes are available as attributes of the object, e.g. *units*.
+    """
+
+    def __init__(self, ncvar):
+        """
+        :param ncvar: variable from the netCDF4.Dataset
+        :type ncvar: netCDF4.Variable
+        """
+        self.name = ncvar.name
+        self.dimensions = tuple(ncvar.dimensions)
+        self.shape = tuple(ncvar.shape)
+        self.dtype = ncvar.dtype
+        self.attributes = dict([(k, ncvar.getncattr(k)) for k in ncvar.ncattrs()])
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['attributes'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def ncattrs(self):
+        return list(self.attributes.keys())
+
+    def getncattr(self, name):
+        return self.attributes[name]
+
+
+class FAAM_Metadata(object):
+    """
+    Header of a core file: dimensions, global attributes and the variable
+    list with their attributes. No data are read and the file is closed once
+    the object is created, which makes it suitable for scanning the archive.
+
+    Global attributes are available as attributes of the object and the
+    *variables* dictionary uses the original variable names, so that the
+    object can be used with the functions in faampy.core.utils that expect
+    a netCDF4.Dataset (e.g. get_fid, get_base_time).
+
+    >>> md = FAAM_Dataset.open_metadata('core_faam_20161130_v004_r0_b991.nc')
+    >>> md.fid, md.date
+    Out[1]: ('b991', datetime.datetime(2016, 11, 30, 0, 0))
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename: FAAM core filename
+        """
+        self.filename = filename
+        with _NETCDF_LOCK:
+            ds = netCDF4.Dataset(filename, 'r')
+            try:
+                self.dimensions = dict([(k, len(v)) for k, v in ds.dimensions.items()])
+                self.ncattr = dict([(k, ds.getncattr(k)) for k in ds.ncattrs()])
+                self.variables = dict([(k, Variable_Info(v)) for k, v in ds.variables.items()])
+            finally:
+                ds.close()
+        translate = Translator()
+        self.var_names = []
+        for var_name in sorted(self.variables.keys()):
+            if var_name == 'altitude':
+                self.var_names.append('ALT_GIN')
+            elif var_name.lower() == 'time':
+                self.var_names.append('Time')
+            elif var_name.startswith('PARA'):
+                self.var_names.append(translate.get(var_name, var_name))
+            else:
+                self.var_names.append(var_name)
+        try:
+            self.date = get_flight_date(self)
+        except (ValueError, IndexError, AttributeError, TypeError):
+            self.date = None
+        try:
+            self.fid = get_fid(self)
+        except IndexError:
+            self.fid = ''
+        if not self.fid:
+            self.fid = get_fid_from_filename(filename)
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['ncattr'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def ncattrs(self):
+        return list(self.ncattr.keys())
+
+    def getncattr(self, name):
+        return self.ncattr[name]
+
+    @property
+    def time_units(self):
+        for var_name in ('Time', 'TIME', 'time', 'PARA0515'):
+            if var_name in self.variables and 'units' in self.variables[var_name].attributes:
+                return self.variables[var_name].units
+        return None
+
+
+def _open_metadata_(filename):
+    try:
+        return FAAM_Metadata(filename)
+    except (IOError, OSError, RuntimeError):
+        sys.stdout.write('Can not read %s ...\n' % filename)
+        return None
+
+
+def scan_metadata(filenames, processes=None):
+    """
+    Reads the header of many core files using a pool of processes. The
+    netCDF library is not thread-safe, so threads would read the headers
+    one after the other. Files that can not be read are skipped.
+
+    :param filenames: list of core filenames
+    :param int processes: number of processes; defaults to the number of
+      CPUs
+    :return: list of FAAM_Metadata objects
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(filenames)))
+    if processes > 1:
+        pool = multiprocessing.Pool(processes=processes)
+        try:
+            result = pool.map(_open_metadata_, filenames, chunksize=8)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        result = [_open_metadata_(f) for f in filenames]
+    return [md for md in result if md is not None]
+
+
+class _Window_Variables(Mapping):
+    """
+    Read-only mapping that returns the variables of a dataset sliced along
+    the time axis. Slicing uses basic indexing, so the returned arrays are
+    views and no data are copied.
+    """
+
+    def __init__(self, variables, slc, n):
+        self._variables = variables
+        self._slice = slc
+        self._n = n
+
+    def __getitem__(self, key):
+        var = self._variables[key]
+        if len(var.shape) and var.shape[0] == self._n:
+            return var[self._slice]
+        return var[:]
+
+    def __iter__(self):
+        return iter(self._variables)
+
+    def __len__(self):
+        return len(self._variables)
+
+
+class Time_Window(object):
+    """
+    View on a time interval of a FAAM_Dataset as returned by
+    FAAM_Dataset.window.
+
+    """
+
+    def __init__(self, dataset, slc):
+        """
+        :param dataset: parent dataset
+        :type dataset: FAAM_Dataset
+        :param slc: index range of the window
+        :type slc: slice
+        """
+        self.dataset = dataset
+        self.slice = slc
+        self.ncattr = dataset.ncattr
+        self.variables = _Window_Variables(dataset.variables,
+                                           slc,
+                                           len(dataset.time_index))
+
+    @property
+    def index(self):
+        return self.dataset.index[self.slice]
+
+    def __len__(self):
+        return len(range(*self.slice.indices(len(self.dataset.time_index))))
 
 
 class FAAM_Dataset(object):
@@ -282,13 +642,44 @@ class FAAM_Dataset(object):
 
     """
 
-    def __init__(self, filename):
+    @staticmethod
+    def open_metadata(filename):
+        """
+        Reads only the header of a core file (dimensions, attributes,
+        variable list, Time units). This is a lot cheaper than creating a
+        FAAM_Dataset. Reads from several threads are serialised, because
+        the netCDF library is not thread-safe; use scan_metadata to read
+        many headers in parallel processes.
+
+        :param filename: FAAM core filename
+        :return: header information
+        :rtype: FAAM_Metadata
+        """
+        return FAAM_Metadata(filename)
+
+    def __init__(self, filename, cache=False):
         """
         :param filename: FAAM core filename to read in
+        :param cache: keep derived products (WOW_IND, index, flight track) in
+          a persistent cache, so that they are not recalculated when the file
+          is opened again. Either True for the default cache or a
+          Derived_Cache instance
+        :type cache: boolean or Derived_Cache
         """
 
         translate = Translator()
-        self.coords = Coords()
+        if cache is True:
+            cache = Derived_Cache()
+        if cache:
+            self._cache = cache
+            self._cache_key = cache.get_key(filename)
+        else:
+            self._cache = None
+            self._cache_key = None
+        self._coords = None
+        self._geometry = None
+        self._index = None
+        self._time_index = None
         self.variables = {}
         self.ds = netCDF4.Dataset(filename, 'r')
         self.ds.set_auto_mask(False)
@@ -296,24 +687,20 @@ class FAAM_Dataset(object):
         self.ncattr = {}
         self.ncattr['Conventions'] = 'NCAR-RAF/nimbus'
         self.ncattr['Version'] = '1.5'
-        # Get all the variables and copy them over
+        # Wrap all the variables in a Lazy_Variable; no data are read at
+        # this point and NaNs are replaced once the variable is first sliced
         for var_name in self.ds.variables.keys():
             # Fix and oddity where the variables was named altitude
             if var_name == 'altitude':
-                self.variables['ALT_GIN'] = self.ds.variables[var_name]
+                self.variables['ALT_GIN'] = Lazy_Variable(self.ds.variables[var_name])
             # Make sure that time variable is always
             # called Time and not TIME or time
             elif var_name.lower() == 'time':
-                self.variables['Time'] = self.ds.variables[var_name]
+                self.variables['Time'] = Lazy_Variable(self.ds.variables[var_name])
             elif var_name.startswith('PARA'):
-                self.variables[translate[var_name]] = self.ds.variables[var_name]
-                nan_ix = np.isnan(self.variables[translate[var_name]])
-                self.variables[translate[var_name]][:][nan_ix] = -9999.0
+                self.variables[translate[var_name]] = Lazy_Variable(self.ds.variables[var_name])
             else:
-                self.variables[var_name] = self.ds.variables[var_name]
-                nan_ix = np.isnan(self.variables[var_name])
-                self.variables[var_name][:][nan_ix] = -9999.
-            # make sure that there are no nan's in the data
+                self.variables[var_name] = Lazy_Variable(self.ds.variables[var_name])
 
         # Copy all the global attributes
         for attr in self.ds.ncattrs():
@@ -326,54 +713,151 @@ class FAAM_Dataset(object):
             elif 'FLIGHT_NUMBER' in self.ncattr.keys():
                 self.ncattr['FLIGHT'] = self.FLIGHT_NUMBER.lower()
 
-        if 'Time' in self.ds.variables.keys():
-            dt = datetime.datetime.strptime(str(self.ds.variables['Time'].units).strip(), 'seconds since %Y-%m-%d 00:00:00 +0000')
-        elif 'TIME' in self.ds.variables.keys():
-            dt = datetime.datetime.strptime(str(self.ds.variables['TIME'].units).strip(), 'seconds since %Y-%m-%d 00:00:00 +0000')
-        elif 'time' in self.ds.variables.keys():
-            dt = datetime.datetime.strptime(re.findall('\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', self.ds.variables['time'].units)[0], '%Y-%m-%d 00:00:00')
-        elif hasattr(self.ds, 'Flight_Date'):
-            dt = datetime.datetime.strptime(self.ds.Flight_Date, '%d-%b-%y')
-        elif 'PARA0515' in self.ds.variables.keys():
-            dt = datetime.datetime.strptime(self.ds.title.split()[-1], '%d-%b-%y')
-        else:
-            dt = datetime.datetime(self.ds.DATE[2], self.ds.DATE[1], self.ds.DATE[0])
+        dt = get_flight_date(self.ds)
         self.ncattr['DATE'] = [dt.day, dt.month, dt.year]
 
         if 'WOW_IND' not in self.variables.keys():
-            # Estimate the WOW_IND using indicated air speed
-            wow = np.array([1]*self.variables['Time'].size)
-            if len(self.variables['IAS_RVSM'].shape) == 1:
-                ias_rvsm=self.variables['IAS_RVSM'][:]
-            else:
-                ias_rvsm=self.variables['IAS_RVSM'][:,0]
-            ix = np.where((ias_rvsm > 60) & (ias_rvsm < 300))[0]
-            wow[ix] = 0
-            self.variables['WOW_IND'] = wow[:]
+            # Estimate the WOW_IND using indicated air speed, but only
+            # once the variable is actually needed
+            self.variables['WOW_IND'] = Lazy_Variable(loader=lambda: self._cached_('WOW_IND', self._estimate_wow_ind_))
+
+        if self._get_coordinate_names_():
+            self.ncattr['Coordinates'] = ' '.join(self._get_coordinate_names_()+('Time',))
+
+    def __getitem__(self, name):
+        """
+        Returns the data of a variable. Names that are not in the dataset
+        are looked up in the registry of derived variables (see
+        faampy.core.derived); those are calculated once and memoised.
+
+        >>> ds = FAAM_Dataset('core_faam_20161130_v004_r0_b991.nc')
+        >>> u_noturb = ds['U_NOTURB']
+        """
+        if name in self.variables:
+            return self.variables[name][:]
+        return get_derived(self, name)
+
+    def _cached_(self, name, func):
+        """
+        Returns the product *name* from the cache. If it is not available it
+        is calculated using *func* and stored in the cache.
+        """
+        if self._cache is None:
+            return func()
+        data = self._cache.get(self._cache_key, name)
+        if data is None:
+            data = func()
+            self._cache.put(self._cache_key, name, data)
+        return data
+
+    def _estimate_wow_ind_(self):
+        """
+        Estimates the weight-on-wheels indicator from the indicated air
+        speed. Older core files do not have the WOW_IND variable.
+        """
+        wow = np.array([1]*self.variables['Time'].size)
+        if len(self.variables['IAS_RVSM'].shape) == 1:
+            ias_rvsm = self.variables['IAS_RVSM'][:]
+        else:
+            ias_rvsm = self.variables['IAS_RVSM'][:, 0]
+        ix = np.where((ias_rvsm > 60) & (ias_rvsm < 300))[0]
+        wow[ix] = 0
+        return wow
+
+    @property
+    def index(self):
+        """
+        Timestamps of the dataset as numpy.datetime64 array
+        """
+        if self._index is None:
+            self._index = self._cached_('index', self._get_index_)
+        return self._index
 
+    def _get_index_(self):
         # using the more sophisticated np.datetime64 data type
         base_time = np.datetime64('%i-%0.2i-%0.2iT00:00:00' % (self.ncattr['DATE'][2], self.ncattr['DATE'][1], self.ncattr['DATE'][0]))
+        return base_time + np.array(self.variables['Time'][:].ravel(), dtype=np.int64)
 
-        self.index = base_time + np.array(self.variables['Time'][:].ravel(), dtype=np.int)
+    @property
+    def time_index(self):
+        """
+        TimeIndex for the 'Time' variable, which is used for all look ups
+        by timestamp
+        """
+        if self._time_index is None:
+            base_time = datetime.datetime(self.ncattr['DATE'][2], self.ncattr['DATE'][1], self.ncattr['DATE'][0])
+            self._time_index = TimeIndex(self.variables['Time'][:], base_time=base_time)
+        return self._time_index
 
-        self._set_coordinates_()
-        if self.coords:
-            self.Geometry=osgeo.ogr.CreateGeometryFromWkt("LINESTRING (" + ','.join(['%f %f %f' % tuple(i) for i in self.coords.simplified()])+ ")")
+    def window(self, start, end):
+        """
+        Returns a view on the time interval [start, end). The variables of
+        the view are slices of the dataset variables; no data are copied.
+
+        :param start: start time as seconds past midnight, 'HHMMSS' string
+          or datetime
+        :param end: end time
+        :return: view on the interval
+        :rtype: Time_Window
+
+        >>> ds = FAAM_Dataset('core_faam_20161130_v004_r0_b991.nc')
+        >>> run = ds.window('120000', '121500')
+        >>> run.variables['TAT_DI_R'].shape
+        Out[1]: (900, 32)
+        """
+        return Time_Window(self, self.time_index.get_slice(start, end))
 
-    def _set_coordinates_(self):
-        lon_var_name = None
+    @property
+    def coords(self):
+        """
+        Flight track coordinates (only airborne data points)
+        """
+        if self._coords is None:
+            if self._cache is not None and self._cache.has(self._cache_key, 'coords_xyz', 'coords_timestamp'):
+                self._coords = Coords(self._cache.get(self._cache_key, 'coords_xyz'),
+                                      timestamp=self._cache.get(self._cache_key, 'coords_timestamp'))
+            else:
+                self._coords = Coords()
+                self._set_coordinates_()
+                if self._cache is not None and self._coords.timestamp is not None:
+                    self._cache.put(self._cache_key, 'coords_xyz', self._coords.xyz)
+                    self._cache.put(self._cache_key, 'coords_timestamp', self._coords.timestamp)
+            if self._cache is not None:
+                self._coords.Simple_mask = self._cache.get(self._cache_key, self._coords_mask_name_())
+        return self._coords
+
+    def _coords_mask_name_(self):
+        # the mask depends on the tolerance of the simplification
+        return 'coords_mask_%gm' % self._coords.Epsilon
+
+    @property
+    def Geometry(self):
+        """
+        Simplified flight track as osgeo.ogr.Geometry
+        """
+        if self._geometry is None and self.coords:
+            is_cached = self.coords.Simple_mask is not None
+            xyz = self.coords.simplified()
+            if self._cache is not None and not is_cached:
+                self._cache.put(self._cache_key, self._coords_mask_name_(), self.coords.Simple_mask)
+            self._geometry = osgeo.ogr.CreateGeometryFromWkt("LINESTRING (" + format_coordinates(xyz, fmt='%f %f %f', sep=',')+ ")")
+        return self._geometry
+
+    def _get_coordinate_names_(self):
+        """
+        Returns the names of the longitude, latitude and altitude variables
+        or None if the dataset does not have any
+        """
         if 'LAT_GIN' in self.variables.keys():
-            lon_var_name = 'LON_GIN'
-            lat_var_name = 'LAT_GIN'
-            alt_var_name = 'ALT_GIN'
-            self.ncattr['Coordinates'] = 'LON_GIN LAT_GIN ALT_GIN Time'
+            return ('LON_GIN', 'LAT_GIN', 'ALT_GIN')
         elif 'LAT_GPS' in self.variables.keys():
-            lon_var_name = 'LON_GPS'
-            lat_var_name = 'LAT_GPS'
-            alt_var_name = 'GPS_ALT'
-            self.ncattr['Coordinates'] = 'LON_GPS LAT_GPS GPS_ALT Time'
-        if not lon_var_name:
+            return ('LON_GPS', 'LAT_GPS', 'GPS_ALT')
+        return None
+
+    def _set_coordinates_(self):
+        if not self._get_coordinate_names_():
             return
+        lon_var_name, lat_var_name, alt_var_name = self._get_coordinate_names_()
         if self.variables[lon_var_name].size == 0:
             return
 
@@ -386,24 +870,70 @@ class FAAM_Dataset(object):
             y = self.variables[lat_var_name][:].ravel()
             z = self.variables[alt_var_name][:].ravel()
 
-        wow = self.variables['WOW_IND']
+        wow = self.variables['WOW_IND'][:]
 
         # filter good values
         ix = np.where((x > -180) & (x < 180) & (y > -90) & (y < 90) & (z != -9999.0) & (x != 0.0) & (wow != 1))[0]
-        for i in zip(list(x[ix]), list(y[ix]), list(z[ix])):
-            self.coords.append(i)
+        self._coords = Coords(np.column_stack((x[ix], y[ix], z[ix])),
+                              timestamp=self.index[ix])
         return
 
-    def merge(self, recarray, index='', varnames=[], delay=0):
+    def _get_merge_source_(self, source, index, varnames):
         """
-        Merges in a numpy recarray with the FAAM_Dataset using concurring
-        timestamps
+        Splits a recarray or pandas.DataFrame into the timestamps (as seconds
+        past midnight of the flight date) and a dict of numeric columns.
+        """
+        base_time = np.datetime64('%i-%0.2i-%0.2iT00:00:00' % (self.ncattr['DATE'][2], self.ncattr['DATE'][1], self.ncattr['DATE'][0]))
+        if isinstance(source, pd.DataFrame):
+            columns = list(source.columns)
+            get_column = lambda name: source[name].values
+            if not index and isinstance(source.index, pd.DatetimeIndex):
+                timestamp = source.index.values
+            else:
+                timestamp = None
+        else:
+            columns = list(source.dtype.names)
+            get_column = lambda name: source[name]
+            timestamp = None
+
+        if timestamp is None:
+            if not index:
+                # guess field name for index by looping through some common names
+                for name in ['timestamp', 'time', 'datetime']:
+                    if name in [c.lower() for c in columns]:
+                        index = columns[[c.lower() for c in columns].index(name)]
+                        break
+            if not index:
+                return None, None
+            timestamp = get_column(index)
+            if index in columns:
+                columns.remove(index)
+
+        if varnames:
+            columns = [c for c in columns if c in varnames]
+        secs = (np.asarray(timestamp, dtype='datetime64[ns]')-base_time)/np.timedelta64(1, 's')
+        data = {}
+        for c in columns:
+            # Make sure that the data are numbers and not string or object type
+            col = np.asarray(get_column(c))
+            if col.dtype.kind not in 'biuf':
+                continue
+            data[c] = col
+        return secs, data
 
-        :param recarray: A numpy numpy.recarray with named data
-        :type recarray: numpy.recarray
+    def merge(self, recarray, index='', varnames=[], delay=0, method='nearest', freq=1, tolerance=None):
+        """
+        Merges in numpy recarrays or pandas DataFrames with the FAAM_Dataset
+        using concurring timestamps. Several sources can be merged in one
+        call by passing a list; the time axis of the dataset is only set up
+        once and all merged variables share one allocated array.
+
+        :param recarray: A numpy numpy.recarray with named data, a
+          pandas.DataFrame or a list of those
+        :type recarray: numpy.recarray, pandas.DataFrame or list
         :param index: Name of the column/field that contains the timestamp.
-          Note that the merging only works on timestamps. The maximum time
-          resolution is 1sec.
+          If not set common names are tried and for DataFrames the
+          DatetimeIndex is used
         :type index: str
         :param varnames: List of varnames from the  input array that should be
           merged
@@ -411,67 +941,94 @@ class FAAM_Dataset(object):
         :param int delay: instruments have a time offset compared to the core
           data. For example the FGGA is aboute four seconds slower than the
           core temperature measurements. The delay keyword takes this care of
-          this and shifts the data.
+          this and shifts the data by the given number of seconds.
+        :param str method: 'nearest' takes the closest sample within the
+          tolerance; 'mean' averages all samples within each time step
+        :param int freq: frequency of the merged variables. With freq > 1 the
+          variables are merged on a sub-second (e.g. 32Hz) grid and have the
+          shape (n, freq)
+        :param float tolerance: maximum time difference in seconds for the
+          'nearest' method. Defaults to half a time step
         """
-        BASE_TIME = self.index[0]
-
-        if not varnames:
-            other_var_names = list(recarray.dtype.names)
-        else:
-            other_var_names = list(varnames)
-
-        if not index:
-            # This needs testing
-            # guess field name for index by looping through some common names
-            recarray_keys = recarray.dtype.fields.keys()
-            index_name_list = ['timestamp', 'time', 'datetime']
-            for i, name in enumerate(index_name_list):
-                if name in [item.lower() for item in recarray_keys]:
-                    index = recarray_keys[i]
-                    break
-
-            # if we made it that far we don't have a proper index name
-            sys.stdout.write('No index for merging found ... Leaving ...\n')
-            return
-        else:
-            other_index = recarray[index]
-            # Need to make sure that the datatype is datetime64[s] otherwise
-            # the merging does not work
-            if index in other_var_names:
-                other_var_names.remove(index)
-
-        # The following stuff does what reverse_indices in idl does,
-        # does not work with the datetime64 data type. We simplify
-        # things by converting it to secs since BASE_TIME
-        # so that we can work with two integer numbers
-        own_index = np.array(self.index-BASE_TIME, dtype=np.int32)
-        other_index = np.int32((recarray['timestamp']-BASE_TIME).astype('timedelta64[s]'))
-        bins = np.linspace(own_index[0]-0.5, own_index[-1]+0.5, (len(own_index)+1))
-        ind = np.digitize(other_index, bins)-1
-        ind_mask = np.select([ind < 0, ind >= len(bins)-1], [0, 0], default=1)
-
-        print(other_var_names)
-        for other_var_name in other_var_names:
-            # Make sure that the data are numbers and not string or object type
-            if recarray[other_var_name].dtype in [np.dtype(np.object), np.dtype(np.str)]:
+        if not isinstance(recarray, (list, tuple)):
+            recarray = [recarray, ]
+        if method not in ('nearest', 'mean'):
+            raise ValueError('Unknown merge method: %s' % method)
+        if tolerance is None:
+            tolerance = 0.5/freq
+
+        sources = []
+        for src in recarray:
+            secs, data = self._get_merge_source_(src, index, varnames)
+            if secs is None:
+                sys.stdout.write('No index for merging found ... Leaving ...\n')
+                return
+            sources.append((secs+delay, data))
+
+        # the target time axis with shape (n, freq) flattened
+        own_secs = np.asarray(self.variables['Time'][:], dtype=np.float64).ravel()
+        n = own_secs.size
+        own_secs = (own_secs[:, np.newaxis]+np.arange(freq, dtype=np.float64)/freq).ravel()
+
+        names = []
+        for secs, data in sources:
+            names += [name for name in sorted(data.keys()) if name not in names]
+        block = np.empty((n*freq, len(names)), dtype=np.float64)
+        block.fill(np.nan)
+
+        for secs, data in sources:
+            if not data or secs.size == 0:
+                # the variables of an empty source stay NaN
                 continue
-            new_array = np.array([np.nan, ]*len(own_index))
-            new_array[ind[ind_mask == 1]] = recarray[other_var_name][ind_mask == 1]
-            if delay:
-                new_array = np.roll(new_array, delay)
-                new_array[-delay] = np.nan
-            self.variables[other_var_name] = np.copy(new_array)
+            cols = [names.index(name) for name in sorted(data.keys())]
+            values = np.column_stack([np.asarray(data[name], dtype=np.float64).ravel() for name in sorted(data.keys())])
+            if method == 'nearest':
+                order = np.argsort(secs, kind='mergesort')
+                secs, values = secs[order], values[order, :]
+                ix = np.clip(np.searchsorted(secs, own_secs), 1, max(secs.size-1, 1))
+                left = np.clip(ix-1, 0, secs.size-1)
+                right = np.clip(ix, 0, secs.size-1)
+                use_left = np.abs(own_secs-secs[left]) <= np.abs(secs[right]-own_secs)
+                nearest = np.where(use_left, left, right)
+                ok = np.abs(secs[nearest]-own_secs) <= tolerance
+                block[np.ix_(ok, cols)] = values[nearest[ok], :]
+            else:
+                # assign every sample to the time step it falls into
+                ix = np.searchsorted(own_secs, secs, side='right')-1
+                ok = (ix >= 0) & (secs-own_secs[np.clip(ix, 0, n*freq-1)] < 1.0/freq)
+                ix, values = ix[ok], values[ok, :]
+                valid = ~np.isnan(values)
+                total = np.zeros((n*freq, len(cols)), dtype=np.float64)
+                count = np.zeros((n*freq, len(cols)), dtype=np.float64)
+                np.add.at(total, ix, np.where(valid, values, 0.0))
+                np.add.at(count, ix, valid)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    mean = total/count
+                has_data = count > 0
+                sub = block[:, cols]
+                sub[has_data] = mean[has_data]
+                block[:, cols] = sub
+
+        for i, name in enumerate(names):
+            if freq > 1:
+                self.variables[name] = block[:, i].reshape((n, freq))
+            else:
+                self.variables[name] = block[:, i]
 
-    def as_dataframe(self, varnames=[]):
+    def as_dataframe(self, varnames=[], full_rate=False):
         """
         Returns the Dataset as a pandas.Dataframe using the timestamp as index,
-        which opens the world of pandas to you. Only the first column of two
-        dimensional data sets is grabbed, because pandas does not handle
-        multidimensional data very well.
+        which opens the world of pandas to you. By default only the first
+        column of two dimensional data sets is grabbed, because pandas does
+        not handle multidimensional data very well.
 
         :param varnames: list of variable names that should be exported as
           DataFrame. By default all are exported
         :type varnames: list
+        :param full_rate: export the variables at their native frequency. A
+          dict of DataFrames is returned with the frequency as key and a
+          sub-second DatetimeIndex
+        :type full_rate: boolean
         :return: returns a pandas Dataframe with the Timestamp as index
         :type return: pandas.Dataframe
         """
@@ -479,52 +1036,100 @@ class FAAM_Dataset(object):
             varnames = sorted(self.variables.keys())
             varnames.remove('Time')
         else:
-            varnames = list(set(self.variables.keys()).intersection(varnames))
+            varnames = sorted(set(self.variables.keys()).intersection(varnames))
+        return variables_to_dataframe(self.variables, varnames, self.index, full_rate=full_rate)
 
-        df = pd.DataFrame(index=self.index)
-        for v in varnames:
-            shp = self.variables[v].shape
-            if len(shp) == 2:
-                data = np.copy(self.variables[v][:, 0])
-            else:
-                data = np.copy(self.variables[v][:])
-            df_tmp = pd.DataFrame(data[:], index=self.index, columns=[v, ])
-            df = pd.concat([df, df_tmp], axis=1)
-        # set all missing values to nan
-        df[df == -9999.0] = np.nan
-        return df
+    def get_flag_masks(self, varnames, accepted_flags=flags.ALL_FLAGS, key=slice(None)):
+        """
+        Creates the masks for a list of variables from their _FLAG
+        variables. All flags with the same shape are checked in one go.
+        Rejected samples are True; see faampy.core.flags.get_flag_masks.
+
+        :param varnames: list of variable names
+        :type varnames: list
+        :param accepted_flags: flag values that are accepted
+        :type accepted_flags: tuple
+        :param key: rows that are read, e.g. a slice
+        :return: dictionary with a boolean array for each variable
+        :rtype: dict
+        """
+        return flags.get_flag_masks(self, varnames, accepted_flags=accepted_flags, key=key)
 
-    def as_kml(self, extrude=1, tessellate=1):
+    def get_masked(self, varnames, accepted_flags=flags.ALL_FLAGS, fill='mask', key=slice(None)):
+        """
+        Returns the variables with rejected samples masked, either as numpy
+        masked arrays (fill='mask') or with NaNs (fill='nan'). Arrays without
+        rejected samples are not copied.
+
+        :param varnames: list of variable names
+        :type varnames: list
+        :param accepted_flags: flag values that are accepted
+        :type accepted_flags: tuple
+        :param str fill: 'mask' or 'nan'
+        :param key: rows that are read, e.g. a slice
+        :rtype: dict
+
+        >>> ds = FAAM_Dataset('core_faam_20161130_v004_r0_b991.nc')
+        >>> data = ds.get_masked(['CO_AERO', 'O3_TECO'], accepted_flags=(0,), fill='nan')
+        """
+        return flags.get_masked(self, varnames, accepted_flags=accepted_flags, fill=fill, key=key)
+
+    def as_kml(self, extrude=1, tessellate=1, ofile=None, simplified=True):
         """
         Returns a kml linestring which represents the flight track of the
-        current dataset
+        current dataset. If *ofile* is given the kml is streamed into the
+        file instead; files with the extension .kmz are zipped.
 
         :param extrude: whether the linestring is extruded
         :type extrude: boolean
         :param tessellate: whether the linestring is tesselated
         :type tessellate: boolean
-        :return: kml string
-        """
-        template = """<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2" xmlns:kml="http://www.opengis.net/kml/2.2" xmlns:atom="http://www.w3.org/2005/Atom">
-<Folder>
-    <name>%s-%s-Flight-Track</name>
-        <open>0</open>
-        <Placemark>
-          <name>%s</name>
-        %s
-        </Placemark>
-        </Folder>
-</kml>
-"""
-        linestring = "<LineString>"
-        linestring += "<extrude>%s</extrude><tessellate>%s</tessellate>" % (str(extrude), str(tessellate))
-        linestring += (''.join(self.Geometry.ExportToKML().split('<LineString>')))
-        kml = template % (self.FLIGHT,
-                          datetime.datetime(self.DATE[2], self.DATE[1], self.DATE[0]).strftime('%Y-%m-%d'),
-                          self.FLIGHT,
-                          linestring)
-        return kml
+        :param str ofile: output file (.kml or .kmz)
+        :param simplified: use the simplified flight track
+        :type simplified: boolean
+        :return: kml string or None if the kml was written to ofile
+        """
+        if simplified:
+            xyz = self.coords.simplified()
+        else:
+            xyz = self.coords.xyz
+        dd, mm, yyyy = self.ncattr['DATE']
+        date = datetime.datetime(yyyy, mm, dd).strftime('%Y-%m-%d')
+        fid = self.ncattr['FLIGHT']
+        writer = KML_Writer(ofile)
+        writer.begin_folder('%s-%s-Flight-Track' % (fid, date))
+        writer.begin_placemark(fid)
+        writer.write_linestring(xyz, extrude=extrude, tessellate=tessellate)
+        writer.end_placemark()
+        writer.end_folder()
+        writer.close()
+        if ofile is None:
+            return writer.getvalue()
+
+    def export(self, path, fmt='parquet', varnames=[], max_flag=2, include_flags=True, chunk_size=3600):
+        """
+        Exports the dataset into a columnar store (Parquet or Zarr), which
+        can be read with faampy.core.faam_store.FAAM_Store. Variables keep
+        their native frequency; missing and flagged samples are stored as
+        NaN.
+
+        :param str path: directory of the store
+        :param str fmt: 'parquet' or 'zarr'
+        :param varnames: list of variables. By default all time series are
+          exported
+        :type varnames: list
+        :param int max_flag: samples with a flag greater than max_flag are set
+          to NaN
+        :param include_flags: export the _FLAG variables as well
+        :type include_flags: boolean
+        :param int chunk_size: number of seconds per chunk
+        :return: flight id
+
+        >>> ds = FAAM_Dataset('core_faam_20161130_v004_r0_b991.nc')
+        >>> ds.export('/home/axel/faam_store', fmt='zarr')
+        """
+        return export_dataset(self, path, fmt=fmt, varnames=varnames, max_flag=max_flag,
+                              include_flags=include_flags, chunk_size=chunk_size)
 
     def close(self):
         """
@@ -532,22 +1137,123 @@ class FAAM_Dataset(object):
         """
         self.ds.close()
 
-    def write(self, outfilename, v_name_list=[], as_1Hz=True, clobber=False):
+    def _resample_time_(self, freq=1):
         """
-        Writing dataset out as NetCDF
+        Returns the 'Time' variable for the output frequency. The time
+        stamps are arranged in the same blocks as the data, so that each
+        value gets the time of the first sample in its block
+        """
+        secs = np.asarray(self.variables['Time'][:], dtype=np.float64).ravel()
+        # at least one sample per output value, so that no block is empty
+        f = max(1, int(np.ceil(freq)))
+        secs = secs[:, np.newaxis]+np.arange(f)/float(f)
+        blocks, shape = _blocks_(secs, freq)
+        return blocks[:, 0].reshape(shape)
+
+    def iter_resampled(self, varnames=[], freq=1, how='mean', max_flag=None):
+        """
+        Generator that resamples one variable after the other and yields
+        the variable name and the resampled data. Flag variables are
+        resampled using the highest flag value within each block.
+
+        :param varnames: list of variable names. By default all variables
+          are resampled
+        :type varnames: list
+        :param float freq: output frequency in Hz (e.g. 1, 4 or 1/10.)
+        :param str how: 'mean', 'median', 'min', 'max', 'std' or 'first'
+        :param int max_flag: samples with a flag greater than max_flag are
+          excluded. By default all samples are used
+        """
+        if not varnames:
+            varnames = sorted(self.variables.keys())
+        for v_name in varnames:
+            if v_name == 'Time' or not self._is_time_series_(v_name):
+                continue
+            yield v_name, self._resample_chunk_(v_name, slice(None), freq, how, max_flag)
+
+    def _is_time_series_(self, v_name):
+        var = self.variables[v_name]
+        return len(var.shape) > 0 and var.shape[0] == self.variables['Time'].shape[0]
+
+    def _read_(self, v_name, key=slice(None)):
+        """
+        Reads part of a variable without loading the whole variable
+        """
+        var = self.variables[v_name]
+        if hasattr(var, 'read'):
+            return var.read(key)
+        return np.asarray(var[key])
+
+    def _resample_chunk_(self, v_name, slc, freq, how, max_flag):
+        """
+        Resamples the rows *slc* of a variable
+        """
+        if v_name.endswith('_FLAG'):
+            return resample_flag(self._read_(v_name, slc), freq=freq)
+        data = self._read_(v_name, slc)
+        mask = None
+        if max_flag is not None and v_name+'_FLAG' in self.variables:
+            if self.variables[v_name+'_FLAG'].shape == self.variables[v_name].shape:
+                mask = self._read_(v_name+'_FLAG', slc) > max_flag
+        return resample_array(data, freq=freq, how=how, mask=mask)
+
+    def resample(self, varnames=[], freq=1, how='mean', max_flag=None):
+        """
+        Resamples the variables of the dataset to a new frequency.
+
+        :param varnames: list of variable names. By default all variables
+          are resampled
+        :type varnames: list
+        :param float freq: output frequency in Hz. Use 1/10. for ten
+          second averages
+        :param str how: 'mean', 'median', 'min', 'max', 'std' or 'first'
+        :param int max_flag: samples with a flag greater than max_flag are
+          excluded. By default all samples are used
+        :return: dictionary with the resampled data including 'Time'; the
+          shape of the arrays is (n,) for freq <= 1 and (n, freq) otherwise
+        :rtype: dict
+
+        >>> ds = FAAM_Dataset('core_faam_20161130_v004_r0_b991.nc')
+        >>> data = ds.resample(['TAT_DI_R', 'TAT_DI_R_FLAG'], freq=1/10., max_flag=1)
+        """
+        result = dict(self.iter_resampled(varnames, freq=freq, how=how, max_flag=max_flag))
+        result['Time'] = self._resample_time_(freq)
+        return result
+
+    def write(self, outfilename, v_name_list=[], as_1Hz=True, clobber=False, how='mean', max_flag=None,
+              zlib=True, complevel=4, shuffle=True, chunk_size=3600):
+        """
+        Writing dataset out as NetCDF. The variables are copied in chunks
+        along the time axis, so that the memory usage does not depend on
+        the size of the file.
 
         :param outfilename: path for the new NetCDF
         :type outfilename: str
         :param v_name_list: list of variables names that should be written. By
           default all variables are added to the NetCDF
         :type v_name_list: list
-        :param as_1Hz: Writes only 1Hz data out. If the variable
-          is avaiable in higher frequency only the first value within the
-          second is used rather than the average from the number of data
-          points
+        :param as_1Hz: Writes only 1Hz data out. If the variable is
+          avaiable in higher frequency the samples within a second are
+          reduced using the *how* method
         :type as_1Hz: boolean
         :param clobber: Overwrites the files if it exists
         :type clobber: boolean
+        :param str how: method for reducing high frequency data to 1Hz:
+          'mean', 'median', 'min', 'max', 'std' or 'first'
+        :param int max_flag: samples with a flag greater than max_flag are
+          excluded from the 1Hz values
+        :param zlib: compress the variables
+        :type zlib: boolean
+        :param int complevel: compression level (1-9)
+        :param shuffle: use the HDF5 shuffle filter, which improves the
+          compression
+        :type shuffle: boolean
+        :param int chunk_size: number of seconds per chunk. This is used for
+          copying the data and as chunk size in the new file, which makes
+          reading time slices efficient
+
+        .. note:: The netCDF4/HDF5 library is not thread-safe, so the
+          variables are written one after the other.
         """
 
         if os.path.exists(outfilename) :
@@ -565,15 +1271,22 @@ class FAAM_Dataset(object):
             dsout.setncattr(k ,v)
 
         if not v_name_list:
-            v_name_list = self.variables.keys()
+            v_name_list = list(self.variables.keys())
+        else:
+            v_name_list = list(v_name_list)
 
+        n = self.variables['Time'].shape[0]
+        time_chunk = max(1, min(chunk_size, n))
+        chunks = [slice(i, min(i+chunk_size, n)) for i in range(0, n, chunk_size)]
 
         # Now the dimensions
-        for dname, the_dim in self.ds.dimensions.iteritems():
+        for dname, the_dim in self.ds.dimensions.items():
             dsout.createDimension(dname, len(the_dim) if not the_dim.isunlimited() else None)
             try:
                 dim_var=self.variables[dname][:]
-                outVar = dsout.createVariable(dname, int, ('Time',), fill_value=-9999.)
+                outVar = dsout.createVariable(dname, int, ('Time',), fill_value=-9999.,
+                                              zlib=zlib, complevel=complevel, shuffle=shuffle,
+                                              chunksizes=(time_chunk,))
                 outVar[:] = dim_var
                 outVar.units = self.variables['Time'].units
             except KeyError:
@@ -581,30 +1294,53 @@ class FAAM_Dataset(object):
 
             if dname in v_name_list:
                 v_name_list.remove(dname)
+
         # Writing the variables
         for v_name in v_name_list:
             varin = self.variables[v_name]
+            is_time_series = self._is_time_series_(v_name)
+            if as_1Hz and not is_time_series:
+                continue
 
             if hasattr(varin, 'datatype'):
                 datatype = varin.datatype
                 dimensions = varin.dimensions
+            elif len(varin.shape) == 1:
+                datatype='f8'
+                dimensions = ('Time',)
             else:
                 datatype='f8'
-                dimensions = ('Time', 'sps01')
+                dimensions = ('Time', 'sps%02i' % varin.shape[1])
+                if dimensions[1] not in dsout.dimensions:
+                    dsout.createDimension(dimensions[1], varin.shape[1])
+
+            ncattrs = {}
+            fill_value = -9999.
+            if hasattr(varin, 'getncattr'):
+                ncattrs = {k: varin.getncattr(k) for k in varin.ncattrs()}
+                fill_value = ncattrs.pop('_FillValue', fill_value)
 
             if as_1Hz:
-                outVar = dsout.createVariable(v_name, datatype, ('Time',), fill_value=-9999.)
-                if hasattr(varin, 'getncattr'):
-                    outVar.setncatts({k: varin.getncattr(k) for k in varin.ncattrs()})
-                if len(self.variables[v_name].shape) == 2:
-                    outVar_data = self.variables[v_name][:,0]
-                else:
-                    outVar_data = self.variables[v_name][:]
+                dimensions = ('Time',)
+            if is_time_series:
+                chunksizes = (time_chunk,)+tuple(varin.shape[1:len(dimensions)])
             else:
-                outVar = dsout.createVariable(v_name, datatype, dimensions)
-                if hasattr(varin, 'getncattr'):
-                    outVar.setncatts({k: varin.getncattr(k) for k in varin.ncattrs()})
-                outVar_data = self.variables[v_name][:]
-            outVar_data[np.isnan(outVar_data)] = -9999.
-            outVar[:] = outVar_data
+                chunksizes = None
+            outVar = dsout.createVariable(v_name, datatype, dimensions, fill_value=fill_value,
+                                          zlib=zlib, complevel=complevel, shuffle=shuffle,
+                                          chunksizes=chunksizes)
+            outVar.setncatts(ncattrs)
+
+            if not is_time_series:
+                outVar[:] = self._read_(v_name)
+                continue
+            # The data are streamed into the file one chunk at a time
+            for slc in chunks:
+                if as_1Hz:
+                    outVar_data = self._resample_chunk_(v_name, slc, 1, how, max_flag)
+                else:
+                    outVar_data = self._read_(v_name, slc)
+                if outVar_data.dtype.kind == 'f':
+                    outVar_data = np.where(np.isnan(outVar_data), fill_value, outVar_data)
+                outVar[slc] = outVar_data
         dsout.close()
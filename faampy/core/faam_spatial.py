@@ -3,12 +3,139 @@
 Created on Wed Nov 30 11:00:50 2016
 
 @author: axel
+
+Spatialite database with the flight tracks and flight summary events. Both
+geometry columns have a spatial index (R-tree), which is used by the query
+methods to find candidate rows before the exact geometry tests are done.
+
+>>> sdb = FAAM_Spatial_DB('faam_spatial_db.sqlite')
+>>> north_sea = 'POLYGON((-4 51, 9 51, 9 62, -4 62, -4 51))'
+>>> sdb.flights_intersecting(north_sea, start='2015-01-01', end='2015-12-31')['fid']
+Out[1]: array(['b895', 'b896', ...])
+>>> sdb.nearest_flights(-0.616667, 52.072222, n=3)
+
 """
 
+import datetime
+import json
 import os
 import pyspatialite.dbapi2 as db
+import struct
 import sys
 
+import numpy as np
+
+
+# ISO WKB geometry type for LINESTRING Z
+_WKB_LINESTRINGZ = 1002
+
+
+def to_wkb(xyz):
+    """
+    Converts coordinates into a little-endian WKB LINESTRING Z. The array is
+    written in one go, there is no text formatting or parsing involved.
+
+    :param xyz: coordinates with shape (n, 3) (lon, lat, alt)
+    :type xyz: numpy.array
+    :return: WKB
+    :rtype: bytes
+    """
+    xyz = np.ascontiguousarray(xyz, dtype='<f8').reshape((-1, 3))
+    return struct.pack('<BII', 1, _WKB_LINESTRINGZ, xyz.shape[0])+xyz.tobytes()
+
+
+def from_wkb(wkb):
+    """
+    Converts a WKB POINT or LINESTRING (2D, Z, M or ZM; ISO or EWKB) into a
+    coordinate array
+
+    :param bytes wkb: well known binary
+    :return: coordinates with shape (n, ndim)
+    :rtype: numpy.array
+    """
+    wkb = bytes(wkb)
+    endian = '<' if wkb[:1] == b'\x01' else '>'
+    geom_type = struct.unpack(endian+'I', wkb[1:5])[0]
+    offset = 5
+    ndim = 2
+    if geom_type & 0x20000000:
+        # EWKB with SRID
+        offset += 4
+    if geom_type & 0x80000000:
+        ndim += 1
+    if geom_type & 0x40000000:
+        ndim += 1
+    geom_type &= 0x0fffffff
+    ndim += {0: 0, 1: 1, 2: 1, 3: 2}[geom_type//1000]
+    geom_type %= 1000
+    if geom_type == 1:
+        n = 1
+    elif geom_type == 2:
+        n = struct.unpack(endian+'I', wkb[offset:offset+4])[0]
+        offset += 4
+    else:
+        raise ValueError('Geometry type %i not supported' % geom_type)
+    return np.frombuffer(wkb, dtype=endian+'f8', count=n*ndim, offset=offset).reshape((n, ndim))
+
+
+def _haversine_(lon, lat, lon0, lat0):
+    """
+    Great circle distance in m
+    """
+    lon, lat, lon0, lat0 = [np.radians(v) for v in (lon, lat, lon0, lat0)]
+    a = np.sin((lat-lat0)/2.)**2+np.cos(lat0)*np.cos(lat)*np.sin((lon-lon0)/2.)**2
+    return 2*6371000.0*np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _track_distance_(coords, lon0, lat0):
+    """
+    Shortest great circle distance in m from a point to a track. The
+    closest point of every segment is found in a local plane around the
+    point (lon0, lat0), so that points between two vertices are taken into
+    account, and its distance is calculated with the haversine formula.
+
+    :param coords: track coordinates with shape (n, 2+) (lon, lat, ...)
+    :type coords: numpy.array
+    """
+    lon, lat = coords[:, 0], coords[:, 1]
+    if lon.size < 2:
+        return np.nanmin(_haversine_(lon, lat, lon0, lat0))
+    # local plane; longitudes are wrapped around the point
+    x = ((lon-lon0+180.) % 360.-180.)*np.cos(np.radians(lat))
+    y = lat-lat0
+    dx, dy = np.diff(x), np.diff(y)
+    d2 = dx**2+dy**2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.clip(-(x[:-1]*dx+y[:-1]*dy)/d2, 0, 1)
+    t[d2 == 0] = 0
+    dlon = (lon[1:]-lon[:-1]+180.) % 360.-180.
+    _lon = lon[:-1]+t*dlon
+    _lat = lat[:-1]+t*(lat[1:]-lat[:-1])
+    return np.nanmin(_haversine_(_lon, _lat, lon0, lat0))
+
+
+def _distance_bbox_(lon, lat, distance):
+    """
+    Boundary box (xmin, ymin, xmax, ymax) that contains all points within
+    *distance* (m) of a point
+    """
+    dlat = np.degrees(distance/6371000.0)
+    coslat = np.cos(np.radians(min(abs(lat)+dlat, 89.9)))
+    dlon = min(dlat/coslat, 180.)
+    return (lon-dlon, lat-dlat, lon+dlon, lat+dlat)
+
+
+def _to_date_str_(dt, fmt):
+    if dt is None or isinstance(dt, str):
+        return dt
+    return dt.strftime(fmt)
+
+
+_FLIGHT_DTYPE = [('fid', 'U8'), ('date', 'U10')]
+
+_EVENT_DTYPE = [('id', 'U32'), ('fid', 'U8'), ('desc', 'U64'),
+                ('start_datetime', 'U19'), ('end_datetime', 'U19')]
+
 
 class FAAM_Spatial_DB(object):
 
@@ -22,6 +149,8 @@ class FAAM_Spatial_DB(object):
         if not exists:
             self.setup()
             sys.stdout.write('DB created ... \n')
+        self._ensure_indexes_()
+        self._ensure_manifest_()
 
     def info(self):
         # Test that the spatialite extension has been loaded:
@@ -51,24 +180,197 @@ class FAAM_Spatial_DB(object):
         cur.execute(sql)
         sql = "SELECT AddGeometryColumn('fltsumm_event', 'the_geom', 4326, 'LINESTRINGZ', 'XYZ');"
         cur.execute(sql)
+        for table in ('flight_tracks', 'fltsumm_event'):
+            cur.execute("SELECT CreateSpatialIndex(?, 'the_geom');", (table,))
         self.conn.commit()
         return
 
-    def insert_flight_track(self, fid, dt, wkt, overwrite=False):
+    def _ensure_indexes_(self):
+        # the fid of the flight_tracks is the primary key and therefore
+        # indexed already
         cur = self.conn.cursor()
-        if overwrite:
-            sql = """SELECT * from flight_tracks where fid=='%s';""" % (fid,)
-            cur.execute(sql)
-            res = cur.fetchone()
-            if res:
-                cur.execute("DELETE FROM flight_tracks where fid=='%s';" % (fid,))
-
-        geom = "GeomFromText('" + wkt + "', 4326)"
-        sql = "INSERT INTO flight_tracks (fid, date, the_geom) "
-        sql += "VALUES ('%s', '%s', %s);" % (fid, dt.strftime('%Y-%m-%d'), geom)
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_fltsumm_event_fid ON fltsumm_event (fid);')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_fltsumm_event_start ON fltsumm_event (start_datetime);')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_flight_tracks_date ON flight_tracks (date);')
+        # databases that were created before the spatial index was added
+        for table in ('flight_tracks', 'fltsumm_event'):
+            cur.execute("SELECT name FROM sqlite_master WHERE name=?;", ('idx_%s_the_geom' % table,))
+            if not cur.fetchone():
+                cur.execute("SELECT CreateSpatialIndex(?, 'the_geom');", (table,))
+        self.conn.commit()
+
+    def _ensure_manifest_(self):
+        # records the files from which each flight was ingested; used by
+        # faampy.utils.data_update for incremental updates
         cur = self.conn.cursor()
+        sql = 'CREATE TABLE IF NOT EXISTS ingest_manifest ('
+        sql += 'fid TEXT NOT NULL PRIMARY KEY,'
+        sql += 'core_file TEXT,'
+        sql += 'core_rev INTEGER,'
+        sql += 'core_size INTEGER,'
+        sql += 'core_mtime REAL,'
+        sql += 'core_md5 TEXT,'
+        sql += 'fltsumm_file TEXT,'
+        sql += 'fltsumm_rev INTEGER,'
+        sql += 'fltsumm_size INTEGER,'
+        sql += 'fltsumm_mtime REAL,'
+        sql += 'fltsumm_md5 TEXT,'
+        sql += 'ingested DATETIME);'
         cur.execute(sql)
         self.conn.commit()
+
+    def get_manifest(self):
+        """
+        Returns the ingest manifest, which records for every flight the core
+        and flight summary file (name, revision, size, modification time
+        and md5 checksum) that were ingested.
+
+        :return: dictionary with the fid as key and a dictionary of the
+          manifest columns as value
+        :rtype: dict
+        """
+        cur = self.conn.cursor()
+        cur.execute('SELECT * FROM ingest_manifest;')
+        columns = [c[0] for c in cur.description]
+        return dict([(row[0], dict(zip(columns, row))) for row in cur.fetchall()])
+
+    def update_manifest(self, rows):
+        """
+        Inserts or replaces manifest entries in one transaction
+
+        :param list rows: list of dictionaries with the manifest columns
+          (see get_manifest); missing columns are set to NULL
+        """
+        columns = ['fid', 'core_file', 'core_rev', 'core_size', 'core_mtime', 'core_md5',
+                   'fltsumm_file', 'fltsumm_rev', 'fltsumm_size', 'fltsumm_mtime', 'fltsumm_md5',
+                   'ingested']
+        sql = 'INSERT OR REPLACE INTO ingest_manifest (%s) VALUES (%s);' % (', '.join(columns),
+                                                                           ', '.join(['?']*len(columns)))
+        cur = self.conn.cursor()
+        try:
+            cur.executemany(sql, [tuple([r.get(c) for c in columns]) for r in rows])
+            self.conn.commit()
+        except:
+            self.conn.rollback()
+            raise
+        return
+
+    def delete_fltsumm_events(self, fids):
+        """
+        Deletes all flight summary events of the flights in one transaction
+
+        :param list fids: flight ids
+        """
+        cur = self.conn.cursor()
+        try:
+            cur.executemany('DELETE FROM fltsumm_event WHERE fid=?;', [(fid,) for fid in fids])
+            self.conn.commit()
+        except:
+            self.conn.rollback()
+            raise
+        return
+
+    def _bulk_insert_(self, table, columns, key, rows, overwrite):
+        """
+        Inserts rows in a single transaction. The last value of each row
+        is the geometry, which is either a numpy array with shape (n, 3),
+        WKB (bytes) or WKT (str). If *overwrite* is set existing rows with
+        the same key are replaced (upsert), otherwise they are kept.
+        """
+        # only the last row for a key is used
+        ix = columns.index(key)
+        seen = set()
+        unique_rows = []
+        for row in reversed(list(rows)):
+            if row[ix] not in seen:
+                seen.add(row[ix])
+                unique_rows.append(row)
+        unique_rows.reverse()
+        wkb_rows, wkt_rows = [], []
+        for row in unique_rows:
+            geom = row[-1]
+            if isinstance(geom, bytes) and geom[:1] in (b'\x00', b'\x01'):
+                # WKB starts with the byte order flag
+                wkb_rows.append(tuple(row[:-1])+(db.Binary(geom),))
+            elif isinstance(geom, (str, bytes)) or type(geom).__name__ == 'unicode':
+                wkt_rows.append(tuple(row))
+            else:
+                wkb_rows.append(tuple(row[:-1])+(db.Binary(to_wkb(geom)),))
+        if not wkb_rows and not wkt_rows:
+            return 0
+        placeholders = ', '.join(['?']*(len(columns)-1))
+        sql = '%s INTO %s (%s) VALUES (%s, %%s);' % ('INSERT' if overwrite else 'INSERT OR IGNORE',
+                                                          table,
+                                                          ', '.join(columns),
+                                                          placeholders)
+        cur = self.conn.cursor()
+        try:
+            if overwrite:
+                # delete and insert within the same transaction; unlike
+                # INSERT OR REPLACE this keeps the spatial index up to date
+                cur.executemany('DELETE FROM %s WHERE %s=?;' % (table, key),
+                                [(r[ix],) for r in wkb_rows+wkt_rows])
+            if wkb_rows:
+                cur.executemany(sql % 'GeomFromWKB(?, 4326)', wkb_rows)
+            if wkt_rows:
+                cur.executemany(sql % 'GeomFromText(?, 4326)', wkt_rows)
+            self.conn.commit()
+        except:
+            self.conn.rollback()
+            raise
+        return len(wkb_rows)+len(wkt_rows)
+
+    def insert_flight_tracks(self, rows, overwrite=False):
+        """
+        Inserts many flight tracks in one transaction.
+
+        :param rows: list of (fid, date, geometry) tuples. The geometry is
+          a numpy array with shape (n, 3) (lon, lat, alt), WKB or WKT
+        :type rows: list
+        :param overwrite: replace existing flight tracks
+        :type overwrite: boolean
+        :return: number of rows
+
+        >>> sdb = FAAM_Spatial_DB('/home/axel/faam.sqlite')
+        >>> sdb.insert_flight_tracks([('b991', datetime.date(2016, 11, 30), ds.coords.simplified())])
+        Out[1]: 1
+        """
+        rows = [(fid, dt.strftime('%Y-%m-%d'), geom) for fid, dt, geom in rows]
+        return self._bulk_insert_('flight_tracks', ['fid', 'date', 'the_geom'], 'fid', rows, overwrite)
+
+    def insert_fltsumm_events(self, rows, overwrite=False):
+        """
+        Inserts many flight summary events in one transaction.
+
+        :param rows: list of (fid, desc, start time, end time, geometry)
+          tuples. The geometry is a numpy array with shape (n, 3)
+          (lon, lat, alt), WKB or WKT
+        :type rows: list
+        :param overwrite: replace existing events
+        :type overwrite: boolean
+        :return: number of rows
+        """
+        _rows = []
+        for fid, desc, sdt, edt, geom in rows:
+            # creating an unique id using fid and start time
+            _id = '%s_%s' % (fid, sdt.strftime('%Y%m%dT%H%M%S'))
+            _rows.append((_id,
+                          fid,
+                          desc,
+                          sdt.strftime('%Y-%m-%dT%H:%M:%S'),
+                          edt.strftime('%Y-%m-%dT%H:%M:%S'),
+                          geom))
+        return self._bulk_insert_('fltsumm_event',
+                                  ['id', 'fid', 'desc', 'start_datetime', 'end_datetime', 'the_geom'],
+                                  'id', _rows, overwrite)
+
+    def insert_flight_track(self, fid, dt, wkt, overwrite=False):
+        """
+        :param fid: flight id
+        :param dt: date of the flight
+        :param wkt: geometry as well known text, WKB or numpy array
+        """
+        self.insert_flight_tracks([(fid, dt, wkt)], overwrite=overwrite)
         return
 
     def insert_fltsumm_event(self, fid, desc, sdt, edt, wkt, overwrite=False):
@@ -76,31 +378,220 @@ class FAAM_Spatial_DB(object):
         :param fid: flight id
         :param sdt: start time
         :param edt: end time
-        :param wkt: well known text representation
+        :param wkt: well known text representation, WKB or numpy array
+        """
+        self.insert_fltsumm_events([(fid, desc, sdt, edt, wkt)], overwrite=overwrite)
+        return
+
+    def _rtree_(self, table):
+        """
+        Subquery that returns the rowids of all geometries whose boundary
+        box intersects with the boundary box (xmin, ymin, xmax, ymax) given
+        as parameters; uses the R-tree of the spatial index
         """
+        return 'SELECT pkid FROM idx_%s_the_geom WHERE xmin <= ? AND xmax >= ? AND ymin <= ? AND ymax >= ?' % table
+
+    def _flights_(self, bbox, where='', params=(), start=None, end=None, geometry=None):
+        """
+        Flights whose boundary box intersects with *bbox* and which match the
+        additional *where* condition
+        """
+        xmin, ymin, xmax, ymax = bbox
+        columns = 'FT.fid, FT.date'
+        if geometry:
+            columns += ', %s' % geometry
+        sql = 'SELECT %s FROM flight_tracks FT WHERE FT.ROWID IN (%s)' % (columns, self._rtree_('flight_tracks'))
+        _params = [xmax, xmin, ymax, ymin]
+        if start is not None:
+            sql += ' AND FT.date >= ?'
+            _params.append(_to_date_str_(start, '%Y-%m-%d'))
+        if end is not None:
+            sql += ' AND FT.date <= ?'
+            _params.append(_to_date_str_(end, '%Y-%m-%d'))
+        if where:
+            sql += ' AND %s' % where
+            _params += list(params)
+        sql += ' ORDER BY FT.fid;'
         cur = self.conn.cursor()
-        # creating an unique id using fid and start time
-        _id = '%s_%s' % (fid, sdt.strftime('%Y%m%dT%H%M%S'))
-
-        if overwrite:
-            sql = """SELECT * from fltsumm_event where id=='%s';""" % (_id,)
-            cur.execute(sql)
-            res = cur.fetchone()
-            if res:
-                cur.execute("DELETE FROM fltsumm_event where id=='%s';" % (_id,))
-
-        geom = "GeomFromText('" + wkt + "', 4326)"
-        sql = "INSERT INTO fltsumm_event(id, fid, desc, start_datetime, end_datetime, the_geom) "
-        sql += "VALUES ('%s', '%s', '%s', '%s', '%s', %s);" % (_id,
-                                                               fid,
-                                                               desc,
-                                                               sdt.strftime('%Y-%m-%dT%H:%M:%S'),
-                                                               edt.strftime('%Y-%m-%dT%H:%M:%S'),
-                                                               geom)
+        cur.execute(sql, _params)
+        return cur.fetchall()
+
+    def _result_(self, rows, dtype, as_type, extra=None):
+        """
+        Converts query results into a numpy structured array or a GeoJSON
+        FeatureCollection. For GeoJSON the last column of the rows has to be
+        the geometry as GeoJSON.
+        """
+        if as_type == 'geojson':
+            features = []
+            for i, row in enumerate(rows):
+                properties = dict(zip([d[0] for d in dtype], row[:len(dtype)]))
+                if extra is not None:
+                    properties[extra[0]] = float(extra[1][i])
+                features.append('{"type": "Feature", "geometry": %s, "properties": %s}' % (row[-1], json.dumps(properties)))
+            return '{"type": "FeatureCollection", "features": [%s]}' % (', '.join(features))
+        elif as_type != 'numpy':
+            raise ValueError('Unknown result type: %s' % as_type)
+        if extra is not None:
+            dtype = dtype+[(extra[0], 'f8')]
+            rows = [tuple(r[:len(dtype)-1])+(float(v),) for r, v in zip(rows, extra[1])]
+        else:
+            rows = [tuple(r[:len(dtype)]) for r in rows]
+        return np.array(rows, dtype=dtype)
+
+    def flights_in_bbox(self, bbox, start=None, end=None, as_type='numpy'):
+        """
+        Flights whose tracks intersect a boundary box.
+
+        :param tuple bbox: (lon_min, lat_min, lon_max, lat_max)
+        :param start: earliest flight date
+        :type start: datetime.date or str ('YYYY-mm-dd')
+        :param end: latest flight date
+        :param str as_type: 'numpy' returns a structured array with the fields
+          fid and date; 'geojson' returns a FeatureCollection
+        """
+        geometry = 'AsGeoJSON(FT.the_geom)' if as_type == 'geojson' else None
+        rows = self._flights_(bbox,
+                              where='ST_Intersects(FT.the_geom, BuildMbr(?, ?, ?, ?, 4326))',
+                              params=tuple(bbox), start=start, end=end, geometry=geometry)
+        return self._result_(rows, _FLIGHT_DTYPE, as_type)
+
+    def flights_intersecting(self, wkt, start=None, end=None, as_type='numpy'):
+        """
+        Flights whose tracks intersect a geometry, e.g. a polygon.
+
+        :param str wkt: geometry as well known text (EPSG:4326)
+        :param start: earliest flight date
+        :type start: datetime.date or str ('YYYY-mm-dd')
+        :param end: latest flight date
+        :param str as_type: 'numpy' or 'geojson'
+        """
         cur = self.conn.cursor()
-        cur.execute(sql)
-        self.conn.commit()
-        return
+        cur.execute('SELECT MbrMinX(g), MbrMinY(g), MbrMaxX(g), MbrMaxY(g) FROM (SELECT GeomFromText(?, 4326) AS g);', (wkt,))
+        bbox = cur.fetchone()
+        if bbox is None or bbox[0] is None:
+            raise ValueError('Invalid geometry: %s' % wkt)
+        geometry = 'AsGeoJSON(FT.the_geom)' if as_type == 'geojson' else None
+        rows = self._flights_(bbox,
+                              where='ST_Intersects(FT.the_geom, GeomFromText(?, 4326))',
+                              params=(wkt,), start=start, end=end, geometry=geometry)
+        return self._result_(rows, _FLIGHT_DTYPE, as_type)
+
+    def _distances_(self, lon, lat, distance, start, end, geojson):
+        geometry = 'AsBinary(FT.the_geom)'
+        if geojson:
+            geometry += ', AsGeoJSON(FT.the_geom)'
+        rows = self._flights_(_distance_bbox_(lon, lat, distance), start=start, end=end, geometry=geometry)
+        dist = np.empty(len(rows))
+        for i, row in enumerate(rows):
+            coords = from_wkb(row[2])
+            dist[i] = _track_distance_(coords, lon, lat)
+        return rows, dist
+
+    def flights_within_distance(self, lon, lat, distance, start=None, end=None, as_type='numpy'):
+        """
+        Flights that came closer than *distance* to a point. The distance
+        is measured to the closest point on the stored track, which can lie
+        between two vertices. The result
+        is sorted by distance.
+
+        :param float lon: longitude
+        :param float lat: latitude
+        :param float distance: maximum distance in m
+        :param start: earliest flight date
+        :param end: latest flight date
+        :param str as_type: 'numpy' or 'geojson'; the distance is added as
+          field/property
+        """
+        rows, dist = self._distances_(lon, lat, distance, start, end, as_type == 'geojson')
+        ix = [i for i in np.argsort(dist, kind='mergesort') if dist[i] <= distance]
+        return self._result_([rows[i] for i in ix], _FLIGHT_DTYPE, as_type, extra=('distance', dist[ix]))
+
+    def nearest_flights(self, lon, lat, n=1, max_distance=1000000., start=None, end=None, as_type='numpy'):
+        """
+        The *n* flights that came closest to a point. The search radius is
+        increased until enough candidates are found in the spatial index.
+
+        :param float lon: longitude
+        :param float lat: latitude
+        :param int n: number of flights
+        :param float max_distance: maximum search radius in m
+        :param str as_type: 'numpy' or 'geojson'
+        """
+        radius = min(10000., max_distance)
+        while True:
+            rows, dist = self._distances_(lon, lat, radius, start, end, as_type == 'geojson')
+            # only distances within the radius are certain to be the smallest
+            if np.sum(dist <= radius) >= n or radius >= max_distance:
+                break
+            radius = min(radius*4, max_distance)
+        ix = [i for i in np.argsort(dist, kind='mergesort') if dist[i] <= radius][:n]
+        return self._result_([rows[i] for i in ix], _FLIGHT_DTYPE, as_type, extra=('distance', dist[ix]))
+
+    def events_in_time_range(self, start, end, fids=[], as_type='numpy'):
+        """
+        Flight summary events that overlap with a time period.
+
+        :param start: start of the period
+        :type start: datetime.datetime or str ('YYYY-mm-ddTHH:MM:SS')
+        :param end: end of the period
+        :param fids: only events from these flights
+        :type fids: list
+        :param str as_type: 'numpy' returns a structured array with the fields
+          id, fid, desc, start_datetime, end_datetime; 'geojson' returns a
+          FeatureCollection
+        """
+        columns = 'id, fid, desc, start_datetime, end_datetime'
+        if as_type == 'geojson':
+            columns += ', AsGeoJSON(the_geom)'
+        # events are never longer than a flight; the limit on the start time
+        # allows the use of the index
+        sql = 'SELECT %s FROM fltsumm_event WHERE start_datetime <= ? AND start_datetime >= ? AND end_datetime >= ?' % columns
+        end = _to_date_str_(end, '%Y-%m-%dT%H:%M:%S')
+        start = _to_date_str_(start, '%Y-%m-%dT%H:%M:%S')
+        earliest = (datetime.datetime.strptime(start[:10], '%Y-%m-%d')-datetime.timedelta(days=2)).strftime('%Y-%m-%d')
+        params = [end, earliest, start]
+        if fids:
+            sql += ' AND fid IN (%s)' % ', '.join(['?']*len(fids))
+            params += list(fids)
+        sql += ' ORDER BY start_datetime;'
+        cur = self.conn.cursor()
+        cur.execute(sql, params)
+        return self._result_(cur.fetchall(), _EVENT_DTYPE, as_type)
+
+    def get_flight_tracks(self, fids=[], simplify=None):
+        """
+        Returns the flight tracks as coordinate arrays.
+
+        :param fids: list of flight ids. By default all flights are returned
+        :type fids: list
+        :param float simplify: tolerance (degrees) for simplifying the tracks
+        :return: dictionary with the fid as key and an array with shape
+          (n, 3) (lon, lat, alt) as value
+        :rtype: dict
+        """
+        geometry = 'the_geom'
+        params = []
+        if simplify:
+            geometry = 'Simplify(the_geom, ?)'
+            params.append(simplify)
+        sql = 'SELECT fid, AsGeoJSON(%s) FROM flight_tracks' % geometry
+        if fids:
+            # sqlite limits the number of parameters in one statement
+            chunks = [list(fids[i:i+500]) for i in range(0, len(fids), 500)]
+            queries = [(sql+' WHERE fid IN (%s);' % ', '.join(['?']*len(c)), params+c) for c in chunks]
+        else:
+            queries = [(sql+';', params)]
+        cur = self.conn.cursor()
+        rows = []
+        for _sql, _params in queries:
+            cur.execute(_sql, _params)
+            rows += cur.fetchall()
+        result = {}
+        for fid, geojson in rows:
+            if geojson:
+                result[fid] = np.array(json.loads(geojson)['coordinates'], dtype=np.float64).reshape((-1, 3))
+        return result
 
     def clean(self):
         cur = self.conn.cursor()
@@ -109,10 +600,9 @@ class FAAM_Spatial_DB(object):
         return
 
     def check_exists(self, fid):
-        sql = 'SELECT fid FROM flight_tracks;'
         cur = self.conn.cursor()
-        cur.execute(sql)
-        if fid in [i[0] for i in cur.fetchall()]:
+        cur.execute('SELECT 1 FROM flight_tracks WHERE fid=? LIMIT 1;', (fid,))
+        if cur.fetchone():
             return True
         else:
             return False
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+"""
+Columnar export of FAAM core data for analytics.
+
+Core files are exported into a store, which is a directory that holds the
+data of many flights either as Parquet files (one directory per flight and
+one file per frequency) or as a Zarr hierarchy (one group per flight and
+one array per variable, chunked along time). Variables keep their native
+frequency. Missing values (-9999) and samples with a flag greater than
+*max_flag* are stored as NaN.
+
+Every store has a small catalog (_catalog.json) with the time range and the
+variables of each flight. The reader uses the catalog to decide which
+flights it has to open and only reads the requested columns and time
+ranges, so that querying one variable across hundreds of flights does not
+involve opening all the core files.
+
+Parquet export requires pyarrow, the Zarr export requires zarr.
+
+>>> from faampy.core.faam_data import FAAM_Dataset
+>>> from faampy.core.faam_store import FAAM_Store, export_dataset
+>>> ds = FAAM_Dataset('core_faam_20161130_v004_r0_b991.nc')
+>>> export_dataset(ds, '/home/axel/faam_store', fmt='parquet')
+>>> store = FAAM_Store('/home/axel/faam_store')
+>>> data = store.read(['TAT_DI_R', 'CO_AERO'], start='2016-11-30T10:00:00')
+>>> data.keys()
+Out[1]: [1, 32]
+
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from faampy.core.utils import get_fid
+from faampy.utils.file_info import get_fid_from_filename
+
+
+CATALOG_FILENAME = '_catalog.json'
+
+FORMATS = ('parquet', 'zarr')
+
+
+def _get_frequency_(var):
+    if len(var.shape) == 1:
+        return 1
+    return int(var.shape[1])
+
+
+def _get_dataset_fid_(ds):
+    try:
+        fid = get_fid(ds.ds)
+    except IndexError:
+        fid = ''
+    if not fid:
+        fid = get_fid_from_filename(os.path.basename(ds.ds.filepath()))
+    return fid
+
+
+def _sample_timestamps_(index, freq):
+    """
+    Timestamps for every sample of a variable with *freq* samples per second
+    """
+    index = np.asarray(index, dtype='datetime64[ns]')
+    if freq == 1:
+        return index
+    offsets = (np.arange(freq)*(10**9//freq)).astype('timedelta64[ns]')
+    return (index[:, np.newaxis]+offsets).ravel()
+
+
+def _read_masked_(ds, v_name, slc, max_flag):
+    """
+    Reads a chunk of a variable and sets missing and flagged samples to NaN
+    """
+    data = ds._read_(v_name, slc)
+    if v_name.endswith('_FLAG'):
+        return data
+    if data.dtype.kind != 'f':
+        data = data.astype(np.float64)
+    else:
+        data = data.copy()
+    data[data == -9999.] = np.nan
+    flag_name = v_name+'_FLAG'
+    if max_flag is not None and flag_name in ds.variables:
+        if ds.variables[flag_name].shape == ds.variables[v_name].shape:
+            data[ds._read_(flag_name, slc) > max_flag] = np.nan
+    return data
+
+
+class Catalog(object):
+    """
+    Table of contents of a store; a json file with one entry per flight
+    """
+
+    def __init__(self, path):
+        self.filename = os.path.join(path, CATALOG_FILENAME)
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r') as f:
+                content = json.load(f)
+        else:
+            content = {'format': None, 'flights': {}}
+        self.format = content['format']
+        self.flights = content['flights']
+
+    def save(self):
+        tmp_filename = self.filename+'.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump({'format': self.format, 'flights': self.flights}, f, indent=1, sort_keys=True)
+        os.rename(tmp_filename, self.filename)
+
+    def get_fids(self, varnames=[], start=None, end=None):
+        """
+        Flights that have at least one of the variables and overlap with the
+        time period
+        """
+        result = []
+        for fid in sorted(self.flights.keys()):
+            entry = self.flights[fid]
+            if varnames and not set(varnames).intersection(entry['variables']):
+                continue
+            if start is not None and np.datetime64(entry['end']) < start:
+                continue
+            if end is not None and np.datetime64(entry['start']) >= end:
+                continue
+            result.append(fid)
+        return result
+
+
+def _write_parquet_(ds, path, groups, chunks, index, max_flag, compression):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    for freq, varnames in sorted(groups.items()):
+        filename = os.path.join(path, 'sps%02i.parquet' % freq)
+        writer = None
+        try:
+            for slc in chunks:
+                columns = {'timestamp': _sample_timestamps_(index[slc], freq)}
+                for v_name in varnames:
+                    columns[v_name] = _read_masked_(ds, v_name, slc, max_flag).ravel()
+                # each time chunk becomes one row group, which allows the
+                # reader to skip row groups outside of the time range
+                table = pa.Table.from_pandas(pd.DataFrame(columns, columns=['timestamp', ]+varnames),
+                                             preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(filename, table.schema, compression=compression)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+def _write_zarr_(ds, path, groups, chunks, index, max_flag, chunk_size):
+    import zarr
+
+    grp = zarr.open_group(path, mode='w')
+    n = index.size
+    grp.create_dataset('index', data=np.asarray(index, dtype='datetime64[s]'), chunks=(chunk_size,))
+    for freq, varnames in sorted(groups.items()):
+        for v_name in varnames:
+            shape = ds.variables[v_name].shape
+            is_flag = v_name.endswith('_FLAG')
+            if is_flag:
+                dtype, fill_value = ds.variables[v_name].dtype, -1
+            elif ds.variables[v_name].dtype.kind == 'f':
+                dtype, fill_value = ds.variables[v_name].dtype, np.nan
+            else:
+                dtype, fill_value = np.float64, np.nan
+            arr = grp.create_dataset(v_name, shape=(n,)+tuple(shape[1:]), dtype=dtype,
+                                     chunks=(chunk_size,)+tuple(shape[1:]), fill_value=fill_value)
+            arr.attrs['frequency'] = freq
+            for slc in chunks:
+                arr[slc] = _read_masked_(ds, v_name, slc, max_flag)
+
+
+def export_dataset(ds, path, fmt='parquet', varnames=[], max_flag=2, include_flags=True,
+                   chunk_size=3600, compression='snappy'):
+    """
+    Exports a FAAM_Dataset into a columnar store. Existing data for the same
+    flight are replaced. The data are copied in chunks along the time axis,
+    so the memory usage does not depend on the size of the core file.
+
+    :param ds: core data
+    :type ds: FAAM_Dataset
+    :param str path: directory of the store
+    :param str fmt: 'parquet' or 'zarr'. All flights in one store have to
+      use the same format
+    :param varnames: list of variables. By default all time series are
+      exported
+    :type varnames: list
+    :param int max_flag: samples with a flag greater than max_flag are set
+      to NaN. Use None to keep all samples
+    :param include_flags: export the _FLAG variables as well
+    :type include_flags: boolean
+    :param int chunk_size: number of seconds per chunk (Parquet row group
+      or Zarr chunk)
+    :param str compression: Parquet compression codec
+    :return: flight id
+    """
+    if fmt not in FORMATS:
+        raise ValueError('Unknown format: %s. Valid formats are: %s' % (fmt, ', '.join(FORMATS)))
+    if not os.path.exists(path):
+        os.makedirs(path)
+    catalog = Catalog(path)
+    if catalog.format and catalog.format != fmt:
+        raise ValueError('Store %s uses the %s format' % (path, catalog.format))
+    catalog.format = fmt
+
+    fid = _get_dataset_fid_(ds)
+    if not varnames:
+        varnames = sorted(ds.variables.keys())
+    groups = {}
+    for v_name in varnames:
+        if v_name == 'Time' or not ds._is_time_series_(v_name):
+            continue
+        if v_name.endswith('_FLAG') and not include_flags:
+            continue
+        groups.setdefault(_get_frequency_(ds.variables[v_name]), []).append(v_name)
+
+    index = ds.index
+    n = index.size
+    chunk_size = max(1, min(chunk_size, n))
+    chunks = [slice(i, min(i+chunk_size, n)) for i in range(0, n, chunk_size)]
+
+    flight_path = os.path.join(path, 'fid=%s' % fid)
+    if os.path.exists(flight_path):
+        shutil.rmtree(flight_path)
+    if fmt == 'parquet':
+        os.makedirs(flight_path)
+        _write_parquet_(ds, flight_path, groups, chunks, index, max_flag, compression)
+    else:
+        _write_zarr_(ds, flight_path, groups, chunks, index, max_flag, chunk_size)
+
+    variables = {}
+    for freq, v_names in groups.items():
+        for v_name in v_names:
+            variables[v_name] = freq
+    catalog.flights[fid] = {'start': str(np.datetime64(index[0], 's')),
+                            'end': str(np.datetime64(index[-1], 's')),
+                            'variables': variables,
+                            'filename': os.path.abspath(ds.ds.filepath())}
+    catalog.save()
+    return fid
+
+
+class FAAM_Store(object):
+    """
+    Reader for a store that was written with export_dataset.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: directory of the store
+        """
+        if not os.path.exists(os.path.join(path, CATALOG_FILENAME)):
+            raise IOError('No FAAM store found in %s' % path)
+        self.path = path
+        self.catalog = Catalog(path)
+
+    @property
+    def fids(self):
+        return sorted(self.catalog.flights.keys())
+
+    @property
+    def var_names(self):
+        result = set()
+        for entry in self.catalog.flights.values():
+            result.update(entry['variables'].keys())
+        return sorted(result)
+
+    def _read_parquet_flight_(self, fid, freq, varnames, start, end):
+        import pyarrow.parquet as pq
+
+        filename = os.path.join(self.path, 'fid=%s' % fid, 'sps%02i.parquet' % freq)
+        filters = []
+        if start is not None:
+            filters.append(('timestamp', '>=', pd.Timestamp(start)))
+        if end is not None:
+            filters.append(('timestamp', '<', pd.Timestamp(end)))
+        table = pq.read_table(filename, columns=['timestamp', ]+varnames, filters=filters or None)
+        return table.to_pandas().set_index('timestamp')
+
+    def _read_zarr_flight_(self, fid, freq, varnames, start, end):
+        import zarr
+
+        grp = zarr.open_group(os.path.join(self.path, 'fid=%s' % fid), mode='r')
+        index = grp['index'][:]
+        s_ix, e_ix = 0, index.size
+        if start is not None:
+            s_ix = int(np.searchsorted(index, start, side='left'))
+        if end is not None:
+            e_ix = int(np.searchsorted(index, end, side='left'))
+        timestamp = _sample_timestamps_(index[s_ix:e_ix], freq)
+        columns = dict([(v, grp[v][s_ix:e_ix].ravel()) for v in varnames])
+        return pd.DataFrame(columns, index=pd.DatetimeIndex(timestamp, name='timestamp'), columns=varnames)
+
+    def read(self, varnames, start=None, end=None, fids=[]):
+        """
+        Reads variables from all flights in the store that overlap with the
+        time period. Only the requested columns are read.
+
+        :param varnames: list of variable names
+        :type varnames: list
+        :param start: start of the time period
+        :type start: datetime.datetime, numpy.datetime64 or str
+        :param end: end of the time period
+        :param fids: list of flight ids. By default all flights are used
+        :type fids: list
+        :return: dictionary with one pandas.DataFrame per frequency. The
+          timestamp of every sample is used as index and the flight id is
+          stored in the column 'fid'
+        :rtype: dict
+        """
+        if start is not None:
+            start = np.datetime64(start, 's')
+        if end is not None:
+            end = np.datetime64(end, 's')
+        frames = {}
+        for fid in self.catalog.get_fids(varnames=varnames, start=start, end=end):
+            if fids and fid not in fids:
+                continue
+            available = self.catalog.flights[fid]['variables']
+            groups = {}
+            for v_name in varnames:
+                if v_name in available:
+                    groups.setdefault(available[v_name], []).append(v_name)
+            for freq, v_names in groups.items():
+                if self.catalog.format == 'parquet':
+                    df = self._read_parquet_flight_(fid, freq, v_names, start, end)
+                else:
+                    df = self._read_zarr_flight_(fid, freq, v_names, start, end)
+                if not df.shape[0]:
+                    continue
+                df.insert(0, 'fid', fid)
+                frames.setdefault(freq, []).append(df)
+        result = {}
+        for freq, dfs in frames.items():
+            # variables that are missing for a flight become NaN columns
+            columns = ['fid', ]+[v for v in varnames if any([v in df.columns for df in dfs])]
+            result[freq] = pd.concat(dfs).reindex(columns=columns)
+        return result
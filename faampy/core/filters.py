@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+"""
+Filter compiler for FAAM core data.
+
+A filter selects the rows (seconds) of a core file for which a number of
+conditions are true. The result is a boolean mask that is calculated in
+one vectorised pass over the variables. Conditions can be given as
+
+  * a list of (variable, (min, max)) tuples, as used by the data_filter
+    function; all conditions have to be true. None for min or max means
+    that the range is open
+  * an expression string with comparisons that are combined with
+    and/or/not (or &, |, ~), e.g. 'ALT_GIN > 1000 and WOW_IND == 0' or
+    '250 < TAT_DI_R < 300'
+
+Compiled filters can be combined with & (and), | (or) and ~ (not). For
+variables with more than one sample per second, a row is only selected if
+the condition is true for all samples within that second. NaNs never
+pass a comparison. Variables that are not in the dataset are looked up in
+the registry of derived variables.
+
+>>> from faampy.core.filters import compile_filter, get_mask
+>>> f = compile_filter([('Time', (20000, 22000)), ('ALT_GIN', (0, 4000))])
+>>> mask = f(ds)
+>>> mask = get_mask(ds, 'ALT_GIN > 1000 and WOW_IND == 0')
+
+"""
+
+import ast
+import operator
+import weakref
+
+import numpy as np
+
+from faampy.core.derived import get_derived
+
+
+_MASK_CACHE = weakref.WeakKeyDictionary()
+
+_COMPARE_OPERATORS = {ast.Lt: operator.lt,
+                      ast.LtE: operator.le,
+                      ast.Gt: operator.gt,
+                      ast.GtE: operator.ge,
+                      ast.Eq: operator.eq,
+                      ast.NotEq: operator.ne}
+
+# numbers are ast.Num in python2 and ast.Constant in python3
+_NUMBER_NODES = tuple([getattr(ast, n) for n in ('Num', 'Constant') if hasattr(ast, n)])
+
+
+def _rows_(mask):
+    """
+    Reduces a mask of a multi-rate variable to one value per row
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if mask.ndim > 1:
+        return mask.reshape((mask.shape[0], -1)).all(axis=1)
+    return mask
+
+
+def _as_mask_(value):
+    """
+    Converts the value of a node into a mask with one value per row. Numbers
+    are true if they are not zero
+    """
+    if isinstance(value, np.ndarray) and value.dtype == bool:
+        return value
+    with np.errstate(invalid='ignore'):
+        return _rows_(np.asarray(value) != 0)
+
+
+class _Reader_(object):
+    """
+    Reads each variable only once while a filter is evaluated
+    """
+
+    def __init__(self, ds):
+        self.ds = ds
+        self.data = {}
+
+    def __call__(self, name):
+        if name not in self.data:
+            if name in self.ds.variables:
+                data = np.asarray(self.ds.variables[name][:])
+            else:
+                data = get_derived(self.ds, name)
+            if data.dtype.kind in 'iuf':
+                data = data.astype(np.float64)
+                data[data == -9999.] = np.nan
+            self.data[name] = data
+        return self.data[name]
+
+
+class Filter(object):
+    """
+    Compiled filter. Calling the filter with a dataset returns the boolean
+    mask of the selected rows.
+    """
+
+    def __init__(self, key, func, varnames):
+        self.key = key
+        self.func = func
+        self.varnames = tuple(varnames)
+
+    def __repr__(self):
+        return 'Filter(%s)' % self.key
+
+    def __call__(self, ds):
+        return self.func(_Reader_(ds))
+
+    def __and__(self, other):
+        other = compile_filter(other)
+        return Filter('(%s) & (%s)' % (self.key, other.key),
+                      lambda read: self.func(read) & other.func(read),
+                      self.varnames+other.varnames)
+
+    def __or__(self, other):
+        other = compile_filter(other)
+        return Filter('(%s) | (%s)' % (self.key, other.key),
+                      lambda read: self.func(read) | other.func(read),
+                      self.varnames+other.varnames)
+
+    def __invert__(self):
+        return Filter('~(%s)' % self.key,
+                      lambda read: ~self.func(read),
+                      self.varnames)
+
+
+def _range_filter_(varname, value_range):
+    vmin, vmax = value_range
+
+    def func(read):
+        data = read(varname)
+        mask = np.isfinite(data)
+        if vmin is not None:
+            mask &= data >= vmin
+        if vmax is not None:
+            mask &= data <= vmax
+        return _rows_(mask)
+    return Filter('%s in [%s, %s]' % (varname, vmin, vmax), func, [varname, ])
+
+
+def _compile_node_(node, varnames):
+    """
+    Turns a node of the expression's syntax tree into a function. Only
+    comparisons, boolean operators, variable names and numbers are allowed.
+    """
+    if isinstance(node, ast.Expression):
+        return _compile_node_(node.body, varnames)
+    if isinstance(node, ast.BoolOp):
+        funcs = [_compile_node_(v, varnames) for v in node.values]
+        if isinstance(node.op, ast.And):
+            return lambda read: np.logical_and.reduce([_as_mask_(f(read)) for f in funcs])
+        return lambda read: np.logical_or.reduce([_as_mask_(f(read)) for f in funcs])
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        left = _compile_node_(node.left, varnames)
+        right = _compile_node_(node.right, varnames)
+        if isinstance(node.op, ast.BitAnd):
+            return lambda read: _as_mask_(left(read)) & _as_mask_(right(read))
+        return lambda read: _as_mask_(left(read)) | _as_mask_(right(read))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+        operand = _compile_node_(node.operand, varnames)
+        # ~ on a float array raises a TypeError
+        return lambda read: ~_as_mask_(operand(read))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        operand = _compile_node_(node.operand, varnames)
+        return lambda read: -operand(read)
+    if isinstance(node, ast.Compare):
+        operands = [_compile_node_(n, varnames) for n in [node.left, ]+list(node.comparators)]
+        ops = []
+        for op in node.ops:
+            if type(op) not in _COMPARE_OPERATORS:
+                raise ValueError('Operator not supported in filter: %s' % type(op).__name__)
+            ops.append(_COMPARE_OPERATORS[type(op)])
+
+        def func(read):
+            values = [f(read) for f in operands]
+            mask = True
+            for i, op in enumerate(ops):
+                with np.errstate(invalid='ignore'):
+                    mask = mask & op(values[i], values[i+1])
+            # NaN != x is true
+            for v in values:
+                if isinstance(v, np.ndarray) and v.dtype.kind == 'f':
+                    mask = mask & ~np.isnan(v)
+            return _rows_(mask)
+        return func
+    if isinstance(node, ast.Name):
+        varnames.append(node.id)
+        # a variable on its own is true if it is not zero
+        return lambda read: read(node.id)
+    if isinstance(node, _NUMBER_NODES):
+        value = node.n if hasattr(node, 'n') else node.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError('Only numbers are supported as constants in filters')
+        return lambda read: value
+    raise ValueError('Expression not supported in filter: %s' % type(node).__name__)
+
+
+def _expression_filter_(expression):
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError:
+        raise ValueError('Invalid filter expression: %s' % expression)
+    varnames = []
+    node_func = _compile_node_(tree, varnames)
+
+    def func(read):
+        # e.g. 'WOW_IND' on its own
+        return _as_mask_(node_func(read))
+    return Filter(expression.strip(), func, varnames)
+
+
+def compile_filter(definition):
+    """
+    Compiles a filter definition.
+
+    :param definition: list of (variable, (min, max)) tuples, expression
+      string or Filter
+    :return: compiled filter
+    :rtype: Filter
+    """
+    if isinstance(definition, Filter):
+        return definition
+    if isinstance(definition, str):
+        return _expression_filter_(definition)
+    if isinstance(definition, (list, tuple)):
+        if len(definition) == 2 and isinstance(definition[0], str) and \
+           isinstance(definition[1], (list, tuple)) and not isinstance(definition[1][0], (list, tuple)):
+            # a single (variable, (min, max)) condition
+            return _range_filter_(definition[0], definition[1])
+        if not definition:
+            raise ValueError('Empty filter definition')
+        result = compile_filter(definition[0])
+        for item in definition[1:]:
+            result = result & compile_filter(item)
+        return result
+    raise ValueError('Unknown filter definition: %s' % (definition,))
+
+
+def _ref_(obj):
+    try:
+        return weakref.ref(obj)
+    except TypeError:
+        # e.g. None for derived variables
+        return lambda: obj
+
+
+def _state_(ds, f):
+    """
+    The variables that a filter reads and the number of times they were
+    modified. A cached mask is only valid as long as the variables were
+    neither replaced (e.g. by merge) nor changed through the Lazy_Variable.
+    Weak references are used, because the variables of a FAAM_Dataset can
+    refer to the dataset, which would then never be removed from the cache.
+    """
+    result = []
+    for name in f.varnames:
+        var = ds.variables[name] if name in ds.variables else None
+        result.append((_ref_(var), getattr(var, '_version', 0)))
+    return result
+
+
+def _same_state_(a, b):
+    return len(a) == len(b) and all([x[0]() is y[0]() and x[1] == y[1] for x, y in zip(a, b)])
+
+
+def get_mask(ds, definition, cache=True):
+    """
+    Returns the boolean mask of the rows that pass the filter.
+
+    :param ds: core data
+    :type ds: FAAM_Dataset or netCDF4.Dataset
+    :param definition: list of (variable, (min, max)) tuples, expression
+      string or Filter
+    :param cache: keep the mask for the lifetime of the dataset object, so
+      that the same filter is only evaluated once. The mask is evaluated
+      again if the variables it uses were replaced or changed
+    :type cache: boolean
+    :return: mask with one value for each row of the 'Time' variable
+    :rtype: numpy.array of booleans
+    """
+    f = compile_filter(definition)
+    if not cache:
+        return f(ds)
+    if ds not in _MASK_CACHE:
+        _MASK_CACHE[ds] = {}
+    state = _state_(ds, f)
+    if f.key not in _MASK_CACHE[ds] or not _same_state_(_MASK_CACHE[ds][f.key][0], state):
+        _MASK_CACHE[ds][f.key] = (state, f(ds))
+    return _MASK_CACHE[ds][f.key][1]
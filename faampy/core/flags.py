@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+"""
+Flag masking for FAAM core data.
+
+Every core variable can have a corresponding _FLAG variable with values
+between 0 (good data) and 3 (no data). The functions in this module build
+the masks for a list of variables in one go: the flags of all variables
+that have the same shape are read into one flag matrix and compared with
+the set of accepted flags in a single vectorised operation. Samples with the
+missing value (-9999) or NaN are rejected as well.
+
+The functions work with the FAAM_Dataset and the netCDF4.Dataset. The
+FAAM_Dataset has the methods get_flag_masks and get_masked, which call
+the functions below.
+
+>>> from faampy.core.flags import get_masked
+>>> data = get_masked(ds, ['TAT_DI_R', 'TAT_ND_R'], accepted_flags=(0, 1), fill='nan')
+>>> data['TAT_DI_R'].shape
+Out[1]: (37137, 32)
+
+"""
+
+import numpy as np
+import numpy.ma as ma
+
+
+ALL_FLAGS = (0, 1, 2, 3)
+
+
+def get_flag_name(ds, v_name):
+    """
+    Returns the name of the flag variable for *v_name* or None if the
+    variable does not have a flag
+    """
+    for flag_name in (v_name+'_FLAG', v_name+'FLAG'):
+        if flag_name in ds.variables:
+            return flag_name
+    return None
+
+
+def _read_(ds, v_name, key):
+    if hasattr(ds, '_read_'):
+        return ds._read_(v_name, key)
+    return np.asarray(ds.variables[v_name][key])
+
+
+def _fit_mask_(mask, shape):
+    """
+    Adjusts a mask to the shape of the data, for variables where the flag
+    has a lower frequency than the data
+    """
+    if mask.shape == shape:
+        return mask
+    rows = mask.reshape((mask.shape[0], -1)).any(axis=1)
+    if len(shape) == 1:
+        return rows
+    return np.broadcast_to(rows[:, np.newaxis], shape)
+
+
+def _flag_matrices_(ds, flag_names, accepted_flags, key):
+    """
+    Reads all flags with the same shape into one matrix and returns the
+    rejected samples for each flag variable
+    """
+    groups = {}
+    for flag_name in flag_names:
+        groups.setdefault(ds.variables[flag_name].shape, []).append(flag_name)
+    result = {}
+    accepted_flags = np.asarray(list(accepted_flags))
+    for names in groups.values():
+        first = _read_(ds, names[0], key)
+        matrix = np.empty((len(names),)+first.shape, dtype=first.dtype)
+        matrix[0] = first
+        for i, flag_name in enumerate(names[1:]):
+            matrix[i+1] = _read_(ds, flag_name, key)
+        rejected = ~np.isin(matrix, accepted_flags)
+        for i, flag_name in enumerate(names):
+            result[flag_name] = rejected[i]
+    return result
+
+
+def _build_(ds, varnames, accepted_flags, key, missing_value):
+    flag_names = {}
+    for v_name in varnames:
+        flag_names[v_name] = get_flag_name(ds, v_name)
+    rejected = _flag_matrices_(ds, set([f for f in flag_names.values() if f]), accepted_flags, key)
+    data, masks = {}, {}
+    for v_name in varnames:
+        data[v_name] = _read_(ds, v_name, key)
+        if flag_names[v_name]:
+            mask = _fit_mask_(rejected[flag_names[v_name]], data[v_name].shape)
+        else:
+            mask = np.zeros(data[v_name].shape, dtype=bool)
+        if missing_value is not None:
+            mask = mask | (data[v_name] == missing_value)
+        if data[v_name].dtype.kind == 'f':
+            mask = mask | np.isnan(data[v_name])
+        masks[v_name] = mask
+    return data, masks
+
+
+def get_flag_masks(ds, varnames, accepted_flags=ALL_FLAGS, key=slice(None), missing_value=-9999.):
+    """
+    Creates the masks for a list of variables. A sample is rejected (True)
+    if its flag is not one of the accepted flags or if it is missing.
+    Variables without a flag are only checked for missing values.
+
+    :param ds: core data
+    :type ds: FAAM_Dataset or netCDF4.Dataset
+    :param varnames: list of variable names
+    :type varnames: list
+    :param accepted_flags: flag values that are accepted
+    :type accepted_flags: tuple
+    :param key: rows that are read, e.g. a slice
+    :param float missing_value: samples with this value are rejected. Use
+      None to only check the flags
+    :return: dictionary with a boolean array for each variable
+    :rtype: dict
+    """
+    return _build_(ds, varnames, accepted_flags, key, missing_value)[1]
+
+
+def get_masked(ds, varnames, accepted_flags=ALL_FLAGS, fill='mask', key=slice(None), missing_value=-9999.):
+    """
+    Reads a list of variables and masks rejected samples. Arrays without
+    rejected samples are returned as they are read, i.e. they are not
+    copied.
+
+    :param ds: core data
+    :type ds: FAAM_Dataset or netCDF4.Dataset
+    :param varnames: list of variable names
+    :type varnames: list
+    :param accepted_flags: flag values that are accepted
+    :type accepted_flags: tuple
+    :param str fill: 'mask' returns numpy masked arrays, 'nan' returns float
+      arrays with rejected samples set to NaN
+    :param key: rows that are read, e.g. a slice
+    :param float missing_value: samples with this value are rejected
+    :return: dictionary with the data for each variable
+    :rtype: dict
+    """
+    if fill not in ('mask', 'nan'):
+        raise ValueError('Unknown fill method: %s' % fill)
+    data, masks = _build_(ds, varnames, accepted_flags, key, missing_value)
+    result = {}
+    for v_name in varnames:
+        if fill == 'mask':
+            result[v_name] = ma.masked_array(data[v_name], mask=masks[v_name], copy=False)
+        elif not masks[v_name].any():
+            result[v_name] = data[v_name]
+        else:
+            dtype = data[v_name].dtype if data[v_name].dtype.kind == 'f' else np.float64
+            values = data[v_name].astype(dtype)
+            values[masks[v_name]] = np.nan
+            result[v_name] = values
+    return result
@@ -110,79 +110,37 @@ import datetime
 import lxml.html
 import netCDF4
 import numpy as np
-import types
 
 import faampy.core.utils
+from faampy.core.calclib import segment_flight
+from faampy.core.kml_writer import KML_Writer
+
+
+def __two_point_event_as_kml__(self, writer=None):
+    kml=writer or KML_Writer(header=False)
+    xyz=np.asarray(self.Coords, dtype=np.float64).reshape((-1, 3))
+    # fails before anything is written if there are no coordinates
+    pt1, pt2=xyz[0], xyz[-1]
+    kml.begin_placemark(self.Name, description='&lt;![CDATA[]]&gt;', style_url='#line')
+    kml.write('<MultiGeometry>\n')
+    kml.write_point(pt1)
+    kml.write_point(pt2)
+    kml.write_linestring(xyz, altitude_mode='absolute', step=15)
+    kml.write('</MultiGeometry>\n')
+    kml.end_placemark()
+    if writer is None:
+        self.kml=kml.getvalue()
+        return self.kml
 
 
-def __two_point_event_as_kml__(self):
-    TEMPLATE="""<Placemark>
-  <name>%s</name>
-  <styleUrl>#line</styleUrl>
-  <description>&lt;![CDATA[]]&gt;</description>
-    <MultiGeometry>
-      <Point>
-        <altitudeMode>absolute</altitudeMode>
-          <coordinates>
-            %s
-          </coordinates>
-      </Point>
-      <Point>
-        <altitudeMode>absolute</altitudeMode>
-          <coordinates>
-            %s
-          </coordinates>
-      </Point>
-        <LineString>
-        <extrude>1</extrude>
-        <tessellate>1</tessellate>
-        <altitudeMode>absolute</altitudeMode>
-        <coordinates>
-          %s
-        </coordinates>
-      </LineString>
-    </MultiGeometry>
-</Placemark>
-"""
-
-    pt1_coord_string='%f,%f,%f\n' % (self.Coords[0][0],
-                                     self.Coords[0][1],
-                                     self.Coords[0][2])
-    pt2_coord_string='%f,%f,%f\n' % (self.Coords[-1][0],
-                                     self.Coords[-1][1],
-                                     self.Coords[-1][2])
-    ls_coord_string=''
-    for c in self.Coords[::15]:
-        ls_coord_string+='%f,%f,%f\n' % (c[0], c[1], c[2])
-
-    result=TEMPLATE % (self.Name,
-		       pt1_coord_string,
-		       pt2_coord_string,
-		       ls_coord_string)
-    self.kml=result
-    return result
-
-
-def __one_point_event_as_kml__(self):
-    TEMPLATE="""<Placemark>
-  <name>%s</name>
-    <description>&lt;![CDATA[]]&gt;</description>
-    <Point>
-    <altitudeMode>absolute</altitudeMode>
-       <coordinates>
-         %s
-       </coordinates>
-    </Point>
-</Placemark>
-"""
-
-    pt_cor_string='%f,%f,%f\n' % (self.Coords[0],
-                                  self.Coords[1],
-                                  self.Coords[2])
-
-    result=TEMPLATE % (self.Name, pt_cor_string)
-    self.kml=result
-    return result
+def __one_point_event_as_kml__(self, writer=None):
+    kml=writer or KML_Writer(header=False)
+    kml.begin_placemark(self.Name, description='&lt;![CDATA[]]&gt;')
+    kml.write_point(self.Coords)
+    kml.end_placemark()
+    if writer is None:
+        self.kml=kml.getvalue()
+        return self.kml
 
 
 class Event(object):
@@ -227,11 +185,12 @@ class Event(object):
             start_time=self.Start_time
             if self.Stop_time:
                 stop_time=self.Stop_time
+        time_index=faampy.core.utils.get_time_index(ds)
         if self.Stop_time:
-            self.Index=range(faampy.core.utils.get_index_from_hhmmss(ds, start_time),
-                             faampy.core.utils.get_index_from_hhmmss(ds, stop_time))
+            self.Index=range(time_index.get_index(start_time),
+                             time_index.get_index(stop_time))
         else:
-            self.Index=faampy.core.utils.get_index_from_hhmmss(ds, start_time)
+            self.Index=time_index.get_index(start_time)
 
     def set_coords(self, ds):
         lon_gin=ds.variables['LON_GIN'][self.Index, 0]
@@ -248,13 +207,14 @@ class Event(object):
             if np.all(np.isnan(self.Coords)):
                 self.Coords=None
 
-    def as_kml(self):
+    def as_kml(self, writer=None):
+        """
+        Returns the event as kml placemark or writes it to a KML_Writer
+        """
         if self.Stop_time:
-            self.as_kml=types.MethodType(__two_point_event_as_kml__, self)
+            return __two_point_event_as_kml__(self, writer)
         else:
-            self.as_kml=types.MethodType(__one_point_event_as_kml__, self)
-        self.as_kml()
-        return self.kml
+            return __one_point_event_as_kml__(self, writer)
 
     def as_txt(self):
         fmt="%-6s  %-6s   %-19s %-17s %3s %s"
@@ -411,13 +371,86 @@ class FlightSummary(object):
                 self.Entries.append(e)
         self.Entries.sort(key=lambda x: x.Start_time)
 
+    def resolve(self, ds):
+        """
+        Sets the time index and the coordinates for all events in one go.
+        The event times are converted to indices with a single binary
+        search on the Time variable, and the coordinate variables are read
+        only once. The coordinates of each event are views of those arrays,
+        i.e. no data are copied per event. Events that are outside the
+        core data are left unresolved.
+
+        This is the batched version of calling fix_time, set_index and
+        set_coords for every event.
+
+        :param ds: core data
+        :type ds: netCDF4.Dataset or FAAM_Dataset
+        :return: number of resolved events
+        :rtype: int
+
+        >>> fs=FlightSummary(fltsummfile)
+        >>> fs.resolve(ds)
+        Out[1]: 9
+        >>> fs.Entries[3].Coords.shape
+        Out[2]: (1103, 3)
+        """
+        if not self.Entries:
+            return 0
+        time_index=faampy.core.utils.get_time_index(ds)
+        basetime=np.datetime64(faampy.core.utils.get_base_time(ds), 's')
+
+        n=len(self.Entries)
+        secs=np.empty((n, 2))
+        secs.fill(np.nan)
+        decades_pos, decades_str=[], []
+        for i, e in enumerate(self.Entries):
+            for j, t in enumerate((e.Start_time, e.Stop_time)):
+                if not t:
+                    continue
+                if e.format == 'decades':
+                    decades_pos.append(i*2+j)
+                    decades_str.append(t.strip().replace(' ', 'T'))
+                else:
+                    secs[i, j]=faampy.core.utils.conv_time_to_secs(t)
+        if decades_str:
+            dt=np.array(decades_str, dtype='datetime64[s]')
+            secs.ravel()[decades_pos]=(dt-basetime)/np.timedelta64(1, 's')
+
+        valid=np.isfinite(secs)
+        ix=np.empty(secs.shape, dtype=np.int64)
+        ix.fill(-1)
+        ix[valid]=time_index.get_indices(secs[valid])
+
+        coords=np.column_stack([np.asarray(ds.variables[v_name][:, 0], dtype=np.float64)
+                                for v_name in ('LON_GIN', 'LAT_GIN', 'ALT_GIN')])
+        result=0
+        for i, e in enumerate(self.Entries):
+            if e.format == 'decades':
+                e.Start_time_48=_secs_to_hhmmss_(secs[i, 0]) if valid[i, 0] else None
+                e.Stop_time_48=_secs_to_hhmmss_(secs[i, 1]) if valid[i, 1] else None
+            else:
+                e.Start_time_48=e.Start_time
+                e.Stop_time_48=e.Stop_time
+            s_ix, e_ix=ix[i]
+            if s_ix < 0 or (e.Stop_time and e_ix < 0):
+                continue
+            if e.Stop_time:
+                e.Index=range(s_ix, e_ix)
+                e.Coords=coords[s_ix:e_ix]
+            else:
+                e.Index=int(s_ix)
+                e.Coords=coords[s_ix]
+                if np.all(np.isnan(e.Coords)):
+                    e.Coords=None
+            result+=1
+        return result
+
     def as_kml(self, ofile=None, fid='', date=''):
-        kml=''
-        header = """<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2" xmlns:kml="http://www.opengis.net/kml/2.2" xmlns:atom="http://www.w3.org/2005/Atom">
-<Folder>
-    <name>%s-Flight-Summary</name>
-        <Style id="line">
+        """
+        Returns all events as kml. If *ofile* is given the kml is streamed
+        into the file instead; files with the extension .kmz are zipped.
+        """
+        style = """<Style id="line">
 		<LineStyle>
 			<color>ff0000ff</color>
 		</LineStyle>
@@ -425,22 +458,26 @@ class FlightSummary(object):
 			<color>ff0000aa</color>
 		</PolyStyle>
 	</Style>
-        <description>%s-%s</description>
-        <open>1</open>
-""" % (fid, fid, date)
-        kml+=header
+"""
+        kml=KML_Writer(ofile)
+        kml.write('<Folder>\n<name>%s-Flight-Summary</name>\n' % (fid,))
+        kml.write(style)
+        kml.write('<description>%s-%s</description>\n<open>1</open>\n' % (fid, date))
         for e in self.Entries:
-            if e.Coords:
+            if e.Coords is not None:
+                # every entry is written into memory first, so that an entry
+                # that fails half-way does not leave broken KML behind
+                _kml=KML_Writer(header=False)
                 try:
-                    kml+=e.as_kml()
-                except:
-                    pass
-        kml+="</Folder>\n</kml>\n"
-        if ofile:
-            f=open(ofile, 'w')
-            f.write(kml)
-            f.close()
-        return kml
+                    e.as_kml(_kml)
+                except Exception as err:
+                    sys.stdout.write('%s: can not be converted to kml (%s) ...\n' % (e.Name, err))
+                    continue
+                kml.write(_kml.getvalue())
+        kml.end_folder()
+        kml.close()
+        if not ofile:
+            return kml.getvalue()
 
     def __str__(self, ofile=None):
         result=''
@@ -496,26 +533,91 @@ Time    Time     Event               Height (s)        Hdg Comments
         return html
 
 
+def _secs_to_hhmmss_(secs):
+    secs=int(secs)
+    return '%02d%02d%02d' % (secs//3600, secs%3600//60, secs%60)
+
+
+def events_from_segments(ds, segments=None, **kwargs):
+    """
+    Creates flight summary events from the runs and profiles that were
+    found by faampy.core.calclib.segment_flight. This can be used for
+    flights without a flight summary or to check an existing one.
+
+    :param ds: core data
+    :type ds: netCDF4.Dataset or FAAM_Dataset
+    :param segments: result from segment_flight. If None, the flight is
+      segmented using the keyword arguments
+    :type segments: dict
+    :return: list of Event objects sorted by start time
+    :rtype: list
+
+    >>> fs=FlightSummary(fltsummfile)
+    >>> if not fs.Entries:
+    ...     fs.Entries=events_from_segments(ds)
+    """
+    if segments is None:
+        segments=segment_flight(ds, **kwargs)
+    secs=np.asarray(ds.variables['Time'][:]).ravel()
+    alt=np.asarray(ds.variables['ALT_GIN'][:, 0]) if 'ALT_GIN' in ds.variables else None
+    hdg=np.asarray(ds.variables['HDG_GIN'][:, 0]) if 'HDG_GIN' in ds.variables else None
+
+    def new_event(name, s_ix, e_ix=None):
+        e=Event()
+        e.format='horace'
+        e.Name=name
+        e.Start_time=_secs_to_hhmmss_(secs[s_ix])
+        e.Comment='detected'
+        if alt is not None:
+            e.Start_height='%.2f' % (alt[s_ix]/304.8)
+        if e_ix is not None:
+            e.Stop_time=_secs_to_hhmmss_(secs[e_ix-1])
+            if alt is not None:
+                e.Stop_height='%.2f' % (alt[e_ix-1]/304.8)
+            if hdg is not None and name.startswith('Run'):
+                e.Hdg='%03i' % (np.round(np.nanmedian(hdg[s_ix:e_ix])) % 360)
+        return e
+
+    result=[]
+    if segments.get('airborne') and 'WOW_IND' in ds.variables:
+        result.append(new_event('T/O', segments['airborne'][0][0]))
+        result.append(new_event('Land', segments['airborne'][-1][1]-1))
+    for key, name in (('slr', 'Run'), ('profile', 'Profile')):
+        for i, (s_ix, e_ix) in enumerate(segments.get(key, [])):
+            result.append(new_event('%s %i' % (name, i+1), s_ix, e_ix))
+    result.sort(key=lambda x: x.Start_time)
+    return result
+
+
 def process(fltsummfile, ncfile, *outpath):
-    ds=netCDF4.Dataset(ncfile, 'r')
+    """
+    Parses a flight summary and resolves the time index and coordinates of
+    all events.
+
+    :param str fltsummfile: flight summary file
+    :param ncfile: core netCDF file or an open dataset; an open dataset is
+      not closed, so that the core data are only read once
+    :type ncfile: str, netCDF4.Dataset or FAAM_Dataset
+    """
+    if isinstance(ncfile, str):
+        ds=netCDF4.Dataset(ncfile, 'r')
+    else:
+        ds=ncfile
     basetime=faampy.core.utils.get_base_time(ds)
     fid=faampy.core.utils.get_fid(ds)
     fs=FlightSummary(fltsummfile)
-    #for i in range(len(fs.Entries)):
-    for ent in fs.Entries:
-        try:
-            ent.fix_time(ds)
-            ent.set_index(ds)
-            ent.set_coords(ds)
-        except:
-            pass
+    if not fs.Entries:
+        sys.stdout.write('No flight summary entries; using detected runs and profiles ...\n')
+        fs.Entries=events_from_segments(ds)
+    fs.resolve(ds)
     basename='flight-sum_faam_%s_r0_%s' % (basetime.strftime('%Y%m%d'), fid)
     if outpath:
         outpath = outpath[0]
         fs.as_kml(ofile=os.path.join(outpath, basename+'.kml'), fid=fid, date=basetime.strftime('%d/%m/%Y'))
         fs.as_html(ofile=os.path.join(outpath, basename+'.html'))
         fs.as_txt(ofile=os.path.join(outpath, basename+'.txt'), fid=fid, date=basetime.strftime('%d/%m/%Y'))
-    ds.close()
+    if ds is not ncfile:
+        ds.close()
     return fs
 
 
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+
+"""
+Streaming KML/KMZ writer.
+
+The writer sends the KML document straight to its destination while it is
+created, instead of building one large string: a .kml file, a doc.kml
+entry inside a .kmz archive or an in-memory buffer. Coordinates are
+passed as numpy arrays with shape (n, 3) (longitude, latitude, altitude)
+and are formatted block-wise, so that the memory usage for long, full
+resolution flight tracks stays small. Additional files for a kmz (icons,
+figures) are added to the archive directly from disk or from memory; no
+temporary directory is needed.
+
+>>> from faampy.core.kml_writer import KML_Writer
+>>> with KML_Writer('b991.kmz') as kml:
+...     kml.begin_folder('b991-Flight-Track')
+...     kml.begin_placemark('b991')
+...     kml.write_linestring(ds.coords.xyz)
+...     kml.end_placemark()
+...     kml.end_folder()
+
+"""
+
+import sys
+import zipfile
+
+import numpy as np
+
+
+KML_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2" xmlns:kml="http://www.opengis.net/kml/2.2" xmlns:atom="http://www.w3.org/2005/Atom">
+"""
+
+KML_FOOTER = """</kml>
+"""
+
+# number of points that are formatted in one go
+CHUNK_SIZE = 50000
+
+
+def format_coordinates(xyz, fmt='%f,%f,%f', sep='\n'):
+    """
+    Formats an array of coordinates as string. The format string is repeated
+    for all points and applied in a single formatting operation instead of
+    formatting one point at a time. The defaults give the content of a KML
+    coordinates element; other formats are used for WKT and GeoJSON.
+
+    :param xyz: coordinates with shape (n, 3)
+    :type xyz: numpy.array
+    :param str fmt: format string for one point
+    :param str sep: separator between points
+    :return: formatted coordinates
+    :rtype: str
+    """
+    xyz = np.asarray(xyz, dtype=np.float64).reshape((-1, 3))
+    if xyz.size == 0:
+        return ''
+    return (sep.join([fmt]*xyz.shape[0])) % tuple(xyz.ravel().tolist())
+
+
+class KML_Writer(object):
+    """
+    Writes KML to a file, into a kmz archive or into memory. The xml header
+    and footer are written automatically when the writer is created and
+    closed.
+    """
+
+    def __init__(self, filename=None, kmz=None, arcname='doc.kml', header=True):
+        """
+        :param str filename: output file. If None the KML is kept in memory
+          and can be retrieved with getvalue
+        :param kmz: write a kmz archive. By default the file extension is used
+        :type kmz: boolean
+        :param str arcname: name of the KML document inside the kmz
+        :param header: write the xml header and footer
+        :type header: boolean
+        """
+        if kmz is None:
+            kmz = filename is not None and filename.lower().endswith('.kmz')
+        self.filename = filename
+        self.kmz = kmz
+        self.arcname = arcname
+        self.header = header
+        self._buffer = None
+        self._file = None
+        self._zip = None
+        self._pending = []
+        if filename is None:
+            self._buffer = []
+        elif kmz:
+            self._zip = zipfile.ZipFile(filename, mode='w', compression=zipfile.ZIP_DEFLATED)
+            if sys.version_info >= (3, 6):
+                # stream straight into the zip entry
+                self._file = self._zip.open(arcname, mode='w')
+            else:
+                self._buffer = []
+        else:
+            self._file = open(filename, 'wb')
+        if header:
+            self.write(KML_HEADER)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, txt):
+        """
+        Writes a piece of KML
+        """
+        if self._buffer is not None:
+            self._buffer.append(txt)
+        else:
+            self._file.write(txt.encode('utf-8'))
+
+    def write_coordinates(self, xyz, step=1):
+        """
+        Writes the content of a coordinates element
+
+        :param xyz: coordinates with shape (n, 3)
+        :type xyz: numpy.array
+        :param int step: only every step-th point is written
+        """
+        xyz = np.asarray(xyz, dtype=np.float64).reshape((-1, 3))[::step]
+        for i in range(0, xyz.shape[0], CHUNK_SIZE):
+            self.write(format_coordinates(xyz[i:i+CHUNK_SIZE])+'\n')
+
+    def write_point(self, xyz, altitude_mode='absolute'):
+        """
+        Writes a Point element
+
+        :param xyz: coordinates of the point (lon, lat, alt)
+        :param str altitude_mode: KML altitudeMode or None
+        """
+        self.write('<Point>\n')
+        if altitude_mode:
+            self.write('<altitudeMode>%s</altitudeMode>\n' % altitude_mode)
+        self.write('<coordinates>\n')
+        self.write_coordinates(xyz)
+        self.write('</coordinates>\n</Point>\n')
+
+    def write_linestring(self, xyz, extrude=1, tessellate=1, altitude_mode=None, step=1):
+        """
+        Writes a LineString element
+
+        :param xyz: coordinates with shape (n, 3)
+        :type xyz: numpy.array
+        :param extrude: whether the linestring is extruded
+        :param tessellate: whether the linestring is tesselated
+        :param str altitude_mode: KML altitudeMode or None
+        :param int step: only every step-th point is written
+        """
+        self.write('<LineString>\n')
+        self.write('<extrude>%s</extrude>\n<tessellate>%s</tessellate>\n' % (str(extrude), str(tessellate)))
+        if altitude_mode:
+            self.write('<altitudeMode>%s</altitudeMode>\n' % altitude_mode)
+        self.write('<coordinates>\n')
+        self.write_coordinates(xyz, step=step)
+        self.write('</coordinates>\n</LineString>\n')
+
+    def begin_folder(self, name, is_open=0, description=None):
+        self.write('<Folder>\n<name>%s</name>\n<open>%i</open>\n' % (name, int(is_open)))
+        if description is not None:
+            self.write('<description>%s</description>\n' % description)
+
+    def end_folder(self):
+        self.write('</Folder>\n')
+
+    def begin_placemark(self, name, description=None, style_url=None):
+        self.write('<Placemark>\n<name>%s</name>\n' % name)
+        if description is not None:
+            self.write('<description>%s</description>\n' % description)
+        if style_url:
+            self.write('<styleUrl>%s</styleUrl>\n' % style_url)
+
+    def end_placemark(self):
+        self.write('</Placemark>\n')
+
+    def add_file(self, arcname, filename=None, data=None):
+        """
+        Adds a file (e.g. an icon or figure) to the kmz archive. The file is
+        either copied from disk (filename) or taken from memory (data).
+
+        :param str arcname: path inside the archive, e.g. 'icons/sonde.png'
+        :param str filename: file on disk
+        :param bytes data: file content
+        """
+        if self._zip is None:
+            raise ValueError('Files can only be added to a kmz')
+        # only one entry of a zip can be open for writing, so the files are
+        # added after the KML document is complete
+        self._pending.append((arcname, filename, data))
+
+    def getvalue(self):
+        """
+        Returns the KML for an in-memory writer
+        """
+        if self.filename is not None:
+            raise ValueError('KML was written to %s' % self.filename)
+        return ''.join(self._buffer)
+
+    def close(self):
+        if self.header:
+            self.write(KML_FOOTER)
+            self.header = False
+        if self.filename is None:
+            return
+        if self._zip is not None:
+            if self._file is not None:
+                self._file.close()
+            elif self._buffer is not None:
+                self._zip.writestr(self.arcname, ''.join(self._buffer).encode('utf-8'))
+                self._buffer = None
+            for arcname, filename, data in self._pending:
+                if filename is not None:
+                    self._zip.write(filename, arcname)
+                else:
+                    self._zip.writestr(arcname, data)
+            self._pending = []
+            self._zip.close()
+            self._zip = None
+        elif self._file is not None:
+            self._file.close()
+        self._file = None
+
+
+def linestring_to_kml(xyz, extrude=1, tessellate=1, altitude_mode=None, step=1):
+    """
+    Returns a LineString element as string
+
+    :param xyz: coordinates with shape (n, 3)
+    :type xyz: numpy.array
+    :rtype: str
+    """
+    writer = KML_Writer(header=False)
+    writer.write_linestring(xyz, extrude=extrude, tessellate=tessellate,
+                            altitude_mode=altitude_mode, step=step)
+    return writer.getvalue()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+Resampling of multi-rate FAAM core variables.
+
+Core variables are stored as two dimensional arrays with the shape
+(n, frequency), where n is the number of seconds. Resampling is done by
+reshaping the data into blocks and reducing the last axis, so that no
+Python loop over the samples is needed. Samples can be excluded using the
+corresponding _FLAG variable.
+
+The output frequency can be
+
+  * a divisor of the native frequency, e.g. 1Hz or 4Hz from 32Hz data
+  * a fraction of 1Hz for N-second averages, e.g. 1/10. for 10 seconds
+  * any other rate, e.g. 10Hz from 32Hz data. In this case the blocks have
+    slightly different lengths and are padded before the reduction
+
+>>> tat_di_r = ds.variables['TAT_DI_R'][:]
+>>> tat_di_r_flag = ds.variables['TAT_DI_R_FLAG'][:]
+>>> resample_array(tat_di_r, freq=1, how='mean', mask=tat_di_r_flag > 1).shape
+Out[1]: (37137,)
+
+"""
+
+import numpy as np
+import warnings
+
+
+REDUCERS = {'mean': np.nanmean,
+            'median': np.nanmedian,
+            'min': np.nanmin,
+            'max': np.nanmax,
+            'std': np.nanstd,
+            'first': lambda a, axis: np.take(a, 0, axis=axis)}
+
+
+def _blocks_(data, freq):
+    """
+    Arranges the data in blocks, where each row of the result holds all
+    samples that contribute to one output value.
+
+    :param data: float array with shape (n, f)
+    :param freq: output frequency
+    :return: tuple of the blocks and the output shape
+    """
+    n, f = data.shape
+    if freq >= 1 and float(freq).is_integer() and f % int(freq) == 0:
+        freq = int(freq)
+        if freq == 1:
+            return data, (n,)
+        return data.reshape((n*freq, f//freq)), (n, freq)
+    if freq < 1 and float(1./freq).is_integer():
+        seconds = int(round(1./freq))
+        n_out = -(-n//seconds)
+        if n_out*seconds > n:
+            pad = np.empty((n_out*seconds-n, f))
+            pad.fill(np.nan)
+            data = np.vstack((data, pad))
+        return data.reshape((n_out, seconds*f)), (n_out,)
+
+    # arbitrary rate: the blocks are contiguous, but differ in length
+    flat = data.ravel()
+    n_out = int(round(n*freq))
+    bins = (np.arange(n*f)*float(freq)/f).astype(np.int64)
+    starts = np.searchsorted(bins, np.arange(n_out), side='left')
+    ends = np.searchsorted(bins, np.arange(n_out), side='right')
+    maxlen = int(np.max(ends-starts))
+    ix = starts[:, np.newaxis]+np.arange(maxlen)
+    valid = ix < ends[:, np.newaxis]
+    blocks = np.where(valid, flat[np.clip(ix, 0, flat.size-1)], np.nan)
+    if float(freq).is_integer():
+        return blocks, (n, int(freq))
+    return blocks, (n_out,)
+
+
+def resample_array(data, freq=1, how='mean', mask=None, missing_value=-9999.):
+    """
+    Resamples a core variable.
+
+    :param data: data with shape (n, f) or (n,), where f is the number of
+      samples per second
+    :type data: numpy.array
+    :param float freq: output frequency in Hz. Use for example 1/10. for
+      ten second averages
+    :param str how: one of 'mean', 'median', 'min', 'max', 'std' or 'first'
+    :param mask: samples where the mask is True are excluded (e.g. all
+      samples with a flag greater than 1)
+    :type mask: numpy.array of booleans
+    :param float missing_value: samples with this value are excluded
+    :return: resampled data; missing values are NaN
+    """
+    if how not in REDUCERS:
+        raise ValueError('Unknown method: %s. Valid methods are: %s' % (how, ', '.join(sorted(REDUCERS.keys()))))
+    data = np.array(data, dtype=np.float64)
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+    if missing_value is not None:
+        data[data == missing_value] = np.nan
+    if mask is not None:
+        mask = np.asarray(mask, dtype=bool)
+        data[mask.reshape(data.shape)] = np.nan
+    blocks, shape = _blocks_(data, freq)
+    with warnings.catch_warnings():
+        # blocks that only contain NaNs are expected
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        result = REDUCERS[how](blocks, axis=1)
+    return result.reshape(shape)
+
+
+def resample_flag(flag, freq=1, fill_value=-1):
+    """
+    Resamples a flag variable. The highest (i.e. worst) flag within a block
+    is used.
+
+    :param flag: flag data with shape (n, f) or (n,)
+    :param float freq: output frequency in Hz
+    :param int fill_value: value for blocks without data
+    :return: resampled flag with the same data type as the input
+    """
+    flag = np.asarray(flag)
+    result = resample_array(flag, freq=freq, how='max', missing_value=None)
+    result[np.isnan(result)] = fill_value
+    return result.astype(flag.dtype)
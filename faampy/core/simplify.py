@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+"""
+Vectorised implementation of the Ramer-Douglas-Peucker algorithm (RDP) for
+simplifying flight tracks.
+
+The algorithm is the same as in faampy._3rdparty.rdp, but the distances of
+all points of a segment to the line between its end points are calculated
+in one go, rather than calling a distance function for every point. This
+makes it fast enough to simplify full resolution flight tracks.
+
+Three metrics are available:
+
+  * '2d': perpendicular distance in the lon/lat plane (degrees)
+  * '3d': perpendicular distance using all three columns (lon, lat, alt);
+    this is what the 3rd party implementation does for (n, 3) arrays
+  * 'geodesic': cross-track distance on the sphere in metres; only the
+    lon/lat columns are used
+
+Flight tracks (lon, lat, alt) can be converted to metres using local_xyz
+first, so that the '3d' metric and epsilon are in metres as well.
+
+>>> import numpy as np
+>>> from faampy.core.simplify import rdp_mask
+>>> xy = np.array([[1, 1], [2, 2], [3, 3], [4, 4]], dtype=float)
+>>> rdp_mask(xy, epsilon=0.1, metric='2d')
+array([ True, False, False,  True])
+
+"""
+
+import numpy as np
+import sys
+import time
+
+
+EARTH_RADIUS = 6371008.8   # mean earth radius in metres
+
+
+def _to_unit_vectors_(lonlat):
+    lon = np.deg2rad(lonlat[..., 0])
+    lat = np.deg2rad(lonlat[..., 1])
+    return np.stack((np.cos(lat)*np.cos(lon),
+                     np.cos(lat)*np.sin(lon),
+                     np.sin(lat)), axis=-1)
+
+
+def local_xyz(lonlatalt):
+    """
+    Converts longitude, latitude and altitude into metres in an
+    equirectangular projection around the centre of the points. This is
+    accurate enough for the distances that matter for simplifying a flight
+    track.
+
+    :param lonlatalt: array with the columns lon, lat (degrees) and
+      altitude (metres)
+    :type lonlatalt: numpy.array with shape (n, 3)
+    :return: array with shape (n, 3) in metres
+    """
+    M = np.asarray(lonlatalt, dtype=np.float64)
+    if M.shape[0] == 0:
+        return M.copy()
+    lon0 = np.nanmean(M[:, 0])
+    lat0 = np.nanmean(M[:, 1])
+    scale = np.deg2rad(1.0)*EARTH_RADIUS
+    return np.column_stack(((M[:, 0]-lon0)*scale*np.cos(np.deg2rad(lat0)),
+                            (M[:, 1]-lat0)*scale,
+                            M[:, 2]))
+
+
+def segment_distances(points, start, end, metric='3d'):
+    """
+    Calculates the distances of all *points* to the line given by the points
+    *start* and *end*.
+
+    :param points: array of points with shape (m, d)
+    :type points: numpy.array
+    :param start: a point of the line
+    :type start: numpy.array
+    :param end: another point of the line
+    :type end: numpy.array
+    :param str metric: '2d', '3d' or 'geodesic'
+    :return: distances with shape (m,)
+    """
+    if metric == 'geodesic':
+        p = _to_unit_vectors_(points)
+        a = _to_unit_vectors_(start)
+        b = _to_unit_vectors_(end)
+        normal = np.cross(a, b)
+        norm = np.linalg.norm(normal)
+        if norm == 0:
+            # identical start and end point: great circle distance
+            return EARTH_RADIUS*np.arccos(np.clip(np.dot(p, a), -1.0, 1.0))
+        return EARTH_RADIUS*np.abs(np.arcsin(np.clip(np.dot(p, normal/norm), -1.0, 1.0)))
+
+    if metric == '2d':
+        points, start, end = points[:, 0:2], start[0:2], end[0:2]
+    elif metric != '3d':
+        raise ValueError('Unknown metric: %s' % metric)
+    v = end-start
+    w = points-start
+    vv = np.dot(v, v)
+    if vv == 0:
+        return np.sqrt(np.sum(w*w, axis=1))
+    # remove the component along the line; what is left is perpendicular
+    perp = w-np.outer(np.dot(w, v)/vv, v)
+    return np.sqrt(np.sum(perp*perp, axis=1))
+
+
+def rdp_mask(M, epsilon=0, metric='3d'):
+    """
+    Simplifies a given array of points using the Ramer-Douglas-Peucker
+    algorithm and returns the mask of points to keep.
+
+    :param M: a series of points
+    :type M: numpy array with shape ``(n,d)``
+    :param float epsilon: epsilon in the rdp algorithm; in metres for the
+      geodesic metric
+    :param str metric: '2d', '3d' or 'geodesic'
+    :return: boolean mask with shape (n,)
+    """
+    M = np.asarray(M, dtype=np.float64)
+    n = M.shape[0]
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+    mask[0] = True
+    mask[-1] = True
+    stk = [(0, n-1)]
+    while stk:
+        start_index, last_index = stk.pop()
+        if last_index-start_index < 2:
+            continue
+        d = segment_distances(M[start_index+1:last_index],
+                              M[start_index],
+                              M[last_index],
+                              metric=metric)
+        i = int(np.argmax(d))
+        if d[i] > epsilon:
+            index = start_index+1+i
+            mask[index] = True
+            stk.append((start_index, index))
+            stk.append((index, last_index))
+    return mask
+
+
+def benchmark(n=40000, epsilon=0.01, n_reference=4000):
+    """
+    Compares the run time of rdp_mask with the 3rd party implementation
+    (faampy._3rdparty.rdp) for a synthetic flight track.
+
+    The 3rd party implementation is run on the first *n_reference* points
+    only, because it is too slow for a full resolution track.
+
+    :param int n: number of points in the track
+    :param float epsilon: epsilon in the rdp algorithm
+    :param int n_reference: number of points for the reference run
+    :return: run times in seconds (vectorised full track, vectorised
+      reference length, 3rd party reference length) and whether the masks
+      for the reference length are identical
+    """
+    from faampy._3rdparty import rdp
+
+    t = np.linspace(0, 12*np.pi, n)
+    xyz = np.column_stack((-3.0+np.cos(t)+np.random.normal(0, 0.001, n),
+                           52.0+np.sin(2*t)+np.random.normal(0, 0.001, n),
+                           np.round(3000+2000*np.sin(t/5.0), -1)))
+
+    t0 = time.time()
+    rdp_mask(xyz, epsilon=epsilon)
+    t_vec = time.time()-t0
+
+    ref = xyz[:n_reference]
+    t0 = time.time()
+    m1 = rdp_mask(ref, epsilon=epsilon)
+    t_vec_ref = time.time()-t0
+    t0 = time.time()
+    m2 = rdp.rdp(ref, epsilon=epsilon, return_mask=True)
+    t_ref = time.time()-t0
+
+    identical = bool(np.all(m1 == m2))
+    sys.stdout.write('rdp_mask (%i points):       %8.3f s\n' % (n, t_vec))
+    sys.stdout.write('rdp_mask (%i points):       %8.3f s\n' % (n_reference, t_vec_ref))
+    sys.stdout.write('_3rdparty.rdp (%i points):  %8.3f s\n' % (n_reference, t_ref))
+    sys.stdout.write('Identical masks: %s\n' % (identical,))
+    return (t_vec, t_vec_ref, t_ref, identical)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -6,9 +6,12 @@ import pandas as pd
 import re
 import sys
 import shutil
+import weakref
 
 from matplotlib.dates import date2num, num2date
 
+from faampy.core.filters import get_mask
+
 
 def sub_nans(ncfilename):
     dst=os.path.splitext(ncfilename)[0]+'_edited'+os.path.splitext(ncfilename)[1]
@@ -26,27 +29,22 @@ def sub_nans(ncfilename):
 
 def data_filter(ds, var_filter, verbose=None):
     """
+    Returns the indices of the rows that pass the filter. The filter is
+    compiled into a boolean mask (see faampy.core.filters), which is
+    cached for the dataset.
+
     :param ds: 
-    :type ds: netCDF4.Dataset
-    :param var_filter: filter definition in form of list of tuplesa tuples
+    :type ds: netCDF4.Dataset or FAAM_Dataset
+    :param var_filter: filter definition in form of list of tuples or an
+      expression string
 
     filter(ds, [('Time', (20000 , 22000)), ('GIN_ALT', (0, 40000))]
+    filter(ds, 'ALT_GIN > 1000 and WOW_IND == 0')
     """
-    ix = np.empty(0)
-    n = len(ds.variables['Time'])
-    for item in var_filter:
-        key = item[0]
-        val = item[1]
-        tmp_var = ds.variables[key][:].ravel()
-        ix_tmp = np.where((tmp_var < val[0]) | (tmp_var > val[1]))[0]
-        if verbose:
-            sys.stdout.write('Filtering %s ... %.2f %% removed' % (key, float(ix_tmp.size)/float(tmp_var.size)*100.0))
-        ix = np.concatenate((ix, ix_tmp))
-    bad_index = set(np.unique(ix))
-    full_index = set(range(n))
-    good_index = list(full_index.difference(bad_index))
+    mask = get_mask(ds, var_filter)
+    good_index = np.flatnonzero(mask)
     if verbose:
-        sys.stdout.write('Remaining points: %i (%5.2f percent)\n' % (len(good_index), float(len(good_index))/float(len(n))*100.0))
+        sys.stdout.write('Remaining points: %i (%5.2f percent)\n' % (good_index.size, float(good_index.size)/float(mask.size)*100.0))
     return good_index
 
 
@@ -95,7 +93,7 @@ def get_fid(ds):
     Get the flight ID ([b,c]nnn) from a netCDF4.Dataset
     
     :param ds: core_faam dataset
-    :type param: netCDF4.Dataset
+    :type param: netCDF4.Dataset or FAAM_Metadata
 
     >>> ncfile = 'core_faam_20130403_v004_r0_b768.nc'
     >>> ds = netCDF4.Dataset(ncfile, 'r')
@@ -120,7 +118,7 @@ def get_base_time(ds):
     """Get the base time from the units of the time dimension
     
     :param ds: core_faam dataset
-    :type param: netCDF4.Dataset
+    :type param: netCDF4.Dataset or FAAM_Metadata
     :return datetime:
     :type return: datetime.datetime object
     """
@@ -237,6 +235,122 @@ def get_flight_duration(ds, verbose=False):
     return float(dur)
 
 
+class TimeIndex(object):
+    """
+    Sorted index of the 'Time' variable, which allows to look up the array
+    index for a timestamp using a binary search (numpy.searchsorted) instead
+    of comparing the full array.
+
+    Timestamps can be given as seconds past midnight, as 'HHMMSS' or
+    'HH:MM:SS' string, or as datetime.datetime/numpy.datetime64 if a
+    *base_time* was set.
+
+    >>> ti = TimeIndex(ds.variables['Time'][:])
+    >>> ti.get_index('120000')
+    Out[1]: 7668
+    >>> ti.get_slice('120000', '121000')
+    Out[2]: slice(7668, 8268, None)
+
+    """
+
+    def __init__(self, secs, base_time=None):
+        """
+        :param secs: seconds past midnight as stored in the 'Time' variable
+        :type secs: numpy.array
+        :param base_time: date of the flight (midnight)
+        :type base_time: datetime.datetime
+        """
+        secs = np.asarray(secs).ravel()
+        self.base_time = base_time
+        # core files are sorted by time, but be careful with odd files
+        if secs.size > 1 and np.any(secs[1:] < secs[:-1]):
+            self._order = np.argsort(secs, kind='mergesort')
+            self.secs = secs[self._order]
+        else:
+            self._order = None
+            self.secs = secs
+
+    def __len__(self):
+        return self.secs.size
+
+    def to_secs(self, t):
+        """
+        Converts a timestamp to seconds past midnight
+        """
+        if isinstance(t, str):
+            return conv_time_to_secs(t)
+        elif isinstance(t, datetime.datetime):
+            return (t-self.base_time).total_seconds()
+        elif isinstance(t, np.datetime64):
+            base_time = np.datetime64(self.base_time)
+            return (t-base_time)/np.timedelta64(1, 's')
+        return t
+
+    def _position_(self, ix):
+        if self._order is None:
+            return ix
+        return self._order[ix]
+
+    def get_index(self, t):
+        """
+        Returns the index for a timestamp. An IndexError is raised if the
+        timestamp is not part of the index.
+        """
+        secs = self.to_secs(t)
+        ix = int(np.searchsorted(self.secs, secs, side='left'))
+        if ix >= self.secs.size or self.secs[ix] != secs:
+            raise IndexError('%s not in Time index' % (str(t),))
+        return int(self._position_(ix))
+
+    def get_indices(self, times):
+        """
+        Returns the indices for a sequence of timestamps in one go. Timestamps
+        that are not part of the index get the value -1.
+        """
+        if isinstance(times, np.ndarray) and times.dtype.kind in 'iuf':
+            secs = times.astype(np.float64)
+        else:
+            secs = np.array([self.to_secs(t) for t in times], dtype=np.float64)
+        ix = np.searchsorted(self.secs, secs, side='left')
+        ix_clip = np.clip(ix, 0, max(self.secs.size-1, 0))
+        found = (ix < self.secs.size) & (self.secs[ix_clip] == secs)
+        result = np.where(found, self._position_(ix_clip), -1)
+        return result.astype(np.int64)
+
+    def get_slice(self, start, end):
+        """
+        Returns a slice object for the time interval [start, end). Timestamps
+        do not need to be part of the index.
+        """
+        if self._order is not None:
+            raise ValueError('Time index is not monotonic; slicing not possible')
+        s_ix = int(np.searchsorted(self.secs, self.to_secs(start), side='left'))
+        e_ix = int(np.searchsorted(self.secs, self.to_secs(end), side='left'))
+        return slice(s_ix, e_ix)
+
+
+_TIME_INDEX_CACHE = weakref.WeakKeyDictionary()
+
+
+def get_time_index(ds):
+    """
+    Returns the TimeIndex for a dataset. The FAAM_Dataset has its own index;
+    for a netCDF4.Dataset the index is created once and cached for the
+    lifetime of the dataset object.
+
+    :param ds: core_faam dataset
+    :type ds: netCDF4.Dataset or FAAM_Dataset
+    :return: time index
+    :rtype: TimeIndex
+    """
+    if hasattr(ds, 'time_index'):
+        return ds.time_index
+    if ds not in _TIME_INDEX_CACHE:
+        _TIME_INDEX_CACHE[ds] = TimeIndex(ds.variables['Time'][:],
+                                          base_time=get_base_time(ds))
+    return _TIME_INDEX_CACHE[ds]
+
+
 def get_index_from_secs(ds, secs):
     """Return index for seconds
     :param ds:  
@@ -244,8 +358,7 @@ def get_index_from_secs(ds, secs):
     :param secs: seconds past midnight 
     :type secs: int
     """
-    ix = np.where(ds.variables['Time'][:] == secs)
-    return ix[0][0]
+    return get_time_index(ds).get_index(secs)
 
 
 def get_index_from_hhmmss(ds, hhmmss):
@@ -289,39 +402,86 @@ def get_index(ds, inp):
     return ix
 
 
-def core_to_pandas(ds):
+def _nan_for_missing_(data, missing_value=-9999.0):
+    """
+    Returns the data with missing values set to NaN. Integer arrays are only
+    converted to float if they contain missing values.
+    """
+    is_missing = (data == missing_value)
+    if not np.any(is_missing):
+        return data
+    data = np.array(data, dtype=np.float64)
+    data[is_missing] = np.nan
+    return data
+
+
+def variables_to_dataframe(variables, varnames, index, full_rate=False):
+    """
+    Builds a pandas.DataFrame from the variables of a core file. All columns
+    are collected in a dict first and the DataFrame is allocated once.
+
+    :param variables: dictionary of variables (netCDF4.Variable, numpy.array)
+    :param varnames: list of variable names
+    :param index: timestamps (1Hz) as numpy.datetime64 array
+    :param full_rate: if set, variables are exported at their native
+      frequency and a dict of DataFrames is returned, which has the
+      frequency as key and a sub-second DatetimeIndex
+    :type full_rate: boolean
+    :return: DataFrame or dict of DataFrames
+    """
+    index = np.asarray(index, dtype='datetime64[ns]')
+    columns = {}
+    for v in varnames:
+        if len(variables[v].shape) == 2 and not full_rate:
+            # only the first column is read from the file
+            data = np.ma.getdata(variables[v][:, 0])
+            freq = 1
+        else:
+            data = np.ma.getdata(variables[v][:])
+            freq = 1
+            if len(data.shape) == 2:
+                freq = data.shape[1]
+                data = data.ravel()
+        if data.shape[0] != index.size*freq:
+            # not a time series
+            continue
+        columns.setdefault(freq, {})[v] = _nan_for_missing_(data)
+
+    result = {}
+    for freq, cols in columns.items():
+        if freq == 1:
+            _index = index
+        else:
+            offset = (np.arange(freq)*(1e9/freq)).astype('timedelta64[ns]')
+            _index = (index[:, np.newaxis]+offset).ravel()
+        result[freq] = pd.DataFrame(cols, index=pd.DatetimeIndex(_index), columns=sorted(cols.keys()))
+    if full_rate:
+        return result
+    if 1 not in result:
+        return pd.DataFrame(index=pd.DatetimeIndex(index))
+    return result[1]
+
+
+def core_to_pandas(ds, full_rate=False):
     """converts a netCDF4.Dataset into a pandas Dataframe using the timestamp
     as index.
-    
-    ..note: Only the first column of the two dimensional data set is grabbed,
-            because of performance issues.
+
+    ..note: By default only the first column of the two dimensional data set
+            is grabbed. With *full_rate* set the variables are exported at
+            their native frequency as a dict of DataFrames with the frequency
+            as key.
 
     :param ds: core_faam dataset
     :type param: netCDF4.Dataset
+    :param full_rate: export multi-rate variables at their native frequency
+    :type full_rate: boolean
     :return: pandas.Dataframe
     :type return: pandas.Dataframe
 
     """
-    
-    # TODO: make it work for the full dataset too
     vars=sorted(ds.variables.keys())
     vars.remove('Time')
-    
-    index=get_mpl_time(ds, 1)
-    index=num2date(index.ravel())
-    #initialize an empty Dataframe
-    df=pd.DataFrame(index=index)
-    for v in vars:
-        shp=ds.variables[v].shape
-        if len(shp) ==2:
-            data=np.copy(ds.variables[v][:,0].data).ravel()
-        else:
-            data=np.copy(ds.variables[v][:].data)
-        df_tmp=pd.DataFrame(data[:], index=index, columns=[v,])
-        df = pd.concat([df, df_tmp], axis=1)
-    #set all missing values to nan
-    df[df == -9999.0] = np.nan
-    #set timezone to None otherwise there might be issues merging the data
-    #frame with others    
-    df.index.tz=None
-    return df    
+
+    secs=np.array(ds.variables['Time'][:], dtype=np.int64).ravel()
+    index=np.datetime64(get_base_time(ds))+secs.astype('timedelta64[s]')
+    return variables_to_dataframe(ds.variables, vars, index, full_rate=full_rate)
@@ -20,9 +20,13 @@ from faampy.fltcons.db import DB
 
 
 import collections
+try:
+    from collections.abc import MutableSet
+except ImportError:
+    from collections import MutableSet
 
 # http://code.activestate.com/recipes/576694-orderedset/
-class OrderedSet(collections.MutableSet):
+class OrderedSet(MutableSet):
 
     def __init__(self, iterable=None):
         self.end = end = []
@@ -96,53 +100,26 @@ class Plot(object):
         self.outpath = None
         self.Figure = None
 
-    def get_data(self):
-        """gets the data for the plot"""
-        fcdb = DB()
-        fcdb.connect()
-        sql = """SELECT f.par,f.fid,f.rev,f.rdate,f.line,f.fname
-                    FROM ( SELECT fid, max(rev) AS maxrev
-                           FROM fltcons GROUP BY fid ORDER BY fid
-                         ) AS x INNER JOIN fltcons AS f ON f.fid=x.fid AND f.rev=x.maxrev AND f.par='%s' ORDER BY x.fid""" % (self.par)
-
-        cur = fcdb.con.cursor()
-        cur.execute(sql)
-        data = cur.fetchall()
-        cur.close()
-        par, fid, rev, rdate, cal, fname = zip(*data)
-        newcal = []
-        for c in cal:
-            c = c.split(' ', 1)[1]
-            c = c.split('!')[0]
-            c = c.strip()
-            newcal.append(c)
-        cal = newcal
-        allBarData = []
-        for c in OrderedSet(cal):
-            curBarData, beg, end = ([], None, None)
-            for i in range(len(fid)):
-                if c == cal[i]:
-                    if not beg and not end:
-                        #beg = int(fid[i])
-                        #end = int(fid[i])
-                        beg = fid_as_integer(fid[i])
-                        end = fid_as_integer(fid[i])
-                    else:
-                        end = fid_as_integer(fid[i])
-                    if i == len(fid) - 1:
-                        end = fid_as_integer(fid[i])
-                        curBarData.append((beg, end-beg))
-                else:
-                    if (beg and end):
-                        curBarData.append((beg, end-beg))
-                        beg = None
-                        end = None
-                    else:
-                        pass
-
-            allBarData.append(curBarData)
+    def get_data(self, changes=None):
+        """gets the data for the plot from the change-point table
+
+        :param list changes: rows of the change-point table for the
+          parameter (see DB.get_changes). If None they are queried
+        """
+        if changes is None:
+            fcdb = DB()
+            fcdb.connect()
+            changes = fcdb.get_changes(self.par)
+            fcdb.disconnect()
+        # one list of bars for every calibration, in the order of their first
+        # occurrence
+        bars = collections.OrderedDict()
+        for par, seq, first_fid, last_fid, nflights, cal, rev, rdate, line, fname in changes:
+            beg = fid_as_integer(first_fid)
+            end = fid_as_integer(last_fid)
+            bars.setdefault(cal, []).append((beg, end-beg))
+        allBarData = list(bars.values())
         self.allBarData = allBarData
-        print(curBarData)
         pltData = []
         for i in range(len( allBarData)):
             for n in allBarData[i]:
@@ -191,3 +168,31 @@ class Plot(object):
             ax.set_xticklabels(xlabels)
         fig.savefig(os.path.join(faampy.fltcons.FIGURES_PATH, str.strip(self.par) + '.png'))
         self.Figure = fig
+
+
+def create_all(pars=None):
+    """
+    Creates the figures for many parameters with a single query of the
+    change-point table
+
+    :param list pars: parameter names; by default all parameters in the
+      database
+    :return: dictionary with the parameter name as key and the Plot as value
+    """
+    fcdb = DB()
+    fcdb.connect()
+    changes = fcdb.get_changes()
+    fcdb.disconnect()
+    by_par = collections.OrderedDict()
+    for row in changes:
+        by_par.setdefault(row[0], []).append(row)
+    result = collections.OrderedDict()
+    for par in (pars or by_par.keys()):
+        if par not in by_par:
+            continue
+        fcp = Plot(par)
+        fcp.get_data(changes=by_par[par])
+        fcp.create()
+        plt.close(fcp.Figure)
+        result[par] = fcp
+    return result
@@ -21,7 +21,9 @@ class Summary(object):
         self.__flagData__()
 
     def __flagData__( self ):
-
+        if self.Flag is not None:
+            # from the change-point table
+            return
         self.Flag = []
         self.Flag.append(0)
         for i in range(1, len(self.Data)):
@@ -37,16 +39,17 @@ class Summary(object):
         fcdb.connect()
 
         if self.filtered:
-            sql = """SELECT f.par,f.fid,f.rev,f.rdate,f.line,f.fname
-                    FROM ( SELECT fid, max(rev) AS maxrev
-                           FROM fltcons GROUP BY fid ORDER BY fid
-                         ) AS x INNER JOIN fltcons AS f ON f.fid=x.fid AND f.rev=x.maxrev AND f.par='%s'""" % (self.par)
+            # one row for every range of flights with the same calibration
+            changes = fcdb.get_changes(self.par)
+            self.Data = [(r[0], r[2], r[6], r[7], r[8], r[9]) for r in changes]
+            self.Flag = [r[1] for r in changes]
         else:
-            sql = """SELECT par,fid,rev,rdate,line FROM fltcons WHERE par='%s' ORDER BY fid,rev""" %  (self.par)
-        cur = fcdb.con.cursor()
-        cur.execute(sql)
-        self.Data = cur.fetchall()
-        cur.close()
+            sql = """SELECT par,fid,rev,rdate,line FROM fltcons WHERE par=? ORDER BY fid,rev"""
+            cur = fcdb.con.cursor()
+            cur.execute(sql, (self.par,))
+            self.Data = cur.fetchall()
+            cur.close()
+        fcdb.disconnect()
 
     def __str__(self):
         ref = -9999
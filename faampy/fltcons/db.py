@@ -23,11 +23,15 @@ FLTCONS_DB_NAME = os.path.join(faampy.FAAMPY_DATA_PATH, 'db', 'faam_fltcons_db.s
 
 class DB(object):
 
-    def __init__(self):
-        pass
+    def __init__(self, db_file=None):
+        """
+        :param str db_file: sqlite file; by default FLTCONS_DB_NAME
+        """
+        self.db_file = db_file
 
     def connect(self):
-        self.con = dbapi.connect(FLTCONS_DB_NAME)
+        self.con = dbapi.connect(self.db_file or FLTCONS_DB_NAME)
+        self._ensure_indexes_()
 
     def disconnect(self):
         self.con.close()
@@ -36,32 +40,182 @@ class DB(object):
         """Create the fltcons table"""
         if not hasattr(self, 'con'):
             self.connect()
-        sql = """CREATE TABLE fltcons (par VARCHAR(20), fid INTEGER, rev VARCHAR(4), rdate DATE, line TEXT, fname TEXT);"""
+        else:
+            self._ensure_indexes_()
+
+    def _ensure_indexes_(self):
+        """
+        Creates the tables and indexes if they do not exist. The index on
+        (par, fid, rev) serves the queries for the history of a parameter,
+        the index on (fid, rev) the search for the latest revision of a
+        flight.
+        """
         cur = self.con.cursor()
-        cur.execute(sql)
+        cur.execute("""CREATE TABLE IF NOT EXISTS fltcons (par VARCHAR(20), fid INTEGER, rev VARCHAR(4), rdate DATE, line TEXT, fname TEXT);""")
+        # files that were parsed, also those without any parameter
+        cur.execute("""CREATE TABLE IF NOT EXISTS fltcons_files (fname TEXT NOT NULL PRIMARY KEY, nrows INTEGER);""")
+        cur.execute("""CREATE INDEX IF NOT EXISTS idx_fltcons_par_fid_rev ON fltcons (par, fid, rev);""")
+        cur.execute("""CREATE INDEX IF NOT EXISTS idx_fltcons_fid_rev ON fltcons (fid, rev);""")
+        cur.execute("""CREATE INDEX IF NOT EXISTS idx_fltcons_fname ON fltcons (fname);""")
+        # change-point table: one row for every range of consecutive flights
+        # with the same calibration line (see refresh_changes)
+        cur.execute("""CREATE TABLE IF NOT EXISTS fltcons_changes (par VARCHAR(20) NOT NULL, seq INTEGER NOT NULL, first_fid TEXT, last_fid TEXT, nflights INTEGER, cal TEXT, rev VARCHAR(4), rdate DATE, line TEXT, fname TEXT, PRIMARY KEY (par, seq));""")
+        cur.execute("""CREATE INDEX IF NOT EXISTS idx_fltcons_changes_first_fid ON fltcons_changes (first_fid);""")
         self.con.commit()
 
+    def insert_many(self, rows, fnames=[]):
+        """
+        Inserts many rows in one transaction.
+
+        :param list rows: list of (par, fid, rev, rdate, line, fname) tuples
+        :param list fnames: files that are recorded as ingested in the same
+          transaction. Rows from a file that was ingested before replace
+          the old rows
+        :return: number of rows
+        """
+        rows = list(rows)
+        fnames = list(fnames)
+        nrows = {}
+        for row in rows:
+            nrows[row[5]] = nrows.get(row[5], 0) + 1
+        cur = self.con.cursor()
+        try:
+            if fnames:
+                cur.executemany("""DELETE FROM fltcons WHERE fname=?;""", [(f,) for f in fnames])
+            cur.executemany("""INSERT INTO fltcons VALUES (?, ?, ?, ?, ?, ?);""", rows)
+            cur.executemany("""INSERT OR REPLACE INTO fltcons_files VALUES (?, ?);""",
+                            [(f, nrows.get(f, 0)) for f in fnames])
+            self.con.commit()
+        except:
+            self.con.rollback()
+            raise
+        return len(rows)
+
     def insert(self, par, fid, rev, rdate, line, fname, commit=True):
-        template="""INSERT INTO fltcons VALUES ('%s', '%s', '%s', '%s', '%s', '%s');"""
+        sql = """INSERT INTO fltcons VALUES (?, ?, ?, ?, ?, ?);"""
         if 'list' in str(type(par)):
-            for i in range(len(par)):
-                sql = template % (par[i], fid[i], rev[i], rdate[i], line[i], fname[i])
-                cur = self.con.cursor()
-                cur.execute(sql)
+            rows = list(zip(par, fid, rev, rdate, line, fname))
         else:
-            sql = template % (par, fid, rev, rdate, line, fname)
-            cur = self.con.cursor()
-            cur.execute(sql)
+            rows = [(par, fid, rev, rdate, line, fname)]
+        cur = self.con.cursor()
+        cur.executemany(sql, rows)
         # Only commit if commit keyword is set, which is the default
         # Otherwise the sql statement is returned
         if commit:
             self.con.commit()
         return sql
 
+    def get_ingested_files(self):
+        """
+        Returns the names of all files that are in the database
+        """
+        cur = self.con.cursor()
+        cur.execute("""SELECT fname FROM fltcons_files UNION SELECT DISTINCT fname FROM fltcons;""")
+        return set([r[0] for r in cur.fetchall()])
+
+    def refresh_changes(self, fids=None):
+        """
+        Updates the change-point table. For every parameter the flights
+        (latest revision only, ordered by fid) are split into ranges in
+        which the calibration line does not change. Whitespace and comments
+        are ignored when the lines are compared.
+
+        If fids is given only the ranges from the one before the range that
+        contains the earliest of these flights onwards are computed again,
+        otherwise the whole table is rebuilt. The range before is included,
+        because the changed flights can have the same line again and have to
+        be merged with it. An empty table is always rebuilt.
+
+        :param list fids: flights that were added or changed; an empty
+          list means that nothing changed
+        :return: number of ranges that were written
+        """
+        cur = self.con.cursor()
+        cur.execute("""SELECT 1 FROM fltcons_changes LIMIT 1;""")
+        if not cur.fetchone():
+            # empty table; e.g. database from before the table existed
+            fids = None
+        elif fids is not None and len(fids) == 0:
+            return 0
+        # first seq and first fid that are computed again for each parameter
+        starts = {}
+        if fids:
+            cur.execute("""SELECT c.par, c.seq, c.first_fid FROM fltcons_changes AS c
+                           INNER JOIN (SELECT par, max(max(seq)-1, 0) AS startseq FROM fltcons_changes WHERE first_fid <= ? GROUP BY par) AS x
+                           ON c.par=x.par AND c.seq=x.startseq;""", (min(fids),))
+            starts = dict([(par, (seq, first_fid)) for par, seq, first_fid in cur.fetchall()])
+        # parameters without a start are computed from the first flight
+        where, params = '', []
+        if starts:
+            where = 'WHERE f.fid >= ? OR f.par NOT IN (%s)' % ', '.join(['?']*len(starts))
+            params = [min([v[1] for v in starts.values()])] + list(starts.keys())
+        cur.execute("""SELECT f.par,f.fid,f.rev,f.rdate,f.line,f.fname
+                       FROM ( SELECT fid, max(CAST(rev AS INTEGER)) AS maxrev
+                              FROM fltcons GROUP BY fid
+                            ) AS x INNER JOIN fltcons AS f ON f.fid=x.fid AND CAST(f.rev AS INTEGER)=x.maxrev
+                       %s ORDER BY f.par, f.fid;""" % where, params)
+        rows = []
+        current = None
+        prev = None
+        for par, fid, rev, rdate, line, fname in cur.fetchall():
+            seq, first_fid = starts.get(par, (0, ''))
+            if fid < first_fid or (par, fid) == prev:
+                continue
+            prev = (par, fid)
+            key = re.sub(r'\s', '', str(line.split('!')[0]))
+            if current and current[0] == par and current[-1] == key:
+                current[3] = fid
+                current[4] += 1
+                continue
+            if current:
+                rows.append(tuple(current[:-1]))
+            if current and current[0] == par:
+                seq = current[1]+1
+            cal = line.split(' ', 1)[1] if ' ' in line else ''
+            cal = cal.split('!')[0].strip()
+            # par, seq, first_fid, last_fid, nflights, cal, rev, rdate, line, fname, key
+            current = [par, seq, fid, fid, 1, cal, rev, rdate, line, fname, key]
+        if current:
+            rows.append(tuple(current[:-1]))
+
+        try:
+            if fids:
+                cur.executemany("""DELETE FROM fltcons_changes WHERE par=? AND seq>=?;""",
+                                [(par, v[0]) for par, v in starts.items()])
+                # parameters that are new or start after the changed flights
+                cur.executemany("""DELETE FROM fltcons_changes WHERE par=?;""",
+                                [(par, ) for par in set([r[0] for r in rows]).difference(starts)])
+            else:
+                cur.execute("""DELETE FROM fltcons_changes;""")
+            cur.executemany("""INSERT INTO fltcons_changes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);""", rows)
+            self.con.commit()
+        except:
+            self.con.rollback()
+            raise
+        return len(rows)
+
+    def get_changes(self, par=None):
+        """
+        Returns the change-point table for one or all parameters
+
+        :param str par: parameter name, e.g. 'CALO3'. If None the ranges of
+          all parameters are returned
+        :return: list of (par, seq, first_fid, last_fid, nflights, cal, rev,
+          rdate, line, fname) tuples ordered by parameter and seq
+        """
+        cur = self.con.cursor()
+        if par is None:
+            cur.execute("""SELECT * FROM fltcons_changes ORDER BY par, seq;""")
+        else:
+            cur.execute("""SELECT * FROM fltcons_changes WHERE par=? ORDER BY seq;""", (par,))
+        return cur.fetchall()
+
     def clean(self):
-        sql = "DELETE from fltcons;"
         cur = self.con.cursor()
-        cur.execute(sql)
+        cur.execute("DELETE from fltcons;")
+        cur.execute("DELETE from fltcons_files;")
+        cur.execute("DELETE from fltcons_changes;")
+        self.con.commit()
 
     def query(self, par):
         pass
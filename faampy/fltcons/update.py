@@ -4,6 +4,7 @@ Created on 14 Dec 2010
 @author: axel
 '''
 
+import multiprocessing
 import os
 import sys
 
@@ -12,9 +13,45 @@ from faampy.fltcons.db import DB
 from faampy.utils.file_list import File_List
 
 
+def _parse_(filename):
+    """
+    Parses one flight constants file; runs in a worker process.
 
-def update(inpath=None, clean=False, root_path=None, verbose=False):
-    fl = File_List(inpath)
+    :return: tuple (filename, rows, error message)
+    """
+    try:
+        d = Parser().parse(filename)
+    except Exception as e:
+        return (filename, None, str(e))
+    rows = []
+    if d:
+        fname = os.path.basename(filename)
+        for k in d.keys():
+            # (par, fid, rev, rdate, line, fname)
+            rows.append((k, d[k][0], d[k][1], d[k][2], d[k][3], fname))
+    return (filename, rows, None)
+
+
+def update(inpath=None, clean=False, root_path=None, verbose=False, processes=None, index=None):
+    """
+    Adds the flight constants files to the database. Files that are already
+    in the database are skipped, unless the database is cleaned first. The
+    files are parsed in a process pool and all rows are inserted in one
+    transaction. Afterwards the change-point table is refreshed from the
+    earliest new flight onwards.
+
+    :param inpath: path or list of paths that are searched for flight
+      constants files
+    :param boolean clean: delete all entries before the update
+    :param boolean verbose: print the name of every file
+    :param int processes: number of worker processes; by default the number
+      of cpus
+    :param index: Archive_Index that is used to find the files. By default
+      the path is crawled
+    :type index: Archive_Index
+    :return: number of inserted rows
+    """
+    fl = File_List(inpath, index=index)
     fl.filter_by_data_type('flight-cst')
 
     fcdb = DB()
@@ -22,30 +59,45 @@ def update(inpath=None, clean=False, root_path=None, verbose=False):
     if clean:
         fcdb.clean()
 
-    parser = Parser()
-
-    for f in fl:
-        if verbose:
-            sys.stdout.write('%s\n' % f)
-        try:
-            d = parser.parse(os.path.join(f.path, f.filename))
-        except:
-            sys.stdout.write('Problem parsing %s ...\n' % f.filename)
-            continue
-
-        if d:
-            par, fid, rev, rdate, line, fname = [], [], [], [], [], []
-            for k in d.keys():
-                par.append(k)
-                fid.append(d[k][0])    # strip the b from the fid
-                rev.append(d[k][1])
-                rdate.append(d[k][2])
-                line.append(d[k][3])
-                fname.append(f.filename)
-            try:
-                fcdb.insert(par, fid, rev, rdate, line, fname)
-            except:
-                pass
+    ingested = fcdb.get_ingested_files()
+    filenames = [os.path.join(f.path, f.filename) for f in fl if f.filename not in ingested]
+    # the same file can be in several places of the archive
+    filenames = list(dict([(os.path.basename(f), f) for f in filenames]).values())
+    sys.stdout.write('%i of %i flight constants files are new ...\n' % (len(filenames), len(fl)))
+    if not filenames:
+        fcdb.refresh_changes([])
+        fcdb.disconnect()
+        return 0
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(filenames)))
+    if processes > 1:
+        pool = multiprocessing.Pool(processes=processes)
+        results = pool.imap_unordered(_parse_, filenames, chunksize=8)
+    else:
+        pool = None
+        results = (_parse_(f) for f in filenames)
+
+    rows, fnames = [], []
+    try:
+        for filename, _rows, error in results:
+            if verbose:
+                sys.stdout.write('%s\n' % filename)
+            if error is not None:
+                sys.stdout.write('Problem parsing %s: %s ...\n' % (os.path.basename(filename), error))
+                continue
+            rows += _rows
+            fnames.append(os.path.basename(filename))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    n = fcdb.insert_many(rows, fnames=fnames)
+    fcdb.refresh_changes(None if clean else [r[1] for r in rows])
+    fcdb.disconnect()
+    sys.stdout.write('Added %i flight constants from %i files ...\n' % (n, len(fnames)))
+    return n
 
 
 if __name__ == '__main__':
@@ -60,8 +112,13 @@ if __name__ == '__main__':
                         type=bool,
                         default=False,
                         help="Clean db before inserting any data")
+    parser.add_argument('-p', '--processes',
+                        action='store',
+                        type=int,
+                        default=None,
+                        help="number of processes that parse the files")
     args = parser.parse_args()
-    update(inpath=args.inpath, clean=args.clean)
+    update(inpath=args.inpath, clean=args.clean, processes=args.processes)
 
 
 #update(inpath='/media/axel/F60AD5E60AD5A3C1/badcMirror/data/', clean=True)
@@ -11,16 +11,15 @@ import kmldom
 import kmlbase
 import netCDF4
 import numpy as np
+import numpy.ma as ma
 import os
 import pickle
 import re
 import sys
 import time
 
-try:
-    from rdp import rdp
-except:
-    from faampy._3rdparty.rdp import rdp
+from faampy.core.simplify import rdp_mask
+from faampy.core.flags import get_masked
 
 
 _KML_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
@@ -99,19 +98,11 @@ class FlightTrack(object):
             par_name = par2
         else:
             return(None, None, 0)
-        if par_name + '_FLAG' in ds.variables.keys():
-            flag_name = par_name + '_FLAG'
-        elif par_name + 'FLAG' in ds.variables.keys():
-            flag_name = par_name + 'FLAG'
-        else:
-            flag_name = None
-
-        data = ds.variables[par_name][:,0].ravel()
-        try:
-            flag = ds.variables[flag_name][:,0].data.ravel()
-        except:
-            flag = ds.variables[flag_name][:,0].ravel()
-        quality = float(len(np.where(flag == 0.0)[0])) / float(len(flag))
+        # flag is True for samples that do not have flag 0
+        masked = get_masked(ds, [par_name], accepted_flags=(0,), key=(slice(None), 0), missing_value=None)[par_name]
+        data = masked.data.ravel()
+        flag = ma.getmaskarray(masked).ravel()
+        quality = 1.0-float(np.count_nonzero(flag))/float(flag.size)
         return (data, flag, quality)
 
     def set_rawlatlonalt_from_netcdf(self, ifile):
@@ -184,18 +175,11 @@ class FlightTrack(object):
             lons_diff = abs(abs(lons) - abs(np.median(lons)))
             lats_diff = abs(abs(lats) - abs(np.median(lats)))
 
-            ix = np.concatenate((np.where(lons == 0.0)[0],
-                                 np.where(lons == -9999.0)[0],
-                                 np.where(lats == 0.0)[0],
-                                 np.where(alts <= 0.0)[0],
-                                 np.where(lats == -9999.0)[0],
-                                 np.where(lons_flag != 0)[0],
-                                 np.where(lats_flag != 0)[0],
-                                 np.where(alts_flag != 0)[0]))
-            ix = np.unique(ix)
-
-            good_ix = set(range(len(lons))) - set(ix)
-            good_ix = np.array(list(good_ix))
+            bad = ((lons == 0.0) | (lons == -9999.0) |
+                   (lats == 0.0) | (lats == -9999.0) |
+                   (alts <= 0.0) |
+                   lons_flag | lats_flag | alts_flag)
+            good_ix = np.where(~bad)[0]
 
             if len(good_ix):
                 lons = list(np.array(lons)[good_ix])
@@ -282,41 +266,21 @@ class FlightTrack(object):
         return (self.lon, self.lat)
 
     def simplify(self, epsilon=0.1, timestep=120):
-        """uses the simplify options from gpsbabel"""
+        """simplifies the track using the Ramer-Douglas-Peucker algorithm and
+        keeps one point every *timestep* seconds"""
 
-        from rdp import rdp
-        #coords = np.vstack((self.lon, self.lat, self.alt, self.timestamp))
         coords = np.vstack((self.lon, self.lat, self.alt)).T
-        mask1 = rdp(coords, algo='iter', return_mask=True, epsilon=epsilon)
-
-        unixtime = [int(time.mktime(ts.timetuple())) for ts in self.timestamp]
-        rest = [u % timestep for u in unixtime]
-        mask2 = []
-        for r in rest:
-            if r == 0:
-                mask2.append(True)
-            else:
-                mask2.append(False)
+        mask1 = rdp_mask(coords, epsilon=epsilon)
 
-        mask = mask1+mask2
+        unixtime = np.array([int(time.mktime(ts.timetuple())) for ts in self.timestamp])
+        mask2 = (unixtime % timestep) == 0
 
-        ix = np.where(mask == True)[0]
-        print(len(ix))
+        ix = np.where(mask1 | mask2)[0]
 
-
-        _lon = []
-        _lat = []
-        _alt = []
-        _timestamp = []
-        for i in ix:
-            _lon.append(self.lon[i])
-            _lat.append(self.lat[i])
-            _alt.append(self.alt[i])
-            _timestamp.append(self.timestamp[i])
-        self.lon = _lon
-        self.lat = _lat
-        self.alt = _alt
-        self.timestamp = _timestamp
+        self.lon = list(np.array(self.lon)[ix])
+        self.lat = list(np.array(self.lat)[ix])
+        self.alt = list(np.array(self.alt)[ix])
+        self.timestamp = [self.timestamp[i] for i in ix]
         return (self.lon, self.lat)
 
     def dump(self, dumpfile=None):
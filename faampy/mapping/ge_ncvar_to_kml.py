@@ -14,6 +14,7 @@ import sys
 
 from faampy.core.utils import conv_time_to_secs, conv_secs_to_time, \
                               get_index_from_secs, get_fid
+from faampy.core.flags import get_flag_name, get_flag_masks
 
 
 KML_HEADER="""<?xml version="1.0" encoding="UTF-8"?>
@@ -93,15 +94,13 @@ def get_run_kml(run_data, ds, var, offset, scale_factor, time_lag):
     else:
         alt=(ds.variables[var][:][int(s_index+time_lag):int(e_index+time_lag)]+offset)*scale_factor
 
-    if var+'_FLAG' in ds.variables.keys():
-        alt_flag=ds.variables[var+'_FLAG'][:]
+    if get_flag_name(ds, var):
+        key=slice(int(s_index+time_lag), int(e_index+time_lag))
+        alt_flag=get_flag_masks(ds, [var], accepted_flags=(0,), key=key, missing_value=None)[var]
         if len(alt_flag.shape) > 1:
-            alt_flag=alt_flag[s_index+time_lag:e_index+time_lag, 0]
-        else:
-            alt_flag=alt_flag[s_index+time_lag:e_index+time_lag]
-        #alt_flag=list(alt_flag)
-
-        alt[alt_flag != 0]=0
+            alt_flag=alt_flag[:, 0]
+        # missing values are removed further down
+        alt[alt_flag & np.isfinite(alt)]=0
 
     alt=list(alt)
 
@@ -11,11 +11,10 @@ import numpy as np
 import os
 import re
 import sys
-import shutil
-import tempfile
-import zipfile
 
 import faampy
+from faampy.core.utils import get_time_index
+from faampy.core.kml_writer import KML_Writer, format_coordinates
 
 _KML_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
 <kml xmlns="http://www.opengis.net/kml/2.2" xmlns:gx="http://www.google.com/kml/ext/2.2" xmlns:kml="http://www.opengi
@@ -64,29 +63,11 @@ _KML_WAS_BOTTLE = """<Placemark>
    </Placemark>
 """
 
-# global variables
-_KMZ_TMP_DIRECTORY = tempfile.mkdtemp()
 _FID = ''
 
-def __zip__(outfile):
-    files4zipping = []
-    for root, subFolders, files in os.walk(_KMZ_TMP_DIRECTORY):
-        for f in files:
-            files4zipping.append(os.path.join(root,f))
-    zip = zipfile.ZipFile(outfile, mode='w')
-    for file in files4zipping:
-        zipname = file[len(_KMZ_TMP_DIRECTORY) + (len(os.sep)):]
-        zip.write(file, zipname)
-    return
-
-
-def __setup_kmz__():
-    icon_path = os.path.join(_KMZ_TMP_DIRECTORY, 'icons')
-    os.mkdir(icon_path)
-    icon_file = os.path.join(os.path.dirname(faampy.__file__),
-                             '..', 'files', 'icons',
-                             'was_bottle_32x32.png')
-    shutil.copy(icon_file, icon_path)
+_ICON_FILE = os.path.join(os.path.dirname(faampy.__file__),
+                          '..', 'files', 'icons',
+                          'was_bottle_32x32.png')
 
 
 def t2s(s):
@@ -96,8 +77,7 @@ def t2s(s):
 
 
 def get_index(ds, secs):
-    ix = np.where(ds.variables['Time'][:] == secs)
-    return ix[0]
+    return get_time_index(ds).get_index(secs)
 
 
 def read_was_log(was_log_file):
@@ -111,45 +91,34 @@ def read_was_log(was_log_file):
     return result
 
 
-def parse_was_log(was_log_file, ds):
-    was_log_lines = read_was_log(was_log_file)
-    plcmark_txt = ""
-    for was in was_log_lines:
-        if not was:
+def parse_was_log(was_log_file, ds, writer=None):
+    """
+    Creates a placemark for every bottle in the WAS log. The placemarks are
+    written to *writer*; if writer is None the placemarks are returned as
+    string.
+    """
+    kml = writer or KML_Writer(header=False)
+    was_log_lines = [was for was in read_was_log(was_log_file) if was]
+    # coordinates are read only once and all bottle start and end times
+    # are looked up in one go
+    xyz = np.column_stack([np.asarray(ds.variables[v_name][:], dtype=np.float64).reshape((ds.variables[v_name].shape[0], -1))[:, 0]
+                           for v_name in ('LON_GIN', 'LAT_GIN', 'ALT_GIN')])
+    secs = np.array([(t2s(was[1]), t2s(was[2])) for was in was_log_lines], dtype=np.float64).reshape((-1, 2))
+    ix = get_time_index(ds).get_indices(secs.ravel()).reshape((-1, 2))
+    for was, (s_ix, e_ix) in zip(was_log_lines, ix):
+        if s_ix < 0 or e_ix < 0:
+            sys.stdout.write('%s outside of core data ...\n' % (was[0],))
             continue
-        # get coordinates for bottle start
-        s_secs = t2s(was[1])
-        s_ix = int(get_index(ds, s_secs))
-        e_secs = t2s(was[2])
-        e_ix = int(get_index(ds, e_secs))
-        if len(ds.variables['ALT_GIN'][:].shape) == 2:
-            s_lon = ds.variables['LON_GIN'][:][s_ix, 0]
-            s_lat = ds.variables['LAT_GIN'][:][s_ix, 0]
-            s_alt = ds.variables['ALT_GIN'][:][s_ix, 0]
-            # get coordinates for bottle end
-            e_lon = ds.variables['LON_GIN'][:][e_ix, 0]
-            e_lat = ds.variables['LAT_GIN'][:][e_ix, 0]
-            e_alt = ds.variables['ALT_GIN'][:][e_ix, 0]
-        else:
-            s_lon = ds.variables['LON_GIN'][:][s_ix]
-            s_lat = ds.variables['LAT_GIN'][:][s_ix]
-            s_alt = ds.variables['ALT_GIN'][:][s_ix]
-            # get coordinates for bottle end
-            e_lon = ds.variables['LON_GIN'][:][e_ix]
-            e_lat = ds.variables['LAT_GIN'][:][e_ix]
-            e_alt = ds.variables['ALT_GIN'][:][e_ix]
-
-        linstring_txt = "%f,%f,%f\n%f,%f,%f" % (s_lon, s_lat, s_alt,
-                                                e_lon, e_lat, e_alt)
-        plcmark_txt += _KML_WAS_BOTTLE % (_FID+': ' +was[0], s_alt, was[1], was[2], s_alt, s_lon, s_lat, s_alt, linstring_txt)
-    return plcmark_txt
+        s_lon, s_lat, s_alt = xyz[s_ix]
+        kml.write(_KML_WAS_BOTTLE % (_FID+': ' +was[0], s_alt, was[1], was[2], s_alt, s_lon, s_lat, s_alt,
+                                     format_coordinates(xyz[[s_ix, e_ix]])))
+    if writer is None:
+        return kml.getvalue()
 
 
 def process(was_log_file, ncfile, outpath):
-    global _FID, _KMZ_TMP_DIRECTORY
+    global _FID
 
-    _KMZ_TMP_DIRECTORY = tempfile.mkdtemp()
-    __setup_kmz__()
     _FID = re.search('[bBcC]\d{3}', ncfile).group()
     ds = netCDF4.Dataset(ncfile, 'r')
     if hasattr(ds, 'title'):
@@ -158,14 +127,14 @@ def process(was_log_file, ncfile, outpath):
         flight_desc = str(ds.Title).split()[2] + '-' + str(ds.Title).split()[4] + '-WAS-Bottles'
     else:
         flight_desc = ''
-    was_kml = open(os.path.join(_KMZ_TMP_DIRECTORY, 'doc.kml'), 'w')
-    plcmark_txt = parse_was_log(was_log_file, ds)
+    # the kml is streamed straight into the kmz
+    kml = KML_Writer(os.path.join(outpath, 'faam-was_%s.kmz' % _FID), header=False)
+    kml.write(_KML_HEADER % (flight_desc))
+    parse_was_log(was_log_file, ds, kml)
     ds.close()
-    was_kml.write(_KML_HEADER % (flight_desc))
-    was_kml.write(plcmark_txt)
-    was_kml.write(_KML_FOOTER)
-    was_kml.close()
-    __zip__(os.path.join(outpath, 'faam-was_%s.kmz' % _FID))
+    kml.write(_KML_FOOTER)
+    kml.add_file('icons/was_bottle_32x32.png', filename=_ICON_FILE)
+    kml.close()
 
 
 def __get_ncfile__(path, fid):
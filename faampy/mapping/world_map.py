@@ -14,7 +14,6 @@ import tempfile
 
 import faampy
 from faampy.core.faam_spatial import FAAM_Spatial_DB
-import json
 
 
 ##### SETTINGS #######################################
@@ -147,40 +146,29 @@ def plot_flight_tracks(m, x, y):
 
 def get_flight_tracks(m):
     db = FAAM_Spatial_DB(os.path.join(faampy.FAAMPY_DATA_PATH, 'db', 'faam_spatial_db.sqlite'))
-    sql = """SELECT fid from flight_tracks;"""
-    cur = db.conn.cursor()
-    cur.execute(sql)
-    fids = [fid[0] for fid in cur.fetchall()]
-    fids.sort()
+    # all tracks are fetched with one query
+    tracks = db.get_flight_tracks(simplify=0.01)
     # tidy up flight tracks
     for daft in DAFT_FLIGHT_TRACKS:
-        if daft in fids:
-            fids.remove(daft)
-        
-    sql = """SELECT AsGeojson(Simplify(FT.the_geom, 0.01)) from flight_tracks FT where FT.fid in (%s);""" % (','.join(["'%s'" % fid for fid in fids]))
-    cur = db.conn.cursor()
-    cur.execute(sql) 
-    result = cur.fetchall()
-       
+        tracks.pop(daft, None)
+
     x, y, z = [], [], []
-    for r in result:
-        if not r:
-            continue
-        lon, lat, alt = zip(*(json.loads(r[0]))['coordinates'])
-        _x, _y = m(lon, lat)        
+    for fid in sorted(tracks.keys()):
+        lon, lat, alt = tracks[fid].T
+        _x, _y = m(lon, lat)
         x.append(_x)
         x.append([None,])
         y.append(_y)
         y.append([None,])
         z.append(alt)
         z.append([None,])
-    
+
     #now flatten the coordinates
     x = list(itertools.chain.from_iterable(x))
     y = list(itertools.chain.from_iterable(y))
     z = list(itertools.chain.from_iterable(z))
     return (x,y,z)
-    
+
 
 def _argparser():
     import argparse
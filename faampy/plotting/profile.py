@@ -14,6 +14,8 @@ import scipy.interpolate
 from matplotlib.ticker import MaxNLocator, ScalarFormatter
 
 import faampy.core.utils
+import faampy.core.flags
+import faampy.core.filters
 
 params = {'legend.fontsize': 10,}
 plt.rcParams.update(params)
@@ -30,18 +32,6 @@ class Profile(object):
         self.x_data = []
         self.y_data = []
 
-
-    def __get_mask__(self, parname):
-        if not parname+'_FLAG' in self.ds.variables.keys():
-            flag_data = np.zeros(self.ds.variables[parname].shape).astype(bool)
-        else:
-            flag_data = self.ds.variables[parname+'_FLAG'][:]
-        mask = np.ones(flag_data.shape).astype(bool)
-        for f in self.flag:
-            mask[flag_data == f] = False
-        mask[self.ds.variables[parname][:] == -9999] = True
-        return mask
-
     def setup(self, ds, vars, *args):
         self.ds = ds
         self.vars = list(vars)
@@ -65,15 +55,19 @@ class Profile(object):
         self.vars = pars
 
 
-        try:
-            self.index = faampy.core.utils.data_filter(self.ds, args[0])
-        except:
-            pass
-        self.index=sorted(self.index)
+        if args and args[0]:
+            # boolean mask from the compiled filter; the indices are sorted
+            self.index = np.flatnonzero(faampy.core.filters.get_mask(self.ds, args[0]))
+        else:
+            self.index = np.arange(self.ds.variables['Time'].shape[0])
         try:
             self.flag = args[1]
         except:
             self.flag = [0,1,2,3]
+        # read and mask all variables in one go
+        self.masked = faampy.core.flags.get_masked(self.ds,
+                                                   [v for l in self.vars for v in l],
+                                                   accepted_flags=self.flag)
 
         #for i in range(len(self.vars)):
         #    self.subplt.append(self.fig.add_subplot(1, len(self.vars), 1+i))
@@ -85,27 +79,24 @@ class Profile(object):
             self.x_data.append([])
             self.y_data.append([])
             for j in range(len(self.vars[i])):
-                if len(ds.variables[self.vars[i][j]][:].shape) == 1:
+                masked = self.masked[self.vars[i][j]]
+                if len(masked.shape) == 1:
                     self.x_data[i].append(ds.variables['ALT_GIN'][self.index].ravel())
-                    mask = self.__get_mask__(self.vars[i][j])
-                    y = ma.masked_array(ds.variables[self.vars[i][j]][self.index].ravel(), mask=mask[self.index].ravel())
+                    y = masked[self.index].ravel()
                 else:
-                    (rows, cols) = ds.variables[self.vars[i][j]][:].shape
+                    (rows, cols) = masked.shape
                     #print(self.vars[i][j], cols)
                     if cols > 32:
                         self.x_data[i].append(ds.variables['ALT_GIN'][self.index,:].ravel())
-                        mask = self.__get_mask__(self.vars[i][j])
                         #y = ds.variables[self.vars[i][j]][:,0:64:2]
-                        y = ma.masked_array(ds.variables[self.vars[i][j]][self.index,0:64:2].ravel(), mask=mask[self.index,0:64:2].ravel())
+                        y = masked[self.index,0:64:2].ravel()
                     else:
                         _x = ds.variables['ALT_GIN'][self.index, :]
                         spl = scipy.interpolate.UnivariateSpline(np.linspace(self.index[0], self.index[-1], _x.size), _x.ravel())
                         xs = spl(np.linspace(self.index[0], self.index[-1], len(self.index)*cols))
                         self.x_data[i].append(xs)
-                        mask = self.__get_mask__(self.vars[i][j])
-                        y = ma.masked_array(ds.variables[self.vars[i][j]][self.index,:].ravel(), mask=mask[self.index,:].ravel())
+                        y = masked[self.index,:].ravel()
                         
-                    #mask = self.__get_mask__(ds, vars[i][j])
                 #y = ma.masked_array(ds.variables[vars[i][j]], mask=mask)
 
                 #y = np.ravel(y[self.index,:])
@@ -30,7 +30,7 @@ import matplotlib.pyplot as plt
 from faampy.core.utils import get_fid, conv_time_to_secs, \
                               get_index_from_hhmmss, \
                               conv_secs_to_time, get_flight_duration
-from faampy.core.flight_summary import FlightSummary, Event
+from faampy.core.flight_summary import FlightSummary, Event, events_from_segments
 from timeseries import Timeseries
 from profile import Profile
 from skewt import SkewT
@@ -68,6 +68,9 @@ class Quicklooks(object):
         self.Outpath = outpath
         self.flag = [0]
         self.no_overwrite = False
+        # use runs and profiles detected from the core data instead of
+        # the flight summary
+        self.detect_segments = False
 
     def process(self):
         fltsumm_file = self.Fltsumm_file
@@ -76,10 +79,15 @@ class Quicklooks(object):
 
         fs = FlightSummary(fltsumm_file)
         ds = netCDF4.Dataset(core_file, 'r')
-
+        if self.detect_segments or not fs.Entries:
+            sys.stdout.write('Detecting runs and profiles from core data ...\n')
+            fs.Entries = events_from_segments(ds)
 
         plot_type = 'timeseries'
-        Start_time = fs.Entries[[x.Name.lower() for x in fs.Entries].index('t/o')].Start_time
+        try:
+            Start_time = fs.Entries[[x.Name.lower() for x in fs.Entries].index('t/o')].Start_time
+        except ValueError:
+            Start_time = conv_secs_to_time(int(ds.variables['Time'][0]), no_colons=True)
         fs.Entries.reverse()
         try:
             Stop_time = fs.Entries[[x.Name.lower() for x in fs.Entries].index('land')].Start_time
@@ -242,6 +250,7 @@ def _argparser():
     parser.add_argument('fltsumm_file', action="store", type=str, help='FAAM Flight Summary file')
     parser.add_argument('outpath', action="store", type=str, help='outpath where all the quicklook figures will be saved')
     parser.add_argument('--config_file', action="store", type=str, help='config file that defines the plots that are produced', default='')
+    parser.add_argument('--detect_segments', action="store_true", help='use the runs and profiles detected from the core data instead of the flight summary', default=False)
     return parser
 
 
@@ -252,6 +261,7 @@ def main():
                    args.core_file,
                    args.outpath,
                    args.config_file)
+    q.detect_segments = args.detect_segments
     q.process()
     sys.stdout.write('Done ...\n')
 
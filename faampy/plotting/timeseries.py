@@ -12,12 +12,13 @@ from matplotlib.ticker import MaxNLocator, ScalarFormatter
 import sys
 
 import faampy.core.utils
+import faampy.core.flags
+import faampy.core.filters
 
 params = {'legend.fontsize': 10,}
 plt.rcParams.update(params)
 
 # TODO: add xlabel and ylabel
-# TODO: use flagging
 # TODO: deal with parameter input that do not exist in the core faam data set
 
 
@@ -41,22 +42,6 @@ class Timeseries(object):
         self.y_data = []
         self.label = []
 
-
-    def __get_mask__(self, parname):
-        if not parname+'_FLAG' in self.ds.variables.keys():
-            flag_data = np.zeros(self.ds.variables[parname].shape).astype(bool)
-        else:
-            flag_data = self.ds.variables[parname+'_FLAG'][:]
-        mask = np.ones(flag_data.shape).astype(bool)
-        if not parname+'_FLAG' in self.ds.variables.keys():
-            return mask
-
-        flag_data = self.ds.variables[parname+'_FLAG'][:]
-        for f in self.flag:
-            mask[flag_data == f] = False
-        mask[self.ds.variables[parname][:] == -9999] = True
-        return mask
-
     def setup(self, ds, vars, *args):
         """ds: netCDF4.Dataset
         vars: list of variable names that should be plotted
@@ -80,15 +65,19 @@ class Timeseries(object):
             self.NO_DATA = False
         self.vars = pars
 
-        try:
-            self.index = faampy.core.utils.data_filter(self.ds, args[0])
-        except:
-            self.index = range(0, self.ds.variables['Time'].size)
-        self.index=sorted(self.index)
+        if args and args[0]:
+            # boolean mask from the compiled filter; the indices are sorted
+            self.index = np.flatnonzero(faampy.core.filters.get_mask(self.ds, args[0]))
+        else:
+            self.index = np.arange(self.ds.variables['Time'].shape[0])
         try:
             self.flag = args[1]
         except:
             self.flag = [0,1,2,3]
+        # read and mask all variables in one go
+        self.masked = faampy.core.flags.get_masked(self.ds,
+                                                   [v for l in self.vars for v in l],
+                                                   accepted_flags=self.flag)
 
         #for i in range(len(self.vars)):
         #    self.subplt.append(self.fig.add_subplot(len(self.vars), 1, i+1))
@@ -100,22 +89,18 @@ class Timeseries(object):
             self.x_data.append([])
             self.y_data.append([])
             for j in range(len(self.vars[i])):
-                if len(ds.variables[self.vars[i][j]][:].shape) == 2:
-                    (rows, cols) = ds.variables[self.vars[i][j]][:].shape
+                if len(self.masked[self.vars[i][j]].shape) == 2:
+                    (rows, cols) = self.masked[self.vars[i][j]].shape
                     self.x_data[i].append(np.ravel(faampy.core.utils.get_mpl_time(ds, cols)[self.index,:]))
                 else:
                     self.x_data[i].append(np.ravel(faampy.core.utils.get_mpl_time(ds)[self.index]))
-                mask = self.__get_mask__(self.vars[i][j])
                 #y = ma.masked_array(ds.variables[vars[i][j]][:], mask=mask)
                 #print(vars[i][j])
                 #y = ds.variables[self.vars[i][j]][:]
                 #y = np.ravel(y[self.index,:])
                 #y[y == -9999] = np.nan
                 #TODO
-                if len(ds.variables[self.vars[i][j]][:].shape) == 2:
-                    y = ma.masked_array(ds.variables[self.vars[i][j]][self.index,:].ravel(), mask=mask[self.index,:].ravel())
-                else:
-                    y = ma.masked_array(ds.variables[self.vars[i][j]][self.index].ravel(), mask=mask[self.index].ravel())
+                y = self.masked[self.vars[i][j]][self.index].ravel()
                     #y = self.__set_mask__(y, vars[i][j])
                 #self.y_data[i].append(np.ravel(ds.variables[vars[i][j]][self.index,:]))
                 self.y_data[i].append(y)
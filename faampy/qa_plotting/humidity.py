@@ -36,7 +36,8 @@ import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 import numpy as np
 
-from humidity_formulae import dp2vp, vp2vmr
+from faampy.core.calclib import dp2vp, vp2vmr
+from faampy.core.derived import get_derived
 
 from utils import *
 from general import add_time_buffer, QaQc_Figure, set_suptitle, get_data, \
@@ -91,9 +92,7 @@ def plot_humidity_scatter(ax, data):
 
     # converts dew point from GE to volume mixing ratio;
     # so that it matches the other humidity measurements
-    tdew_ge = data['TDEW_GE'][:, 0].ravel()
-    ps_rvsm = data['PS_RVSM'][:, 0].ravel()
-    vmr_ge = conv_ge(tdew_ge, ps_rvsm)
+    vmr_ge = data['VMR_GE']
     ax.plot(data['WVSS2R_VMR'][:].ravel(), vmr_ge, '.', label='GE')
 
     axis_range = (min([ax.get_xlim()[0], ax.get_ylim()[0]]),
@@ -175,9 +174,7 @@ def plot_humidity(ax, data):
 
     # converts dew point from GE to volume mixing ratio,
     # so that it matches the other humidity measurements
-    tdew_ge = data['TDEW_GE'][:, 0].ravel()
-    ps_rvsm = data['PS_RVSM'][:, 0].ravel()
-    vmr_ge = conv_ge(tdew_ge, ps_rvsm)
+    vmr_ge = data['VMR_GE']
 
     ax.plot_date(data['mpl_timestamp'][:, 0].ravel(),
                  vmr_ge,
@@ -227,12 +224,12 @@ def main(ds):
 
     data = get_data(ds, VARIABLE_NAMES)
     data['VMR_CR2'][data['VMR_CR2'] < 0] = np.nan  # remove unreasonable data
-    tdew_ge = data['TDEW_GE'][:, 0].ravel()
-    ps_rvsm = data['PS_RVSM'][:, 0].ravel()
-
-    vp_ge = dp2vp(tdew_ge)
-    vmr_ge = vp2vmr(vp_ge, ps_rvsm)
-    vmr_ge = vmr_ge*1E6
+    # dew point from GE converted to volume mixing ratio; calculated once
+    # and shared by the plotting methods
+    vmr_ge = get_derived(ds, 'VMR_GE')
+    if vmr_ge.ndim > 1:
+        vmr_ge = vmr_ge[:, 0]
+    data['VMR_GE'] = vmr_ge.ravel()
 
     # call the plotting methods below
     plot_humidity(fig.get_axes()[0], data)
@@ -1,9 +1,8 @@
 import numpy as np
+
+# dp2vp and vp2vmr are also used by the derived variables in faampy.core
+from faampy.core.calclib import dp2vp, vp2vmr
             
-def vp2vmr(vp,p):    
-    vmr=vp/(p-vp)
-    return vmr
-    
 def vp2uw(vp,p):
     uw=vp/p
     return uw
@@ -71,33 +70,6 @@ def fp2vp(fp,p=[],temp=[],enhance=False):
         vp=vp*ef
     return vp
 
-def dp2vp(dp,p=[],temp=[],enhance=False):
-    """
-    Convert a dew point to a volume mixing ratio ( and vapour pressure )
-    Using ITS-90 correction of Wexler's formula
-    Optional enhancement factors for non ideal 
-    """
-    dp=np.atleast_1d(dp)
-    g=np.array([-2.8365744e3,-6.028076559e3,1.954263612e1,-2.737830188e-2, 
-       1.6261698e-5,7.0229056e-10,-1.8680009e-13,2.7150305],dtype='f8')
-    lnes=np.log(dp)*g[7]
-    for i in range(7):lnes=lnes+g[i]*(dp**(i-2.0))
-    vp=np.exp(lnes)/1e2
-    if(enhance and len(p)>0) :
-        A=np.array([-1.6302041e-1,1.8071570e-3,-6.7703064e-6,8.5813609e-9],dtype='f8')
-        B=np.array([-5.9890467e1,3.4378043e-1,-7.7326396e-4,6.3405286e-7],dtype='f8')
-        if(len(temp)==0) : temp=fp
-        alpha=np.zeros(fp.shape)
-        beta=np.zeros(fp.shape)
-        for i in range(4) :
-            alpha=alpha+(A[i]*(temp**i))
-            beta=beta+(B[i]*(temp**i))
-        beta=np.exp(beta)
-        ef=np.exp(alpha*(1-vp/p)+beta*(p/vp-1))
-        vp=vp*ef
-    return vp
-
-
 def vp2fp(vp,p=[],temp=[],enhance=False):
     """
     Convert a volume mixing ratio to a frost point ( and vapour pressure )
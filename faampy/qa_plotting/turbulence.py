@@ -48,6 +48,8 @@ import matplotlib.pyplot as plt
 import netCDF4
 import numpy as np
 
+from faampy.core.derived import get_derived
+
 from general import *
 from style import *
 from utils import *
@@ -215,12 +217,9 @@ class TurbuOverview(object):
         else:
             hdg_offset = self.Hdg_offset
             sys.stdout.write('TurbuOverview hdg_offset set to %f\n' % (hdg_offset))
-            u_bulk, v_bulk = calc_bulk_wspd(self.Data.variables['TAS_RVSM'][:],
-                                            self.Data.variables['HDG_GIN'][:],
-                                            self.Data.variables['VELN_GIN'][:],
-                                            self.Data.variables['VELE_GIN'][:],
-                                            self.Data.variables['TAT_DI_R'][:],
-                                            hdg_offset=hdg_offset)
+            # the registry calculates both components in one go
+            u_bulk = get_derived(self.Data, 'U_BULK', hdg_offset=hdg_offset)
+            v_bulk = get_derived(self.Data, 'V_BULK', hdg_offset=hdg_offset)
 
         u_c = self.Data.variables['U_C'][:]
         v_c = self.Data.variables['V_C'][:]
@@ -244,10 +243,9 @@ class TurbuOverview(object):
 
         self.PlotData['WSPD_BULK'] = self.__mask_plot_data__(calc_wspd( u_bulk, v_bulk))
         self.PlotData['WSPD'] = self.__mask_plot_data__(calc_wspd(u_c, v_c))
-        self.PlotData['TAS_RVSM'] = correct_tas_rvsm(self.Data.variables['TAS_RVSM'][:], self.Data.variables['TAT_DI_R'][:])
+        self.PlotData['TAS_RVSM'] = get_derived(self.Data, 'TAS_RVSM_CORR')
         self.PlotData['TAS_DIFF'] = self.__mask_plot_data__(self.Data.variables['TAS'][:] - \
-                                                            correct_tas_rvsm(self.Data.variables['TAS_RVSM'][:], \
-                                                                             self.Data.variables['TAT_DI_R'][:]))
+                                                            self.PlotData['TAS_RVSM'])
 
         self.PlotData['WSPD_DIFF'] = self.__mask_plot_data__(wspd - wspd_bulk)
         self.PlotData['WDIR_DIFF'] = self.__mask_plot_data__(wdir - wdir_bulk)
@@ -17,6 +17,8 @@ from matplotlib.dates import date2num
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 
+from faampy.core.utils import get_time_index, data_filter
+
 def sub_nans(ncfilename):
     """
     This function substitutes any NaN values with -9999
@@ -35,29 +37,6 @@ def sub_nans(ncfilename):
     ds.close()
 
 
-def data_filter(ds, var_filter, verbose=None):
-    """
-    filter(ds, [('Time', (20000 , 22000)), ('GIN_ALT', (0, 40000))]
-
-    """
-    ix=np.empty(0)
-    n=len(ds.variables['Time'])
-    for item in var_filter:
-        key=item[0]
-        val=item[1]
-        tmp_var=ds.variables[key][:].ravel()
-        ix_tmp=np.where((tmp_var < val[0]) | (tmp_var > val[1]))[0]
-        if verbose:
-            sys.stdout.write('Filtering %s ... %.2f %% removed' % (key, float(ix_tmp.size)/float(tmp_var.size)*100.0))
-        ix=np.concatenate((ix, ix_tmp))
-    bad_index=set(np.unique(ix))
-    full_index=set(range(n))
-    good_index=list(full_index.difference(bad_index))
-    if verbose:
-        sys.stdout.write('Remaining points: %i (%5.2f percent)\n' % (len(good_index), float(len(good_index))/float(len(n))*100.0))
-    return good_index
-
-
 def conv_secs_to_time(secs, no_colons=None):
     """
     converts seconds past midnight to time string HH:MM:SS
@@ -238,8 +217,7 @@ def get_flight_duration(ds, quite=None):
 
 
 def get_index_from_secs(ds, secs):
-    ix = np.where(ds.variables['Time'][:] == secs)
-    return ix[0][0]
+    return get_time_index(ds).get_index(secs)
 
 
 def get_index_from_hhmmss(ds, hhmmss):
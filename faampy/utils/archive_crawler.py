@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+"""
+Parallel crawler for FAAM data archives.
+
+Directories are listed with os.scandir, which gets the file type from the
+directory entry itself and does not need an extra stat call per file. The
+directories of one level of the tree are listed concurrently in a thread
+pool, which hides the latency of network file systems (NFS). Every
+filename is classified once by the combined, precompiled classifier in
+faampy.utils.file_info, which returns data type and instrument together.
+
+The result of a crawl is used for File_List objects and for the data
+availability report:
+
+>>> from faampy.utils.archive_crawler import crawl, to_file_list, availability
+>>> records = crawl('/home/data/faam/badcMirror')
+>>> fl = to_file_list(records)
+>>> report = availability(records)
+
+"""
+
+import os
+import re
+import sys
+
+from collections import OrderedDict
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+try:
+    from os import scandir as _scandir
+except ImportError:
+    # python2: use the scandir backport if it is installed
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
+
+import faampy
+from faampy.utils import file_info
+
+
+# list of file names that are ignored
+NON_DATA_FILES = ['.ftpaccess', '.ftpaccess.org', '.checksums', '.listing',
+                  '.summary', '00README', 'ARIES_readme.txt']
+
+# number of threads that list directories concurrently
+THREADS = 8
+
+_FID_REGEX = re.compile(r'[bc]\d{3}')
+_DATE_REGEX = re.compile(r'_(\d{8})\d*_')
+
+
+def list_directory(path, ignore=NON_DATA_FILES):
+    """
+    Lists and classifies the content of one directory
+
+    :param str path: directory
+    :param list ignore: filenames that are skipped (also with a trailing '~')
+    :return: tuple (files, subdirs), where files is a list of
+      (filename, data_type, instrument) tuples and subdirs a list of full
+      paths
+    :rtype: tuple
+    :raises OSError: if the directory can not be read. A failed listing is
+      not the same as an empty directory
+    """
+    files, subdirs = [], []
+    ignore = set(ignore)
+    if _scandir is not None:
+        entries = [(e.name, e.is_dir()) for e in _scandir(path)]
+    else:
+        entries = [(name, os.path.isdir(os.path.join(path, name))) for name in os.listdir(path)]
+    for name, is_dir in entries:
+        if is_dir:
+            subdirs.append(os.path.join(path, name))
+        elif name not in ignore and name.rstrip('~') not in ignore:
+            data_type, instrument = file_info.classify_filename(name)
+            files.append((name, data_type, instrument))
+    return (files, subdirs)
+
+
+def _list_directory_(path):
+    try:
+        return (path, list_directory(path))
+    except OSError as e:
+        sys.stdout.write('%s: can not be listed (%s).\n' % (path, e))
+        return (path, ([], []))
+
+
+def crawl(path_list=None, threads=THREADS):
+    """
+    Crawls one or more directory trees
+
+    :param path_list: path or list of paths. By default the paths from the
+      .faampy_config file are used
+    :param int threads: number of threads that list directories
+    :return: list of (path, filename, data_type, instrument) tuples for all
+      files; data_type and instrument are None for unknown files
+    :rtype: list
+    """
+    if path_list is None:
+        path_list = faampy.DATA_SEARCH_PATH_LIST
+    elif not hasattr(path_list, '__iter__') or isinstance(path_list, str):
+        path_list = [path_list, ]
+    level = []
+    for path in path_list:
+        if os.path.isdir(path):
+            level.append(os.path.abspath(path))
+        else:
+            sys.stdout.write('%s: does not exist.\n' % path)
+    result = []
+    pool = ThreadPool(max(1, threads))
+    try:
+        while level:
+            next_level = []
+            for path, (files, subdirs) in pool.imap_unordered(_list_directory_, level):
+                result += [(path, ) + f for f in files]
+                next_level += subdirs
+            level = next_level
+    finally:
+        pool.close()
+        pool.join()
+    return result
+
+
+def to_file_list(records):
+    """
+    Creates a File_List from the crawl result. Only files with a known data
+    type and a revision below 90 are included.
+
+    :param list records: result from crawl
+    :rtype: File_List
+    """
+    from faampy.utils.file_list import _File_List
+    result = []
+    for path, filename, data_type, instrument in records:
+        if not data_type:
+            continue
+        rev = file_info.get_revision_from_filename(filename)
+        if rev is None:
+            continue
+        result.append(file_info.File_Info.from_record(path,
+                                                      filename,
+                                                      data_type,
+                                                      file_info.get_fid_from_filename(filename),
+                                                      file_info.get_date_from_filename(filename),
+                                                      rev))
+    result = _File_List(result)
+    result.sort()
+    return result
+
+
+def availability(records):
+    """
+    Latest flight and date for which data files of an instrument exist
+
+    :param list records: result from crawl
+    :return: dictionary with the instrument identifiers as keys and
+      (fid, date) as values; value is None if no file was found. The
+      residuals, files that belong to no instrument, are stored with the
+      key None
+    :rtype: OrderedDict
+    """
+    fids, dates = {}, {}
+    residuals = []
+    for path, filename, data_type, instrument in records:
+        if instrument is None:
+            residuals.append(filename)
+            continue
+        _filename = filename.lower()
+        fid = _FID_REGEX.findall(_filename)
+        if fid:
+            fids[instrument] = max(fids.get(instrument, ''), fid[0])
+        date = _DATE_REGEX.findall(_filename)
+        if date:
+            dates[instrument] = max(dates.get(instrument, ''), date[0])
+    instruments = [i for i, _ in file_info.INSTRUMENT_TYPES]
+    instruments += sorted(set([file_info.DATA_TYPE_INSTRUMENTS.get(k, k) for k in file_info.DATA_TYPES]).difference(instruments))
+    result = OrderedDict()
+    for instr in instruments:
+        if instr in fids or instr in dates:
+            date = dates.get(instr)
+            if date:
+                date = datetime.strptime(date, '%Y%m%d').strftime('%Y-%m-%d')
+            result[instr] = (fids.get(instr), date)
+        else:
+            result[instr] = None
+    result[None] = residuals
+    return result
+
+
+def print_availability(report, residuals=False):
+    """
+    Prints the availability report
+
+    :param OrderedDict report: result from availability
+    :param boolean residuals: also print files without an instrument
+    """
+    for k, v in report.items():
+        if k is None:
+            continue
+        if v:
+            sys.stdout.write('%20s  %-15s\n' % (k, str(v[0])+3*' '+str(v[1])))
+        else:
+            sys.stdout.write('%20s  %-15s\n' % (k, 'EMPTY'))
+    if residuals:
+        for f in report[None]:
+            if ((not f.startswith('.')) and (not f.startswith('0')) and (not f.startswith('1'))):
+                sys.stdout.write('%s\n' % f)
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+"""
+Persistent index of the FAAM data files in an archive (e.g. the mirror of
+the BADC archive).
+
+The index is a sqlite database that stores the data type, flight id, date
+and revision of every FAAM data file together with the modification time
+of every directory. When the index is updated only directories whose
+modification time has changed are listed again; for all other directories
+a single os.stat call is enough. Adding, deleting or renaming a file
+changes the modification time of its directory, so the index stays
+complete.
+
+>>> from faampy.utils.archive_index import Archive_Index
+>>> idx = Archive_Index()
+>>> idx.update('/mnt/faamarchive/badcMirror')
+>>> fl = idx.get_file_list(data_type='core-hires', start='20150101', end='20151231',
+...                        latest_revision=True)
+
+"""
+
+import os
+import sqlite3
+import sys
+
+from multiprocessing.pool import ThreadPool
+
+import faampy
+from faampy.utils import file_info
+from faampy.utils.archive_crawler import list_directory, THREADS
+
+
+DB_FILE = os.path.join(faampy.FAAMPY_DATA_PATH, 'db', 'archive_index.sqlite')
+
+
+def _check_directory_(args):
+    """
+    Returns the modification time of a directory and, if it differs from
+    the known one, its classified content (see list_directory). The
+    modification time is None if the directory does not exist anymore.
+    The third item is the error message if the directory exists but could
+    not be listed.
+    """
+    path, known_mtime = args
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        if os.path.lexists(path):
+            # e.g. NFS hiccup; the directory is still there
+            return (known_mtime, None, 'can not be read')
+        return (None, None, None)
+    if mtime == known_mtime:
+        return (mtime, None, None)
+    try:
+        return (mtime, list_directory(path), None)
+    except OSError as e:
+        return (mtime, None, str(e))
+
+
+class Archive_Index(object):
+
+    def __init__(self, db_file=DB_FILE):
+        """
+        :param str db_file: sqlite file of the index; it is created if it
+          does not exist
+        """
+        self.db_file = db_file
+        if db_file != ':memory:' and not os.path.exists(os.path.dirname(db_file)):
+            os.makedirs(os.path.dirname(db_file))
+        self.conn = sqlite3.connect(db_file)
+        self.setup()
+
+    def setup(self):
+        cur = self.conn.cursor()
+        cur.execute('CREATE TABLE IF NOT EXISTS directories ('
+                    'path TEXT NOT NULL PRIMARY KEY,'
+                    'parent TEXT,'
+                    'mtime REAL);')
+        cur.execute('CREATE TABLE IF NOT EXISTS files ('
+                    'path TEXT NOT NULL,'
+                    'filename TEXT NOT NULL,'
+                    'data_type TEXT,'
+                    'fid TEXT,'
+                    'date TEXT,'
+                    'rev INTEGER,'
+                    'PRIMARY KEY (path, filename));')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_directories_parent ON directories (parent);')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_files_data_type ON files (data_type, fid);')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_files_fid ON files (fid);')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_files_date ON files (date);')
+        self.conn.commit()
+
+    def _remove_directory_(self, cur, path):
+        """
+        Removes a directory and all its subdirectories from the index
+        """
+        stack = [path, ]
+        while stack:
+            p = stack.pop()
+            cur.execute('SELECT path FROM directories WHERE parent=?;', (p,))
+            stack += [r[0] for r in cur.fetchall()]
+            cur.execute('DELETE FROM files WHERE path=?;', (p,))
+            cur.execute('DELETE FROM directories WHERE path=?;', (p,))
+
+    def _store_directory_(self, cur, path, parent, mtime, files, subdirs):
+        """
+        Replaces the entries of a directory in the index
+        """
+        rows = []
+        for name, data_type, instrument in files:
+            if data_type:
+                rows.append((path,
+                             name,
+                             data_type,
+                             file_info.get_fid_from_filename(name),
+                             file_info.get_date_from_filename(name),
+                             file_info.get_revision_from_filename(name)))
+        cur.execute('DELETE FROM files WHERE path=?;', (path,))
+        cur.executemany('INSERT INTO files (path, filename, data_type, fid, date, rev) VALUES (?, ?, ?, ?, ?, ?);', rows)
+        # subdirectories that disappeared
+        cur.execute('SELECT path FROM directories WHERE parent=?;', (path,))
+        for old in set([r[0] for r in cur.fetchall()]).difference(subdirs):
+            self._remove_directory_(cur, old)
+        cur.execute('INSERT OR REPLACE INTO directories (path, parent, mtime) VALUES (?, ?, ?);',
+                    (path, parent, mtime))
+
+    def update(self, path_list=None, verbose=False, threads=THREADS):
+        """
+        Updates the index for one or more directory trees. Only directories
+        that are new or whose modification time has changed are listed. The
+        directories of one level of the tree are checked and listed
+        concurrently; the index is written from the calling thread.
+
+        :param path_list: path or list of paths. By default the paths from
+          the .faampy_config file are used
+        :param verbose: print the number of directories that were listed
+        :type verbose: boolean
+        :param int threads: number of threads that check and list directories
+        :return: number of directories that were listed
+        :rtype: int
+        """
+        if path_list is None:
+            path_list = faampy.DATA_SEARCH_PATH_LIST
+        elif not hasattr(path_list, '__iter__') or isinstance(path_list, str):
+            path_list = [path_list, ]
+        cur = self.conn.cursor()
+        cur.execute('SELECT path, mtime FROM directories;')
+        known = dict(cur.fetchall())
+        n_scanned, n_checked = 0, 0
+        level = []
+        pool = ThreadPool(max(1, threads))
+        try:
+            for root in path_list:
+                root = os.path.abspath(root)
+                if not os.path.isdir(root):
+                    sys.stdout.write('%s: does not exist.\n' % root)
+                    self._remove_directory_(cur, root)
+                else:
+                    level.append((root, None))
+            while level:
+                next_level = []
+                jobs = [(path, known.get(path)) for path, parent in level]
+                for (path, parent), (mtime, listing, error) in zip(level, pool.map(_check_directory_, jobs)):
+                    n_checked += 1
+                    if error is not None:
+                        # the stored entries and mtime are kept, so that the
+                        # directory is listed again on the next update
+                        sys.stdout.write('%s: %s ...\n' % (path, error))
+                    elif mtime is None:
+                        self._remove_directory_(cur, path)
+                        continue
+                    if listing is None:
+                        # unchanged or failed; the subdirectories are known
+                        cur.execute('SELECT path FROM directories WHERE parent=?;', (path,))
+                        subdirs = [r[0] for r in cur.fetchall()]
+                    else:
+                        files, subdirs = listing
+                        self._store_directory_(cur, path, parent, mtime, files, subdirs)
+                        n_scanned += 1
+                    next_level += [(d, path) for d in subdirs]
+                level = next_level
+            self.conn.commit()
+        except:
+            self.conn.rollback()
+            raise
+        finally:
+            pool.close()
+            pool.join()
+        if verbose:
+            sys.stdout.write('Listed %i of %i directories ...\n' % (n_scanned, n_checked))
+        return n_scanned
+
+    def query(self, data_type=None, fid=None, start=None, end=None, latest_revision=False, path_list=None):
+        """
+        Searches the index.
+
+        :param data_type: data type or list of data types (see
+          faampy.utils.file_info.DATA_TYPES)
+        :param fid: flight id or list of flight ids
+        :param str start: earliest date (YYYYmmdd)
+        :param str end: latest date (YYYYmmdd)
+        :param latest_revision: only return the latest revision for every
+          flight, date and data type
+        :type latest_revision: boolean
+        :param path_list: only files below these paths
+        :return: list of (path, filename, data_type, fid, date, rev) tuples
+        :rtype: list
+        """
+        conditions, params = ['rev IS NOT NULL', ], []
+        for column, value in (('data_type', data_type), ('fid', fid)):
+            if value is None:
+                continue
+            if isinstance(value, str):
+                value = [value, ]
+            conditions.append('%s IN (%s)' % (column, ', '.join(['?']*len(value))))
+            params += [v.lower() if column == 'fid' else v for v in value]
+        if start is not None:
+            conditions.append('date >= ?')
+            params.append(str(start))
+        if end is not None:
+            # dates can have a time part (YYYYmmddHHMMSS)
+            conditions.append('substr(date, 1, 8) <= ?')
+            params.append(str(end))
+        if path_list is not None:
+            if isinstance(path_list, str):
+                path_list = [path_list, ]
+            if not path_list:
+                return []
+            _conditions = []
+            for p in path_list:
+                p = os.path.abspath(p)
+                _conditions.append('(path = ? OR substr(path, 1, ?) = ?)')
+                params += [p, len(p)+len(os.sep), p+os.sep]
+            conditions.append('(%s)' % ' OR '.join(_conditions))
+        where = ' AND '.join(conditions)
+        sql = 'SELECT path, filename, data_type, fid, date, rev FROM files WHERE %s' % where
+        if latest_revision:
+            sql = ('SELECT F.path, F.filename, F.data_type, F.fid, F.date, F.rev FROM (%s) F '
+                   'JOIN (SELECT data_type, fid, date, MAX(rev) AS rev FROM files WHERE %s GROUP BY data_type, fid, date) L '
+                   'ON F.data_type=L.data_type AND F.fid=L.fid AND F.date=L.date AND F.rev=L.rev') % (sql, where)
+            params = params+params
+            sql += ' ORDER BY F.fid, F.rev, F.filename;'
+        else:
+            sql += ' ORDER BY fid, rev, filename;'
+        cur = self.conn.cursor()
+        cur.execute(sql, params)
+        return cur.fetchall()
+
+    def get_file_list(self, *args, **kwargs):
+        """
+        Same as query, but the result is a File_List
+        """
+        from faampy.utils.file_list import _File_List
+        return _File_List([file_info.File_Info.from_record(*row) for row in self.query(*args, **kwargs)])
+
+    def close(self):
+        self.conn.close()
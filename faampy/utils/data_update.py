@@ -6,17 +6,25 @@ Script updates the flight constants and flight track databases.
 """
 
 import datetime
+import hashlib
+import multiprocessing
 import os
 import sys
 
+import numpy as np
+
 import faampy
 import faampy.fltcons.update
-from faampy.utils.file_list import File_List
+from faampy.utils.archive_index import Archive_Index
 from faampy.core.faam_data import FAAM_Dataset
 from faampy.core.faam_spatial import FAAM_Spatial_DB
 import faampy.core.flight_summary
 
 
+# number of flights that are written to the spatial database in one go
+BATCH_SIZE = 20
+
+
 def time_convert(base_time, time_string):
     secs = int(time_string[0:2])*3600 + \
            int(time_string[2:4])*60 + \
@@ -25,77 +33,245 @@ def time_convert(base_time, time_string):
     return result
 
 
-def update_fltcons_db(inpath):
+def update_fltcons_db(inpath, index=None):
     """
     :param str inpath: directory that will be searched for flight constant files
+    :param index: Archive_Index that is used to find the files
+    :type index: Archive_Index
     """
-    faampy.fltcons.update.update(inpath=inpath, clean=True)
+    # only files that are not in the database yet are added
+    faampy.fltcons.update.update(inpath=inpath, clean=False, index=index)
     return
 
 
-def update_spatial_db(inpath, overwrite=False):
+def _md5_(filename, blocksize=2**20):
+    """
+    md5 checksum of a file
+    """
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def _file_state_(finfo):
+    """
+    name, revision, size and modification time of a File_Info item
+    """
+    if finfo is None:
+        return (None, None, None, None)
+    filename = os.path.join(finfo.path, finfo.filename)
+    st = os.stat(filename)
+    return (filename, finfo.rev, st.st_size, st.st_mtime)
+
+
+def _diff_manifest_(core_file_list, fltsumm_file_list, manifest, overwrite=False):
     """
+    Compares the archive with the ingest manifest and returns a job for
+    every flight that is new or whose core or flight summary file changed.
+    Files whose name, size and modification time match the manifest are
+    considered unchanged and are not read.
+    """
+    fltsumm = dict([(f.fid, f) for f in fltsumm_file_list])
+    jobs = []
+    for f in core_file_list:
+        try:
+            core_state = _file_state_(f)
+            fltsumm_state = _file_state_(fltsumm.get(f.fid))
+        except OSError:
+            continue
+        entry = manifest.get(f.fid)
+        if entry and not overwrite:
+            if ((entry['core_file'], entry['core_size'], entry['core_mtime']) == (core_state[0], core_state[2], core_state[3]) and
+                (entry['fltsumm_file'], entry['fltsumm_size'], entry['fltsumm_mtime']) == (fltsumm_state[0], fltsumm_state[2], fltsumm_state[3])):
+                continue
+        job = {'fid': f.fid,
+               'date': f.date,
+               'core': core_state,
+               'fltsumm': fltsumm_state,
+               'core_md5': None,
+               'fltsumm_md5': None}
+        if entry and not overwrite:
+            # the file might have only been touched; the checksums decide
+            job['core_md5'] = entry['core_md5']
+            job['fltsumm_md5'] = entry['fltsumm_md5']
+        jobs.append(job)
+    return jobs
+
+
+def _extract_flight_(job):
+    """
+    Extracts flight track and flight summary events of one flight. Runs in
+    a worker process; the result is written to the database by the calling
+    process.
+    """
+    result = {'fid': job['fid'],
+              'track': None,
+              'events': [],
+              'unchanged': False,
+              'manifest': None,
+              'errors': []}
+    core_file, core_rev, core_size, core_mtime = job['core']
+    fltsumm_file, fltsumm_rev, fltsumm_size, fltsumm_mtime = job['fltsumm']
+    try:
+        core_md5 = _md5_(core_file)
+        fltsumm_md5 = _md5_(fltsumm_file) if fltsumm_file else None
+    except (IOError, OSError) as e:
+        result['errors'].append('Error while reading %s: %s' % (job['fid'], e))
+        return result
+    manifest = {'fid': job['fid'],
+                'core_file': core_file,
+                'core_rev': core_rev,
+                'core_size': core_size,
+                'core_mtime': core_mtime,
+                'core_md5': core_md5,
+                'fltsumm_file': fltsumm_file,
+                'fltsumm_rev': fltsumm_rev,
+                'fltsumm_size': fltsumm_size,
+                'fltsumm_mtime': fltsumm_mtime,
+                'fltsumm_md5': fltsumm_md5,
+                'ingested': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')}
+    if (job['core_md5'], job['fltsumm_md5']) == (core_md5, fltsumm_md5):
+        result['unchanged'] = True
+        result['manifest'] = manifest
+        return result
+    try:
+        ds = FAAM_Dataset(core_file, cache=True)
+    except Exception as e:
+        result['errors'].append('Error while processing %s: %s' % (os.path.basename(core_file), e))
+        return result
+    try:
+        try:
+            dt = datetime.datetime.strptime(job['date'], '%Y%m%d')
+            # the coordinates are passed as array and loaded as WKB
+            result['track'] = (job['fid'], dt, ds.coords.simplified())
+        except Exception as e:
+            result['errors'].append('Error while processing %s: %s' % (os.path.basename(core_file), e))
+            return result
+        if fltsumm_file:
+            try:
+                # reuse the open dataset, so that the core file is only read once
+                fs = faampy.core.flight_summary.process(fltsumm_file, ds)
+            except Exception as e:
+                fs = None
+                result['errors'].append('Error while processing %s: %s' % (os.path.basename(fltsumm_file), e))
+            if fs is not None:
+                # Only consider two-point events
+                for ent in fs.Entries:
+                    if ent.Stop_time and ent.Coords is not None:
+                        try:
+                            result['events'].append((job['fid'],
+                                                     ent.Name,
+                                                     time_convert(fs.date, ent.Start_time_48),
+                                                     time_convert(fs.date, ent.Stop_time_48),
+                                                     np.asarray(ent.Coords)[[0, -1]]))
+                        except Exception as e:
+                            result['errors'].append('Error adding %s:%s: %s' % (job['fid'], ent.Name, e))
+    finally:
+        ds.close()
+    result['manifest'] = manifest
+    return result
+
+
+def _write_batch_(sdb, results):
+    """
+    Writes the results of several flights to the database. Flight tracks,
+    events and manifest entries are each inserted with one executemany. The
+    manifest is written last, so that flights from a batch that failed are
+    processed again on the next update.
+    """
+    processed = [r for r in results if r['track'] is not None]
+    fids = [r['fid'] for r in processed]
+    if processed:
+        # events of the old revision are removed
+        sdb.delete_fltsumm_events(fids)
+        sdb.insert_flight_tracks([r['track'] for r in processed], overwrite=True)
+        events = []
+        for r in processed:
+            events += r['events']
+        n = sdb.insert_fltsumm_events(events, overwrite=True)
+        sys.stdout.write('Added %i flight_tracks and %i fltsumm_events (%s) to %s ...\n' % \
+                         (len(fids), n, ', '.join(fids), os.path.basename(sdb.db_file)))
+    sdb.update_manifest([r['manifest'] for r in results if r['manifest']])
+
+
+def update_spatial_db(inpath, overwrite=False, processes=None, batch_size=BATCH_SIZE, index=None):
+    """
+    Updates the spatial database incrementally. The archive is compared
+    with the ingest manifest of the database and only new flights or
+    flights whose core or flight summary file changed are processed. The
+    flights are processed in a process pool; the database is only written
+    from the calling process, in batches.
+
     :param str inpath: inpath that is searched for core-hires data files
-    :param bool overwrite: if true existing flight tracks will be overwritten
+    :param bool overwrite: if true all flights are processed again, ignoring
+      the manifest
+    :param int processes: number of worker processes; by default the number
+      of cpus
+    :param int batch_size: number of flights that are written in one go
+    :param index: Archive_Index that is used to find the files. By default
+      the default index file is opened and closed again
+    :type index: Archive_Index
     """
     # connect to database
     try:
         sdb = FAAM_Spatial_DB(os.path.join(faampy.FAAMPY_DATA_PATH,
                                            'db',
                                            'faam_spatial_db.sqlite'))
-    except:
-        sys.stdout.write('Can not connect to db ...\n')
+    except Exception as e:
+        sys.stdout.write('Can not connect to db: %s ...\n' % e)
         sys.stdout.write('Leaving ...\n')
         return
-    core_file_list = File_List(inpath)
-    core_file_list.filter_by_data_type('core-hires')
-    core_file_list.filter_latest_revision()
-
-    fltsumm_file_list = File_List(inpath)
-    fltsumm_file_list.filter_by_data_type('flight-sum')
-    fltsumm_file_list.filter_latest_revision()
+    # the archive is only listed once; both file lists are queried from the
+    # index
+    own_index = index is None
+    if own_index:
+        index = Archive_Index()
+    try:
+        index.update(inpath)
+        core_file_list = index.get_file_list(data_type='core-hires',
+                                             latest_revision=True,
+                                             path_list=inpath)
+        fltsumm_file_list = index.get_file_list(data_type='flight-sum',
+                                                latest_revision=True,
+                                                path_list=inpath)
+    finally:
+        if own_index:
+            index.close()
 
-    for f in core_file_list:
-        try:
-            # check if the fid exists in the db, otherwise just move on
-            ds = FAAM_Dataset(os.path.join(f.path, f.filename))
-            dt = datetime.datetime.strptime(f.date, '%Y%m%d')
-            sdb.insert_flight_track(f.fid, dt, ds.coords.as_wkt(simplified=True, as_type='LINESTRINGZ'), overwrite=overwrite)
-            sys.stdout.write('Added %s:flight_track to %s ...\n' % \
-                              (f.fid, os.path.basename(sdb.db_file)))
-            for fltsumm_file in fltsumm_file_list:
-                if f.fid == fltsumm_file.fid:
-                    fs = faampy.core.flight_summary.process(os.path.join(fltsumm_file.path,
-                                                                         fltsumm_file.filename),
-                                                            os.path.join(f.path, f.filename))
-        except:
-            sys.stdout.write('Error while processing %s ...\n' % f.filename)
-            continue
+    jobs = _diff_manifest_(core_file_list, fltsumm_file_list, sdb.get_manifest(), overwrite=overwrite)
+    sys.stdout.write('%i of %i flights are new or changed ...\n' % (len(jobs), len(core_file_list)))
+    if not jobs:
+        sdb.close()
+        return
 
-        try:
-            fs.Entries
-        except:
-            continue
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1, min(processes, len(jobs)))
+    if processes > 1:
+        pool = multiprocessing.Pool(processes=processes)
+        results = pool.imap_unordered(_extract_flight_, jobs)
+    else:
+        pool = None
+        results = (_extract_flight_(job) for job in jobs)
 
-        for ent in fs.Entries:
-            # Only consider two-point events
-            if ent.Stop_time:
-                try:
-                    wkt = 'LINESTRINGZ(%s, %s)' % (' '.join([str(e) for e in ent.Coords[0]]),
-                                                   ' '.join([str(e) for e in ent.Coords[-1]]))
-                    sdb.insert_fltsumm_event(f.fid,
-                                             ent.Name,
-                                             time_convert(fs.date, ent.Start_time_48),
-                                             time_convert(fs.date, ent.Stop_time_48),
-                                             wkt,
-                                             overwrite=overwrite)
-                    sys.stdout.write('Added %s:%s to %s ...\n' % \
-                              (f.fid, ent.Name, os.path.basename(sdb.db_file)))
-                except:
-                    sys.stdout.write('Errors adding %s to %s ...\n' % \
-                              (f.fid, os.path.basename(sdb.db_file)))
-
-    sdb.close()
+    batch = []
+    try:
+        for result in results:
+            for msg in result['errors']:
+                sys.stdout.write('%s ...\n' % msg)
+            batch.append(result)
+            if len(batch) >= batch_size:
+                _write_batch_(sdb, batch)
+                batch = []
+        if batch:
+            _write_batch_(sdb, batch)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        sdb.close()
     return
 
 
@@ -113,6 +289,11 @@ def _argparser():
                         action="store_true",
                         default=False,
                         help='whether to overwrite the data or not')
+    parser.add_argument('-p', '--processes',
+                        action="store",
+                        default=None,
+                        type=int,
+                        help='number of processes used for the spatial database update')
     return parser
 
 
@@ -123,8 +304,12 @@ def main():
         sys.stdout.write('Data directory does not exists ...\n')
         sys.stdout.write('Leaving ...\n')
         sys.exit(1)
-    update_fltcons_db(args.inpath)
-    update_spatial_db(args.inpath, overwrite=args.overwrite)
+    index = Archive_Index()
+    try:
+        update_fltcons_db(args.inpath, index=index)
+        update_spatial_db(args.inpath, overwrite=args.overwrite, processes=args.processes, index=index)
+    finally:
+        index.close()
 
 
 if __name__ == '__main__':
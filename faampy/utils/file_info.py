@@ -1,20 +1,141 @@
 import os
 import re
 
-DATA_TYPES = {'core-hires':        'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r\d_[bBcC][0-9][0-9][0-9].nc$',
-              'core-lowres':       'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r\d_[bBcC][0-9][0-9][0-9]_1[Hh]z.nc$',
-              'core-descrip':      'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r\d_[bBcC][0-9][0-9][0-9]_descrip.txt$',
-              'core-quality':      'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r\d_[bBcC][0-9][0-9][0-9]_quality.txt$',
-              'dropsonde-proc':    '.*dropsonde_faam_.*_r.*_[bBcC][0-9][0-9][0-9]_proc.nc$',
-              'dropsonde-raw':     '.*dropsonde_faam_.*_r.*_[bBcC][0-9][0-9][0-9]_raw.nc$',
-              'dropsonde-descrip': '.*dropsonde_faam_.*_r.*_[bBcC][0-9][0-9][0-9]_descrip.txt$',
-              'flight-cst':        'flight-cst_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bBcC][0-9][0-9][0-9].txt$',
-              'flight-log':        'flight-log_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bBcC][0-9][0-9][0-9].pdf$',
-              'flight-sum':        'flight-sum_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bBcC][0-9][0-9][0-9].txt$',
-              'rawdrs':            'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bB][0-9][0-9][0-9]_rawdrs.zip$',
-              'rawgin':            'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bB][0-9][0-9][0-9]_rawgin.zip$',
-              'rawgps':            'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bB][0-9][0-9][0-9]_rawgps.zip$',
-              'rawdlu':            'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bBcC][0-9][0-9][0-9]_rawdlu.zip$'}
+DATA_TYPES = {'core-hires':        r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r\d_[bBcC][0-9][0-9][0-9]\.nc$',
+              'core-lowres':       r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r\d_[bBcC][0-9][0-9][0-9]_1[Hh]z\.nc$',
+              'core-descrip':      r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r\d_[bBcC][0-9][0-9][0-9]_descrip\.txt$',
+              'core-quality':      r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r\d_[bBcC][0-9][0-9][0-9]_quality\.txt$',
+              'dropsonde-proc':    r'.*dropsonde_faam_.*_r.*_[bBcC][0-9][0-9][0-9]_proc\.nc$',
+              'dropsonde-raw':     r'.*dropsonde_faam_.*_r.*_[bBcC][0-9][0-9][0-9]_raw\.nc$',
+              'dropsonde-descrip': r'.*dropsonde_faam_.*_r.*_[bBcC][0-9][0-9][0-9]_descrip\.txt$',
+              'flight-cst':        r'flight-cst_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bBcC][0-9][0-9][0-9]\.txt$',
+              'flight-log':        r'flight-log_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bBcC][0-9][0-9][0-9]\.pdf$',
+              'flight-sum':        r'flight-sum_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bBcC][0-9][0-9][0-9]\.txt$',
+              'rawdrs':            r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bB][0-9][0-9][0-9]_rawdrs\.zip$',
+              'rawgin':            r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bB][0-9][0-9][0-9]_rawgin\.zip$',
+              'rawgps':            r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bB][0-9][0-9][0-9]_rawgps\.zip$',
+              'rawdlu':            r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r\d_[bBcC][0-9][0-9][0-9]_rawdlu\.zip$'}
+
+# Instrument for the data types; data types that are not listed are their
+# own instrument
+DATA_TYPE_INSTRUMENTS = {'core-hires':     'CORE',
+                         'core-lowres':    'CORE',
+                         'dropsonde-proc': 'AVAPS',
+                         'dropsonde-raw':  'AVAPS'}
+
+# Instrument identifier and regular expressions that identify the data files
+# of an instrument. Filenames are matched case insensitive.
+INSTRUMENT_TYPES = [('AIMMS',             [r'metoffice-aimms_faam_\d{8}.*[bc]\d{3}.*\.nc']),
+                    ('AQDNOX',            [r'faam-aqd-nox_faam_\d{8}.*[bc]\d{3}.*\.(?:na|txt)']),
+                    ('ARIES',             [r'metoffice-aries_faam_\d{8}.*[bc]\d{3}.*(?:insb|mct)\.nc']),
+                    ('AVAPS',             [r'faam-dropsonde_faam_\d{14}.*[bc]\d{3}.*(?:proc|raw)\.nc']),
+                    ('BUCK',              [r'faam-cr2-hygro_faam_\d{8}.*[bc]\d{3}.*\.na']),
+                    ('CCN',               [r'faam-ccnrack_faam_\d{8}.*[bc]\d{3}\.na',
+                                           r'faam-ccnrack_faam_\d{8}.*_v\d{3}_[bc]\d{3}\.nc']),
+                    ('CFGC',              [r'rhul-cf-gc-irms_faam_\d{8}.*[bc]\d{3}.*csv']),
+                    ('CIMS',              [r'man-cims_faam_\d{8}.*[bc]\d{3}\.na']),
+                    ('CIP100',            [r'faam-cip100_faam_\d{8}.*']),
+                    ('CIP15',             [r'faam-cip15_faam_\d{8}.*']),
+                    ('CORE',              [r'core_faam_\d{8}.*[bc]\d{3}\.nc',
+                                           r'core_faam_\d{8}.*[bc]\d{3}_1hz\.nc']),
+                    ('CORE-CLOUD',        [r'core-cloud-phy_faam_\d{8}.*[bc]\d{3}\.nc']),
+                    ('CPC',               [r'faam-3786cpc_faam_\d{8}.*[bc]\d{3}\.na']),
+                    ('CVI',               [r'metoffice-cvi_faam_\d{8}.*']),
+                    ('DCGC',              [r'york-dc-gc-fid[123]_faam_\d{8}.*[bc]\d{3}.*']),
+                    ('DEIMOS',            [r'metoffice-deimos_faam_\d{8}.*[bc]\d{3}\.nc']),
+                    ('FAGE',              [r'leeds-fage_faam_\d{8}.*na']),
+                    ('FGGA',              [r'faam-fgga_faam_\d{8}.*[bc]\d{3}\.na']),
+                    ('GCMS',              [r'york-in-situ-gcms_faam_\d{8}.*[bc]\d{3}\.na',
+                                           r'york-gcms_faam_\d{8}.*[bc]\d{3}\.na',
+                                           r'fgam-gcms_faam_\d{8}.*[bd]\d{3}\.na']),
+                    ('GRIMM',             [r'faam-grimm_faam_\d{8}.*[bc]\d{3}.*\.na']),
+                    ('JNO2',              [r'leic-fr-jno2_faam_\d{8}.*\.na']),
+                    ('JO1D',              [r'leic-fr-jo1d_faam_\d{8}.*\.na']),
+                    ('LIDAR',             [r'metoffice-lidar_faam_\d{8}.*[bc]\d{3}.*\.nc',
+                                           r'metoffice-lidar-als450_faam_\d{8}.*[bc]\d{3}.*\.nc']),
+                    ('LIF',               [r'laquila-lif-(?:no2|noy).*faam_\d{8}.*[bc]\d{3}\.na']),
+                    ('MAN-CAS',           [r'man-cas_faam_\d{8}.*[bc]\d{3}.*nc']),
+                    ('MAN-CPI',           [r'man-cpi_faam_\d{8}.*[bc]\d{3}.*\.(?:nc|png)']),
+                    ('MAN-AMS',           [r'man-ams_faam_\d{8}.*[bc]\d{3}\.na']),
+                    ('MAN-2DS',           [r'man-2ds_faam_\d{8}.*[bc]\d{3}.*nc']),
+                    ('MAN-SMPS',          [r'man-smps_faam_\d{8}.*(?:nc|na)']),
+                    ('MAN-SP2',           [r'man-sp2_faam_\d{8}.*[bc]\d{3}\.na']),
+                    ('MARSS',             [r'metoffice-marss_faam_\d{8}.*[bc]\d{3}\.nc']),
+                    ('PAN',               [r'york-pan-gc_faam_\d{8}.*[bc]\d{3}\.(?:na|ict)',
+                                           r'leeds-pan-gc_faam_\d{8}.*[bc]\d{3}\.(?:na|ict)']),
+                    ('PERCA',             [r'leic-perca_faam_\d{8}.*[bc]\d{3}\.(?:na|ict)']),
+                    ('QCL',               [r'man-qcl_faam_\d{8}.*[bc]\d{3}\.na']),
+                    ('SHIMS',             [r'metoffice-[lu]sh_faam_\d{8}.*[bc]\d{3}\.nc']),
+                    ('SWS',               [r'metoffice-sws_faam_\d{8}.*[bc]\d{3}\.nc']),
+                    ('UEA-GCMS',          [r'uea-gc-ms_faam_\d{8}.*[bc]\d{3}\.(?:na|ict)']),
+                    ('UEA-NICI',          [r'uea-gc-nici-ms_faam_\d{8}.*[bc]\d{3}.*(?:halocarbons|nitrates)\.na']),
+                    ('UEA-NOXY',          [r'uea-noxy_faam_\d{8}.*(?:na|ict)']),
+                    ('UEA-PEROX',         [r'uea-peroxides_faam_\d{8}.*[bc]\d{3}.*(?:na|ict)']),
+                    ('UEA-PTRMS',         [r'uea-ptrms_faam_\d{8}.*[bc]\d{3}.*(?:na|ict)']),
+                    ('UEA-HCHO',          [r'uea-hcho_faam_\d{8}.*[bc]\d{3}.*\.(?:na|ict)']),
+                    ('VACC',              [r'leeds-vacc_faam_\d{8}.*\.nc']),
+                    ('VIDEO',             [r'faam-video-.*_faam_\d{8}.*[bc]\d{3}.*\.avi']),
+                    ('WAS',               [r'york-gcms_faam_\d{8}.*[bcd]\d{3}_was-bottles\.na']),
+                    ('WETNEPH',           [r'metoffice-wetneph_faam_\d{8}.*[bc]\d{3}.*\.(?:nc|zip)']),
+                    ('core-descrip',      [r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r.*_[bc][0-9][0-9][0-9]_descrip\.txt']),
+                    ('core-quality',      [r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r.*_[bc][0-9][0-9][0-9]_quality\.txt']),
+                    ('dropsonde-descrip', [r'.*dropsonde_faam_.*_r.*_[bc][0-9][0-9][0-9]_descrip\.txt']),
+                    ('flight-cst',        [r'flight-cst_faam_20[0-9][0-9][0-1][0-9][0-3][0-9]_r.*_[bc][0-9][0-9][0-9]\.txt']),
+                    ('flight-log',        [r'flight-log_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r.*_[bc][0-9][0-9][0-9]\.pdf']),
+                    ('flight-sum',        [r'flight-sum_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r.*_[bc][0-9][0-9][0-9]\.txt']),
+                    ('rawbuck',           [r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r.*_[b][0-9][0-9][0-9]_rawbuck\.zip']),
+                    ('rawdrs',            [r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r.*_[b][0-9][0-9][0-9]_rawdrs\.zip']),
+                    ('rawgin',            [r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r.*_[b][0-9][0-9][0-9]_rawgin\.zip']),
+                    ('rawgps',            [r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r.*_[b][0-9][0-9][0-9]_rawgps\.zip']),
+                    ('rawdlu',            [r'core_faam_20[0-9][0-9][0-1][0-9][0-3][0-9].*_r.*_[bc][0-9][0-9][0-9]_rawdlu\.zip'])]
+
+
+def _build_classifier_():
+    """
+    Combines the DATA_TYPES and INSTRUMENT_TYPES patterns into one compiled
+    regular expression. Every pattern becomes a named alternative, so that
+    a single match returns both the data type and the instrument. The data
+    types come first, because they are more specific.
+    """
+    patterns, labels = [], {}
+    for data_type in sorted(DATA_TYPES.keys()):
+        labels['g%i' % len(patterns)] = (data_type, DATA_TYPE_INSTRUMENTS.get(data_type, data_type))
+        patterns.append(DATA_TYPES[data_type])
+    for instrument, instr_patterns in INSTRUMENT_TYPES:
+        for p in instr_patterns:
+            labels['g%i' % len(patterns)] = (None, instrument)
+            patterns.append(p)
+    regex = '|'.join(['(?P<g%i>%s)' % (i, p) for i, p in enumerate(patterns)])
+    return re.compile(regex, re.IGNORECASE), labels
+
+
+_CLASSIFIER, _CLASSIFIER_LABELS = _build_classifier_()
+
+_REV_REGEX = re.compile(r'r(\d+)')
+_FID_REGEX = re.compile(r'[bBcC][0-9][0-9][0-9]')
+_DATE_REGEX = re.compile(r'20\d{6}')
+
+
+def classify_filename(filename):
+    """
+    Assigns a data type and an instrument to a filename in a single pass
+
+    :param str filename: filename
+    :return: tuple (data_type, instrument); both are None if the filename
+      is unknown and data_type is None for instrument data files
+    :rtype: tuple
+
+    :Example:
+
+      >>> classify_filename('core_faam_20090529_v004_r1_b450.nc')
+      ('core-hires', 'CORE')
+      >>> classify_filename('faam-fgga_faam_20150806_r0_b919.na')
+      (None, 'FGGA')
+    """
+    m = _CLASSIFIER.match(os.path.basename(filename))
+    if not m:
+        return (None, None)
+    return _CLASSIFIER_LABELS[m.lastgroup]
 
 
 def get_revision_from_filename(filename):
@@ -34,8 +155,9 @@ def get_revision_from_filename(filename):
     fn = fn.split('.')[0]
     parts = fn.split('_')
     for p in parts:
-        if re.match('r\d', p):
-            result = int(p[1:])
+        m = _REV_REGEX.match(p)
+        if m:
+            result = int(m.group(1))
             if result < 90:
                 return result
     return
@@ -47,10 +169,7 @@ def get_data_type_from_filename(filename):
     dictionary
     """
 
-    for key in DATA_TYPES.keys():
-        if re.match(DATA_TYPES[key], os.path.basename(filename)):
-            return key
-    return
+    return classify_filename(filename)[0]
 
 
 def get_fid_from_filename(filename):
@@ -71,7 +190,7 @@ def get_fid_from_filename(filename):
     fn = fn.split('.')[0]
     parts = fn.split('_')
     for p in parts:
-        if re.match('[bBcC][0-9][0-9][0-9]', p):
+        if _FID_REGEX.match(p):
             return p.lower()
     return
 
@@ -94,12 +213,8 @@ def get_date_from_filename(filename):
     fn = fn.split('.')[0]
     parts = fn.split('_')
     for p in parts:
-        if re.match('20\d{6}', p):
-            return p
-        elif re.match('20\d{12}', p):
+        if _DATE_REGEX.match(p):
             return p
-        else:
-            pass
     return
 
 
@@ -125,6 +240,21 @@ class File_Info(object):
         self.rev = get_revision_from_filename(filename)
         self.data_type = get_data_type_from_filename(filename)
 
+    @classmethod
+    def from_record(cls, path, filename, data_type, fid, date, rev):
+        """
+        Creates a File_Info object from values that are already known (e.g.
+        from the archive index) without parsing the filename again.
+        """
+        result = cls.__new__(cls)
+        result.filename = filename
+        result.path = path
+        result.fid = fid
+        result.date = date
+        result.rev = rev
+        result.data_type = data_type
+        return result
+
     def __str__(self):
         output = '\n'
         labels = ['Filename', 'Path', 'FID', 'Date', 'Revision', 'Data Type']
@@ -1,7 +1,7 @@
 import os
 import sys
 import faampy
-import file_info
+from faampy.utils import file_info
 
 
 class File_List(list):
@@ -14,7 +14,7 @@ class File_List(list):
     reprocess them.
     """
 
-    def __init__(self, *args):
+    def __init__(self, *args, **kwargs):
         """
         Get all FAAM data files in the path. The path argument can either be
         *one* existing path or a list of paths.
@@ -22,8 +22,15 @@ class File_List(list):
         If no path is supplied the directories that are defined in the
         .faampy_config file are searched.
 
+        By default the path is crawled. Optionally the files are looked up
+        in the persistent archive index (see faampy.utils.archive_index),
+        which only lists directories that changed since the last call.
+
         :param str path: path which will be walked and checked for
           FAAM data files
+        :param index: Archive_Index that is used; it is updated but not
+          closed. If True the default index file is opened and closed again
+        :type index: Archive_Index or boolean
 
         :Example:
 
@@ -37,24 +44,31 @@ class File_List(list):
         """
         if args:
             path_list = args[0]
-            if not hasattr(path_list, "__iter__"):
+            if not hasattr(path_list, "__iter__") or isinstance(path_list, str):
                 path_list = [path_list, ]
         else:
             path_list = faampy.DATA_SEARCH_PATH_LIST
 
         self.Path_List = path_list[:]
-        for path in self.Path_List:
-            if os.path.isdir(path):
-                for root, subFolders, files in os.walk(path):
-                    for f in files:
-                        if file_info.get_data_type_from_filename(f):
-                            finfo = file_info.File_Info(os.path.join(root, f))
-                            if int(finfo.rev) < 90:
-                                self.append(finfo)
-            else:
-                sys.stdout.write('%s: does not exist.\n' % path)
+        index = kwargs.get('index', False)
+        if index is True:
+            from faampy.utils.archive_index import Archive_Index
+            index = Archive_Index()
+            try:
+                self._from_index_(index)
+            finally:
+                index.close()
+        elif index:
+            self._from_index_(index)
+        else:
+            from faampy.utils.archive_crawler import crawl, to_file_list
+            self.extend(to_file_list(crawl(self.Path_List)))
         self.sort()
 
+    def _from_index_(self, index):
+        index.update(self.Path_List)
+        self.extend(index.get_file_list(path_list=[p for p in self.Path_List if os.path.isdir(p)]))
+
     def filter_by_data_type(self, dtype):
         """
         Filtering by data type.
@@ -62,26 +76,21 @@ class File_List(list):
         if dtype not in file_info.DATA_TYPES:
             sys.stdout.write('Submitted dtype unknown.\nValid data types are: %s\n' % ', '.join(sorted(file_info.DATA_TYPES.keys())))
 
-        bad_index = []
-        for i in self:
-            if not i.data_type == dtype:
-                bad_index.append(i)
-        for b in bad_index:
-            self.remove(b)
+        self[:] = [i for i in self if i.data_type == dtype]
 
     def filter_latest_revision(self):
         """
         Compresses the list and keeps only the latest revision for a FID.
         """
-        bad_index = []
         self.sort(key=lambda i: '%4s_%s_%s_%0.3i' % (i.fid, i.date,
                                                      i.data_type, i.rev))
         self.reverse()
-        for i in range(len(self)-1):
-            if ((self[i].fid, self[i].date, self[i].data_type)) == ((self[i+1].fid, self[i+1].date, self[i+1].data_type)):
-                bad_index.append(self[i+1])
-        for b in bad_index:
-            self.remove(b)
+        latest, seen = [], set()
+        for i in self:
+            if (i.fid, i.date, i.data_type) not in seen:
+                seen.add((i.fid, i.date, i.data_type))
+                latest.append(i)
+        self[:] = latest
         self.sort()
 
     def __str__(self):
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""
+Shared fixtures: small synthetic FAAM core files.
+
+The files follow the layout of the FAAM core netCDF (Time plus 1 Hz and
+32 Hz variables with _FLAG companions), but are only a few minutes long so
+that the tests run quickly.
+"""
+
+import numpy as np
+import pytest
+
+
+def make_core(filename, n=600, fid='b991', date='2016-11-30', t0=36000):
+    """
+    Writes a synthetic core file
+
+    :param str filename: output file
+    :param int n: number of seconds
+    :param str fid: flight id
+    :param str date: flight date (YYYY-mm-dd)
+    :param int t0: first time stamp in seconds past midnight
+    """
+    netCDF4 = pytest.importorskip('netCDF4')
+    ds = netCDF4.Dataset(filename, 'w')
+    ds.title = 'Data from %s on %s' % (fid, date)
+    ds.FLIGHT = fid
+    ds.createDimension('Time', None)
+    ds.createDimension('sps01', 1)
+    ds.createDimension('sps32', 32)
+    t = ds.createVariable('Time', 'i4', ('Time',))
+    t.units = 'seconds since %s 00:00:00 +0000' % date
+    t[:] = np.arange(t0, t0+n)
+    rng = np.random.RandomState(0)
+    ph = np.linspace(0, 4*np.pi, n*32).reshape(n, 32)
+
+    def add(name, data, sps='sps32'):
+        v = ds.createVariable(name, 'f4', ('Time', sps), fill_value=-9999.)
+        v.units = '1'
+        v.long_name = name
+        v.frequency = 32 if sps == 'sps32' else 1
+        v[:] = data
+        f = ds.createVariable(name+'_FLAG', 'i1', ('Time', sps), fill_value=-1)
+        flag = np.zeros(data.shape, dtype='i1')
+        flag[::97] = 2
+        f[:] = flag
+
+    ias = np.full((n, 32), 150.)
+    ias[:30] = 20
+    ias[-30:] = 20
+    add('IAS_RVSM', ias)
+    add('LON_GIN', -3 + np.sin(ph))
+    add('LAT_GIN', 52 + np.cos(ph))
+    add('ALT_GIN', 1000 + 500*np.sin(ph/3))
+    add('ROLL_GIN', np.where(np.sin(ph) > 0.9, 25., 0.) + rng.randn(n, 32)*0.1)
+    add('PS_RVSM', 900 + np.sin(ph/7)*5)
+    add('TAT_DI_R', 280 + rng.randn(n, 32))
+    add('CO_AERO', 100 + rng.randn(n, 1), sps='sps01')
+    add('O3_TECO', 30 + rng.randn(n, 1), sps='sps01')
+    ds.close()
+    return filename
+
+
+@pytest.fixture(scope='session')
+def core_file(tmp_path_factory):
+    path = tmp_path_factory.mktemp('core')
+    return make_core(str(path.joinpath('core_faam_20161130_v004_r0_b991.nc')))
+
+
+@pytest.fixture
+def faam_dataset(core_file):
+    pytest.importorskip('osgeo.ogr')
+    from faampy.core.faam_data import FAAM_Dataset
+    ds = FAAM_Dataset(core_file)
+    yield ds
+    ds.close()
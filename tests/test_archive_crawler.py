@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from faampy.utils import archive_crawler
+from faampy.utils.archive_crawler import availability, crawl, list_directory, to_file_list
+
+
+FILES = ['2016/b991/core_faam_20161130_v004_r0_b991.nc',
+         '2016/b991/core_faam_20161130_v004_r0_b991_1hz.nc',
+         '2016/b991/core_raw/flight-sum_faam_20161130_r0_b991.txt',
+         '2016/b991/.ftpaccess',
+         '2017/c001/core_faam_20170101_v004_r0_c001.nc',
+         '2017/c001/core_faam_20170101_v004_r95_c001.nc',
+         '2017/c001/readme.txt']
+
+
+@pytest.fixture
+def archive(tmp_path):
+    root = tmp_path.joinpath('archive')
+    for f in FILES:
+        p = root.joinpath(f)
+        if not p.parent.exists():
+            p.parent.mkdir(parents=True)
+        p.write_text(u'')
+    return str(root)
+
+
+def test_list_directory(archive):
+    files, subdirs = list_directory(os.path.join(archive, '2016', 'b991'))
+    assert subdirs == [os.path.join(archive, '2016', 'b991', 'core_raw')]
+    assert sorted(files) == [('core_faam_20161130_v004_r0_b991.nc', 'core-hires', 'CORE'),
+                             ('core_faam_20161130_v004_r0_b991_1hz.nc', 'core-lowres', 'CORE')]
+    with pytest.raises(OSError):
+        list_directory(os.path.join(archive, 'missing'))
+
+
+@pytest.mark.parametrize('threads', [1, 4])
+def test_crawl(archive, threads):
+    records = crawl([archive, os.path.join(archive, 'missing')], threads=threads)
+    assert len(records) == 6
+    assert (os.path.join(archive, '2017', 'c001'), 'readme.txt', None, None) in records
+    fl = to_file_list(records)
+    # unknown files and revisions >= 90 are dropped
+    assert [(f.fid, f.data_type) for f in fl] == [('b991', 'core-hires'), ('b991', 'core-lowres'),
+                                                  ('b991', 'flight-sum'), ('c001', 'core-hires')]
+
+
+def test_crawl_unreadable_directory(archive, monkeypatch, capsys):
+    failing = os.path.join(archive, '2017')
+
+    def _list_(path, *args):
+        if path == failing:
+            raise OSError('Permission denied')
+        return list_directory(path, *args)
+    monkeypatch.setattr(archive_crawler, 'list_directory', _list_)
+    records = crawl(archive)
+    assert set([r[3] for r in records]) == set(['CORE', 'flight-sum'])
+    assert not [r for r in records if r[0].startswith(failing)]
+    assert 'can not be listed' in capsys.readouterr().out
+
+
+def test_availability(archive):
+    report = availability(crawl(archive))
+    assert report['CORE'] == ('c001', '2017-01-01')
+    assert report['flight-sum'] == ('b991', '2016-11-30')
+    assert report['AIMMS'] is None
+    assert report[None] == ['readme.txt']
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+
+import pytest
+
+from faampy.utils import archive_index
+from faampy.utils.archive_index import Archive_Index
+
+
+FILES = ['2016/b991/core_faam_20161130_v004_r0_b991.nc',
+         '2016/b991/core_faam_20161130_v004_r1_b991.nc',
+         '2016/b991/core_raw/flight-sum_faam_20161130_r0_b991.txt',
+         '2017/c001/core_faam_20170101_v004_r0_c001.nc',
+         '2017/c001/core_faam_20170101_v004_r95_c001.nc',
+         '2017/c001/readme.txt']
+
+
+@pytest.fixture
+def archive(tmp_path):
+    root = tmp_path.joinpath('archive')
+    for f in FILES:
+        p = root.joinpath(f)
+        if not p.parent.exists():
+            p.parent.mkdir(parents=True)
+        p.write_text(u'')
+    return str(root)
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = Archive_Index(str(tmp_path.joinpath('db', 'index.sqlite')))
+    yield idx
+    idx.close()
+
+
+def _touch_dir_(path):
+    # make sure that the directory mtime changes
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime+10))
+
+
+def test_update_and_query(archive, index):
+    assert index.update(archive) == 6
+    assert index.update(archive) == 0
+    filenames = [r[1] for r in index.query(data_type='core-hires')]
+    # revision 95 and unknown files are not indexed
+    assert filenames == ['core_faam_20161130_v004_r0_b991.nc',
+                         'core_faam_20161130_v004_r1_b991.nc',
+                         'core_faam_20170101_v004_r0_c001.nc']
+    latest = index.query(data_type='core-hires', fid='B991', latest_revision=True)
+    assert [r[5] for r in latest] == [1]
+    assert [r[3] for r in index.query(start='20170101')] == ['c001']
+    assert [r[3] for r in index.query(end='20161231', data_type='flight-sum')] == ['b991']
+    assert index.query(path_list=os.path.join(archive, '2017')) == index.query(fid='c001')
+
+
+def test_only_changed_directories_are_listed(archive, index):
+    index.update(archive)
+    path = os.path.join(archive, '2016', 'b991')
+    open(os.path.join(path, 'core_faam_20161130_v004_r2_b991.nc'), 'w').close()
+    _touch_dir_(path)
+    assert index.update(archive) == 1
+    fl = index.get_file_list(data_type='core-hires', fid='b991', latest_revision=True)
+    assert [f.rev for f in fl] == [2]
+
+
+def test_removed_directory(archive, index):
+    index.update(archive)
+    path = os.path.join(archive, '2017', 'c001')
+    for f in os.listdir(path):
+        os.remove(os.path.join(path, f))
+    os.rmdir(path)
+    index.update(archive)
+    assert index.query(fid='c001') == []
+
+
+def test_failed_listing_keeps_entries(archive, index, monkeypatch):
+    index.update(archive)
+    before = index.query()
+    path = os.path.join(archive, '2016')
+    _touch_dir_(path)
+
+    def failing(p, *args):
+        raise OSError('Stale file handle')
+    monkeypatch.setattr(archive_index, 'list_directory', failing)
+    index.update(archive)
+    monkeypatch.undo()
+    assert index.query() == before
+    # the directory is listed again on the next update
+    assert index.update(archive) >= 1
+    assert index.query() == before
+
+
+def test_file_list_with_index(archive, tmp_path):
+    from faampy.utils.file_list import File_List
+    idx = Archive_Index(str(tmp_path.joinpath('fl.sqlite')))
+    fl = File_List(archive, index=idx)
+    # the index belongs to the caller and is still open
+    assert idx.update(archive) == 0
+    idx.close()
+    assert len(fl) == 4
+    crawled = File_List(archive)
+    assert sorted(crawled.get_filenames()) == sorted(fl.get_filenames())
+    fl.filter_by_data_type('core-hires')
+    fl.filter_latest_revision()
+    assert sorted([(f.fid, f.rev) for f in fl]) == [('b991', 1), ('c001', 0)]
+
+
+def test_file_list_default_index(archive, tmp_path, monkeypatch):
+    from faampy.utils.file_list import File_List
+    opened = []
+
+    class _Index_(Archive_Index):
+        def __init__(self):
+            Archive_Index.__init__(self, str(tmp_path.joinpath('default.sqlite')))
+            opened.append(self)
+
+        def close(self):
+            Archive_Index.close(self)
+            opened.remove(self)
+    monkeypatch.setattr(archive_index, 'Archive_Index', _Index_)
+    # no index is created unless it is asked for
+    File_List(archive)
+    assert not tmp_path.joinpath('default.sqlite').exists()
+    fl = File_List(archive, index=True)
+    assert len(fl) == 4
+    assert opened == []
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pytest
+
+from faampy.core.cache import Derived_Cache
+
+
+def _file_(tmp_path, name, content):
+    filename = str(tmp_path.joinpath(name))
+    with open(filename, 'wb') as f:
+        f.write(content)
+    return filename
+
+
+def test_put_get(tmp_path):
+    cache = Derived_Cache(str(tmp_path.joinpath('cache')))
+    key = cache.get_key(_file_(tmp_path, 'core.nc', b'abc'))
+    assert cache.get(key, 'WOW_IND') is None
+    data = np.arange(100, dtype=np.float64)
+    cache.put(key, 'WOW_IND', data)
+    assert cache.has(key, 'WOW_IND')
+    assert not cache.has(key, 'WOW_IND', 'INDEX')
+    result = cache.get(key, 'WOW_IND')
+    assert isinstance(result, np.memmap)
+    np.testing.assert_array_equal(result, data)
+
+
+def test_put_temporary_file(tmp_path, monkeypatch):
+    cache = Derived_Cache(str(tmp_path.joinpath('cache')))
+    key = cache.get_key(_file_(tmp_path, 'core.nc', b'abc'))
+    # a temporary file of another process must not be touched
+    os.makedirs(os.path.join(cache.path, key))
+    other = os.path.join(cache.path, key, 'WOW_IND.npy.tmp.npy')
+    with open(other, 'wb') as f:
+        f.write(b'partial')
+    cache.put(key, 'WOW_IND', np.zeros(10))
+    assert sorted(os.listdir(os.path.join(cache.path, key))) == ['WOW_IND.npy', 'WOW_IND.npy.tmp.npy']
+    # the temporary file is removed if the array can not be written
+    def fail(*args, **kwargs):
+        raise IOError('disk full')
+    monkeypatch.setattr(np, 'save', fail)
+    with pytest.raises(IOError):
+        cache.put(key, 'INDEX', np.zeros(10))
+    assert sorted(os.listdir(os.path.join(cache.path, key))) == ['WOW_IND.npy', 'WOW_IND.npy.tmp.npy']
+
+
+def test_key_changes_with_content(tmp_path):
+    cache = Derived_Cache(str(tmp_path.joinpath('cache')))
+    filename = _file_(tmp_path, 'core.nc', b'abc')
+    key = cache.get_key(filename)
+    assert cache.get_key(filename) == key
+    _file_(tmp_path, 'core.nc', b'abd')
+    assert cache.get_key(filename) != key
+
+
+def test_eviction(tmp_path):
+    data = np.zeros(1000, dtype=np.float64)
+    cache = Derived_Cache(str(tmp_path.joinpath('cache')), max_size=2.5*data.nbytes)
+    cache.put('a', 'X', data)
+    cache.put('b', 'X', data)
+    # makes 'a' the most recently used entry
+    os.utime(os.path.join(cache.path, 'b'), (0, 0))
+    cache.put('a', 'X', data)
+    assert cache.has('a', 'X') and cache.has('b', 'X')
+    cache.put('c', 'X', data)
+    assert not cache.has('b', 'X')
+    assert cache.has('a', 'X') and cache.has('c', 'X')
+    assert cache.get_size() <= cache.max_size
+
+
+def test_no_scan_below_limit(tmp_path, monkeypatch):
+    cache = Derived_Cache(str(tmp_path.joinpath('cache')))
+    cache.put('a', 'X', np.zeros(10))
+
+    def scan(*args):
+        raise AssertionError('the cache directory was scanned')
+    monkeypatch.setattr(cache, 'evict', scan)
+    monkeypatch.setattr(cache, 'get_size', scan)
+    for name in 'YZ':
+        cache.put('b', name, np.zeros(10))
+    monkeypatch.undo()
+    assert cache._size == cache.get_size()
+    cache.clean()
+    assert cache.get_size() == 0
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from faampy.core.calclib import segment_flight, dp2vp, vp2vmr
+
+
+class _Core(object):
+    """Minimal stand-in for a core dataset (only the variables attribute)"""
+
+    def __init__(self, **variables):
+        self.variables = variables
+
+
+def _core_(n=600):
+    roll = np.zeros((n, 32))
+    roll[300:320] = 25.
+    p9_stat = np.full((n, 32), 800.)
+    return roll, p9_stat
+
+
+def test_segment_flight():
+    roll, p9_stat = _core_()
+    segments = segment_flight(_Core(ROLL_GIN=roll, P9_STAT=p9_stat))
+    assert segments['turn'] == [(300, 320)]
+    assert segments['slr'] == [(0, 300), (320, 600)]
+
+
+def test_segment_flight_missing_roll():
+    roll, p9_stat = _core_()
+    # missing roll values are not turns
+    roll[100:150] = -9999.
+    segments = segment_flight(_Core(ROLL_GIN=roll, P9_STAT=p9_stat))
+    assert segments['turn'] == [(300, 320)]
+    assert all(e <= 100 or s >= 150 for s, e in segments['slr'])
+
+
+def test_segment_flight_without_pressure():
+    roll, p9_stat = _core_()
+    segments = segment_flight(_Core(ROLL_GIN=roll))
+    assert segments['turn'] == [(300, 320)]
+    assert segments['profile'] == []
+    segments = segment_flight(_Core(ROLL_GIN=roll, PS_RVSM=p9_stat))
+    assert segments['slr'] == [(0, 300), (320, 600)]
+
+
+def test_noturb_flag():
+    from faampy.core.add_noturb_winds_to_core import calc_noturb_flag
+    n = 60
+    roll = np.zeros((n, 32))
+    roll[10:12] = 5.
+    roll[20, 5] = -3.
+    roll[30:33] = -9999.
+    roll[40] = np.nan
+    flags = dict((name+'_FLAG', np.zeros((n, 32), dtype=np.int8))
+                 for name in ('TAS_RVSM', 'HDG_GIN', 'VELN_GIN', 'VELE_GIN', 'TAT_DI_R'))
+    flag = calc_noturb_flag(_Core(ROLL_GIN=roll, **flags))
+    assert flag.shape == (n,)
+    assert np.where(flag == 3)[0].tolist() == [10, 11, 20, 30, 31, 32, 40]
+    assert np.all(flag[flag != 3] == 0)
+
+
+def test_dp2vp():
+    # saturation vapour pressure over water at 0 and 20 degC
+    np.testing.assert_allclose(dp2vp(np.array([273.15, 293.15])), [6.112, 23.39], rtol=2e-3)
+    vp = dp2vp(273.15, p=np.array([1000.]), enhance=True)
+    assert 6.112 < vp[0] < 6.2
+    np.testing.assert_allclose(vp2vmr(10., 1010.), 0.01)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from faampy.core import derived
+from faampy.core.derived import available, clear, get_derived, register
+
+
+class _Core(object):
+
+    def __init__(self, **variables):
+        self.variables = variables
+
+
+@pytest.fixture
+def ds():
+    n = 5
+    ps_rvsm = np.linspace(1000., 500., n*32).reshape((n, 32))
+    tdew_ge = np.full((n, 4), 270.)
+    tdew_ge[1] = -9999.
+    return _Core(PS_RVSM=ps_rvsm,
+                 PS_RVSM_FLAG=np.zeros((n, 32), dtype='i1'),
+                 TDEW_GE=tdew_ge,
+                 ALT_GIN=np.full(n, 100.))
+
+
+@pytest.fixture
+def registry():
+    # test entries are removed from the registry again
+    keys = set(derived.REGISTRY.keys())
+    yield derived.REGISTRY
+    for k in set(derived.REGISTRY.keys()).difference(keys):
+        del derived.REGISTRY[k]
+
+
+def test_flight_level(ds):
+    fl = get_derived(ds, 'FLIGHT_LEVEL')
+    assert fl.shape == (5, 32)
+    assert fl[0, 0] == 3
+    # the result is memoised
+    assert get_derived(ds, 'FLIGHT_LEVEL') is fl
+    clear(ds)
+    assert get_derived(ds, 'FLIGHT_LEVEL') is not fl
+
+
+def test_vmr_from_different_rates(ds):
+    vmr = get_derived(ds, 'VMR_GE')
+    # the first sample of every second is used
+    assert vmr.shape == (5, )
+    vp = derived.dp2vp(270.)[0]
+    np.testing.assert_allclose(vmr[0], vp/(1000.-vp)*1E6)
+    # missing dew point values are NaN
+    assert np.isnan(vmr[1])
+
+
+def test_available(ds):
+    names = available(ds)
+    assert 'VMR_GE' in names and 'QNH' in names
+    assert 'U_BULK' not in names
+    with pytest.raises(KeyError):
+        get_derived(ds, 'U_NOTURB')
+    with pytest.raises(KeyError):
+        get_derived(ds, 'NOT_A_VARIABLE')
+
+
+def test_register_with_options(ds, registry):
+    @register('ALT_SCALED', ['ALT_GIN'], options={'scale': 1.0}, units='m')
+    def _scale_(alt_gin, scale=1.0):
+        return alt_gin*scale
+
+    @register(['ALT_PLUS', 'ALT_MINUS'], ['ALT_SCALED'])
+    def _plus_minus_(alt):
+        return (alt+1, alt-1)
+
+    assert registry['ALT_SCALED'].units == 'm'
+    np.testing.assert_allclose(get_derived(ds, 'ALT_SCALED'), 100.)
+    np.testing.assert_allclose(get_derived(ds, 'ALT_PLUS', scale=2.0), 201.)
+    np.testing.assert_allclose(get_derived(ds, 'ALT_MINUS', scale=2.0), 199.)
+    # the options are part of the memo key
+    np.testing.assert_allclose(get_derived(ds, 'ALT_PLUS'), 101.)
+
+
+def test_circular_dependency(ds, registry):
+    register('LOOP_A', ['LOOP_B'])(lambda b: b)
+    register('LOOP_B', ['LOOP_A'])(lambda a: a)
+    assert 'LOOP_A' not in available(ds)
+    with pytest.raises(ValueError):
+        get_derived(ds, 'LOOP_A')
+
+
+def test_faam_dataset_item_access(faam_dataset):
+    fl = faam_dataset['FLIGHT_LEVEL']
+    assert fl.shape == faam_dataset.variables['PS_RVSM'].shape
+    assert np.nanmax(fl) < 50
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _frame_(secs, **columns):
+    index = pd.DatetimeIndex(np.datetime64('2016-11-30T00:00:00')+np.asarray(secs).astype('timedelta64[s]'))
+    return pd.DataFrame(columns, index=index)
+
+
+@pytest.mark.parametrize('method', ['nearest', 'mean'])
+def test_merge(faam_dataset, method):
+    t0 = int(faam_dataset.variables['Time'][0])
+    df = _frame_([t0+1, t0+2, t0+5], CH4=[1.9, 2.0, 2.1])
+    faam_dataset.merge(df, method=method)
+    ch4 = faam_dataset.variables['CH4']
+    assert ch4.shape == (faam_dataset.variables['Time'].size, )
+    np.testing.assert_allclose(ch4[[1, 2, 5]], [1.9, 2.0, 2.1])
+    assert np.isnan(ch4[[0, 3, 4]]).all()
+
+
+@pytest.mark.parametrize('method', ['nearest', 'mean'])
+def test_merge_empty_source(faam_dataset, method):
+    t0 = int(faam_dataset.variables['Time'][0])
+    empty = _frame_([], CO2=np.array([], dtype=float))
+    df = _frame_([t0+3], CH4=[1.9])
+    faam_dataset.merge([empty, df], method=method)
+    assert np.isnan(faam_dataset.variables['CO2']).all()
+    assert faam_dataset.variables['CH4'][3] == 1.9
+
+
+def test_mask_cache(faam_dataset):
+    from faampy.core.filters import get_mask
+    t0 = int(faam_dataset.variables['Time'][0])
+    before = get_mask(faam_dataset, 'CO_AERO > 1000').copy()
+    faam_dataset.variables['CO_AERO'][5] = 2000.
+    after = get_mask(faam_dataset, 'CO_AERO > 1000')
+    assert not before[5] and after[5]
+    faam_dataset.merge(_frame_([t0+1, t0+2], CH4=[1.9, 2.1]), method='nearest')
+    assert np.flatnonzero(get_mask(faam_dataset, 'CH4 > 2')).tolist() == [2]
+    faam_dataset.merge(_frame_([t0+1, t0+2], CH4=[2.1, 1.9]), method='nearest')
+    assert np.flatnonzero(get_mask(faam_dataset, 'CH4 > 2')).tolist() == [1]
+
+
+def test_coords_simplified():
+    pytest.importorskip('osgeo.ogr')
+    from faampy.core.faam_data import Coords
+    rng = np.random.RandomState(0)
+    n = 3600
+    # straight and level leg at 120 m/s with a few metres of noise, then
+    # a 90 degree turn to the north
+    lon = np.concatenate((np.linspace(-2.0, 4.3, n), np.full(n, 4.3)))
+    lat = np.concatenate((np.full(n, 52.0), np.linspace(52.0, 55.9, n)))
+    alt = 3000.+rng.randn(2*n)*2.
+    lon += rng.randn(2*n)*2e-5
+    lat += rng.randn(2*n)*2e-5
+    coords = Coords(np.column_stack((lon, lat, alt)))
+    xyz = coords.simplified()
+    assert len(xyz) < 20
+    # the corner is kept
+    assert np.min(np.abs(xyz[:, 0]-4.3)+np.abs(xyz[:, 1]-52.0)) < 1e-3
+
+
+@pytest.mark.parametrize('freq', [4, 1, 0.1, 0.3, 2.5])
+def test_resample_time(faam_dataset, freq):
+    data = faam_dataset.resample(['TAT_DI_R', 'CO_AERO'], freq=freq)
+    assert data['Time'].shape == data['TAT_DI_R'].shape
+    assert len(data['Time']) == len(data['CO_AERO'])
+    time = data['Time'].ravel()
+    t0 = faam_dataset.variables['Time'][0]
+    assert time[0] == t0
+    assert np.all(np.diff(time) > 0)
+    if freq < 1:
+        np.testing.assert_allclose(time[1], t0+int(1./freq), atol=1)
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_scan_metadata(core_file, tmp_path, processes):
+    pytest.importorskip('osgeo.ogr')
+    from faampy.core.faam_data import scan_metadata
+    broken = str(tmp_path.joinpath('core_faam_20161201_v004_r0_b992.nc'))
+    with open(broken, 'w') as f:
+        f.write('not a netCDF file')
+    result = scan_metadata([core_file, broken, core_file], processes=processes)
+    assert [md.fid for md in result] == ['b991', 'b991']
+    assert result[0].dimensions['sps32'] == 32
+    assert result[0].variables['TAT_DI_R'].units == '1'
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pyspatialite.dbapi2')
+
+from faampy.core.faam_spatial import from_wkb, to_wkb, _haversine_, _track_distance_
+
+
+def test_wkb_roundtrip():
+    xyz = np.array([[-3., 52., 100.], [-2.5, 52.5, 200.], [-2., 53., np.nan]])
+    np.testing.assert_array_equal(from_wkb(to_wkb(xyz)), xyz)
+
+
+def test_track_distance_between_vertices():
+    # a long straight leg along the equator; the point lies 0.1 deg north
+    # of its middle, far away from both vertices
+    coords = np.array([[-5., 0., 1000.], [5., 0., 1000.]])
+    dist = _track_distance_(coords, 0., 0.1)
+    np.testing.assert_allclose(dist, _haversine_(0., 0., 0., 0.1), rtol=1e-6)
+    assert dist < 12000.
+
+
+def test_track_distance_vertex_and_dateline():
+    coords = np.array([[179., 10.], [179.5, 10.], [-179.5, 10.]])
+    np.testing.assert_allclose(_track_distance_(coords, 179., 10.), 0., atol=1e-6)
+    # the segment crosses the date line
+    dist = _track_distance_(coords, 180., 10.05)
+    np.testing.assert_allclose(dist, _haversine_(180., 10., 180., 10.05), rtol=1e-3)
+    # a single point
+    assert _track_distance_(coords[:1], 179., 10.) == 0.
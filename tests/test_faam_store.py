@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from conftest import make_core
+
+
+@pytest.fixture
+def datasets(core_file, tmp_path):
+    pytest.importorskip('osgeo.ogr')
+    from faampy.core.faam_data import FAAM_Dataset
+    other = make_core(str(tmp_path.joinpath('core_faam_20161201_v004_r0_b992.nc')),
+                      n=300, fid='b992', date='2016-12-01')
+    result = [FAAM_Dataset(core_file), FAAM_Dataset(other)]
+    yield result
+    for ds in result:
+        ds.close()
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'zarr'])
+def test_export_and_read(datasets, tmp_path, fmt):
+    pytest.importorskip({'parquet': 'pyarrow', 'zarr': 'zarr'}[fmt])
+    from faampy.core.faam_store import FAAM_Store, export_dataset
+    path = str(tmp_path.joinpath('store'))
+    for ds in datasets:
+        export_dataset(ds, path, fmt=fmt, varnames=['TAT_DI_R', 'TAT_DI_R_FLAG', 'CO_AERO', 'CO_AERO_FLAG'],
+                       chunk_size=100)
+    store = FAAM_Store(path)
+    assert store.fids == ['b991', 'b992']
+    assert store.var_names == ['CO_AERO', 'CO_AERO_FLAG', 'TAT_DI_R', 'TAT_DI_R_FLAG']
+
+    data = store.read(['TAT_DI_R', 'CO_AERO'])
+    assert sorted(data.keys()) == [1, 32]
+    assert data[32].shape == ((600+300)*32, 2)
+    assert list(data[1].columns) == ['fid', 'CO_AERO']
+    tat = data[32][data[32]['fid'] == 'b991']['TAT_DI_R'].values.reshape((600, 32))
+    expected = np.array(datasets[0].variables['TAT_DI_R'][:], dtype=np.float64)
+    # samples with flag 2 are kept, the default max_flag is 2
+    np.testing.assert_allclose(tat, expected, rtol=1e-6)
+
+    # only the second flight overlaps with the period
+    data = store.read(['CO_AERO'], start='2016-12-01T10:01:00', end='2016-12-01T10:02:00')
+    assert list(data[1]['fid'].unique()) == ['b992']
+    assert data[1].shape[0] == 60
+    assert data[1].index[0] == np.datetime64('2016-12-01T10:01:00')
+
+
+def test_max_flag_and_format(datasets, tmp_path):
+    pytest.importorskip('pyarrow')
+    from faampy.core.faam_store import FAAM_Store, export_dataset
+    path = str(tmp_path.joinpath('store'))
+    export_dataset(datasets[0], path, varnames=['CO_AERO'], max_flag=1)
+    co = FAAM_Store(path).read(['CO_AERO'])[1]['CO_AERO'].values
+    assert np.isnan(co[::97]).all()
+    assert np.isfinite(co[1:97]).all()
+    with pytest.raises(ValueError):
+        export_dataset(datasets[0], path, fmt='zarr')
+    with pytest.raises(IOError):
+        FAAM_Store(str(tmp_path))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from faampy.core.filters import compile_filter, get_mask
+
+
+class _Core(object):
+
+    def __init__(self, **variables):
+        self.variables = variables
+
+
+@pytest.fixture
+def ds():
+    alt = np.array([0., 500., 1500., 2500., -9999., 3500.])
+    wow = np.array([1., 0., 0., 0., 0., 0.])
+    tat = np.array([[250., 260.], [270., 280.], [290., 310.],
+                    [280., 285.], [270., 270.], [240., 255.]])
+    return _Core(ALT_GIN=alt, WOW_IND=wow, TAT_DI_R=tat)
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('ALT_GIN > 1000', [0, 0, 1, 1, 0, 1]),
+    ('ALT_GIN <= 1500', [1, 1, 1, 0, 0, 0]),
+    ('ALT_GIN != 500', [1, 0, 1, 1, 0, 1]),
+    ('WOW_IND == 0', [0, 1, 1, 1, 1, 1]),
+    ('ALT_GIN >= -10 and WOW_IND == 0', [0, 1, 1, 1, 0, 1]),
+    ('ALT_GIN > 3000 or WOW_IND == 1', [1, 0, 0, 0, 0, 1]),
+    ('not ALT_GIN > 1000', [1, 1, 0, 0, 1, 0]),
+    ('(ALT_GIN > 1000) & (ALT_GIN < 3000)', [0, 0, 1, 1, 0, 0]),
+    ('(ALT_GIN < 1000) | (ALT_GIN > 3000)', [1, 1, 0, 0, 0, 1]),
+    ('~(ALT_GIN > 1000)', [1, 1, 0, 0, 1, 0]),
+    ('250 < TAT_DI_R < 300', [0, 1, 0, 1, 1, 0]),
+    ('ALT_GIN > -(100)', [1, 1, 1, 1, 0, 1]),
+    # variables on their own are true if they are not zero
+    ('WOW_IND', [1, 0, 0, 0, 0, 0]),
+    ('not WOW_IND', [0, 1, 1, 1, 1, 1]),
+    ('~WOW_IND', [0, 1, 1, 1, 1, 1]),
+    ('WOW_IND or ALT_GIN > 3000', [1, 0, 0, 0, 0, 1]),
+    ('WOW_IND | (ALT_GIN > 3000)', [1, 0, 0, 0, 0, 1]),
+    ('not WOW_IND and ALT_GIN < 1000', [0, 1, 0, 0, 0, 0]),
+])
+def test_expression(ds, expression, expected):
+    mask = get_mask(ds, expression, cache=False)
+    assert mask.dtype == bool
+    np.testing.assert_array_equal(mask, np.array(expected, dtype=bool))
+
+
+def test_range_list(ds):
+    f = compile_filter([('ALT_GIN', (1000, None)), ('TAT_DI_R', (None, 300))])
+    np.testing.assert_array_equal(f(ds), [0, 0, 0, 1, 0, 1])
+
+
+def test_combined_filters(ds):
+    high = compile_filter('ALT_GIN > 1000')
+    ground = compile_filter(('WOW_IND', (1, 1)))
+    np.testing.assert_array_equal((high | ground)(ds), [1, 0, 1, 1, 0, 1])
+    np.testing.assert_array_equal((high & 'TAT_DI_R > 260')(ds), [0, 0, 1, 1, 0, 0])
+    np.testing.assert_array_equal((~high)(ds), [1, 1, 0, 0, 1, 0])
+    assert set((high & ground).varnames) == set(['ALT_GIN', 'WOW_IND'])
+
+
+def test_mask_cache(ds):
+    mask = get_mask(ds, 'ALT_GIN > 1000')
+    assert get_mask(ds, 'ALT_GIN > 1000') is mask
+    # replaced variables are read again
+    ds.variables['ALT_GIN'] = np.zeros(6)
+    assert not get_mask(ds, 'ALT_GIN > 1000').any()
+    ds.variables['WOW_IND'] = np.zeros(6)
+    assert get_mask(ds, 'ALT_GIN > 1000') is get_mask(ds, 'ALT_GIN > 1000')
+
+
+@pytest.mark.parametrize('expression', ['ALT_GIN + 1 > 2', 'ALT_GIN in [1, 2]',
+                                        'ALT_GIN > "a"', 'ALT_GIN >'])
+def test_invalid_expression(expression):
+    with pytest.raises(ValueError):
+        compile_filter(expression)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from faampy.core.flags import get_flag_masks, get_masked, get_flag_name
+
+
+class _Core(object):
+
+    def __init__(self, **variables):
+        self.variables = variables
+
+
+@pytest.fixture
+def nc(core_file):
+    netCDF4 = pytest.importorskip('netCDF4')
+    ds = netCDF4.Dataset(core_file)
+    yield ds
+    ds.close()
+
+
+def test_flag_masks(nc):
+    masks = get_flag_masks(nc, ['TAT_DI_R', 'IAS_RVSM', 'CO_AERO'], accepted_flags=(0, 1))
+    assert masks['TAT_DI_R'].shape == (600, 32)
+    assert masks['CO_AERO'].shape == (600, 1)
+    # every 97th row has the flag 2
+    expected = np.zeros(600, dtype=bool)
+    expected[::97] = True
+    np.testing.assert_array_equal(masks['TAT_DI_R'][:, 0], expected)
+    np.testing.assert_array_equal(masks['CO_AERO'][:, 0], expected)
+    assert not get_flag_masks(nc, ['TAT_DI_R'])['TAT_DI_R'].any()
+
+
+def test_masked(nc):
+    data = get_masked(nc, ['TAT_DI_R'], accepted_flags=(0, 1), fill='nan', key=slice(0, 100))
+    assert data['TAT_DI_R'].shape == (100, 32)
+    assert np.isnan(data['TAT_DI_R'][[0, 97]]).all()
+    assert np.isfinite(data['TAT_DI_R'][1:97]).all()
+    data = get_masked(nc, ['TAT_DI_R'], accepted_flags=(0, 1))
+    assert data['TAT_DI_R'].mask[::97].all()
+    with pytest.raises(ValueError):
+        get_masked(nc, ['TAT_DI_R'], fill='zero')
+
+
+def test_missing_values_and_low_rate_flags():
+    tat = np.array([[280., 281.], [-9999., 282.], [283., np.nan]])
+    # the flag has only one value per second
+    flag = np.array([[0], [0], [3]], dtype='i1')
+    wow = np.array([1., 0., 0.])
+    ds = _Core(TAT_DI_R=tat, TAT_DI_RFLAG=flag, WOW_IND=wow)
+    assert get_flag_name(ds, 'TAT_DI_R') == 'TAT_DI_RFLAG'
+    assert get_flag_name(ds, 'WOW_IND') is None
+    masks = get_flag_masks(ds, ['TAT_DI_R', 'WOW_IND'], accepted_flags=(0, 1, 2))
+    np.testing.assert_array_equal(masks['TAT_DI_R'], [[0, 0], [1, 0], [1, 1]])
+    assert not masks['WOW_IND'].any()
+    data = get_masked(ds, ['WOW_IND'], fill='nan')
+    # nothing is rejected, the array is not copied
+    assert np.shares_memory(data['WOW_IND'], wow)
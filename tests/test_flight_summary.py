@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pytest
+
+pytest.importorskip('lxml.html')
+
+from faampy.core.flight_summary import Event, FlightSummary
+
+
+KML_NS = '{http://www.opengis.net/kml/2.2}'
+
+
+def _event_(name, coords, stop_time=None):
+    e = Event()
+    e.Name = name
+    e.Start_time = '2016-11-30 10:00:00'
+    e.Stop_time = stop_time
+    e.Coords = coords
+    return e
+
+
+def test_as_kml_skips_broken_entries(tmp_path, capsys):
+    fs = FlightSummary(str(tmp_path.joinpath('missing.txt')))
+    fs.Entries = [_event_('T/O', [-3., 52., 0.]),
+                  # a run without coordinates fails half-way
+                  _event_('Run 1', np.zeros((0, 3)), stop_time='2016-11-30 10:10:00'),
+                  _event_('Run 2', np.array([[-3., 52., 100.], [-2., 53., 100.]]), stop_time='2016-11-30 10:20:00')]
+    kml = fs.as_kml(fid='b991', date='2016-11-30')
+    root = ET.fromstring(kml)
+    names = [p.find('%sname' % KML_NS).text for p in root.iter('%sPlacemark' % KML_NS)]
+    assert names == ['T/O', 'Run 2']
+    assert 'Run 1: can not be converted to kml' in capsys.readouterr().out
+
+    kmz_file = str(tmp_path.joinpath('b991.kmz'))
+    fs.as_kml(ofile=kmz_file, fid='b991', date='2016-11-30')
+    with zipfile.ZipFile(kmz_file) as z:
+        assert ET.fromstring(z.read('doc.kml')).find('.//%sFolder' % KML_NS) is not None
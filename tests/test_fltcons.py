@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from faampy.fltcons.db import DB
+from faampy.fltcons.parser import Parser
+
+
+def _rows_(fid, rev, calo3, tascorr='TASCORR 1.0000'):
+    fname = 'flight-cst_faam_20161130_r%i_%s.txt' % (rev, fid)
+    return [('CALO3', fid, str(rev), '2016-11-30', calo3, fname),
+            ('TASCORR', fid, str(rev), '2016-11-30', tascorr, fname)]
+
+
+def _changes_(db, par):
+    return [(r[2], r[3], r[4], r[5]) for r in db.get_changes(par)]
+
+
+@pytest.fixture
+def db():
+    result = DB(':memory:')
+    result.connect()
+    for i, cal in enumerate(['1.0 0.5', '1.0 0.5', '1.1 0.5', '1.1 0.5', '1.1  0.5 ! comment']):
+        fid = 'b%03i' % (i+1)
+        result.insert_many(_rows_(fid, 0, 'CALO3 %s' % cal), fnames=[_rows_(fid, 0, '')[0][5]])
+    result.refresh_changes()
+    yield result
+    result.disconnect()
+
+
+def test_change_points(db):
+    # whitespace and comments are ignored
+    assert _changes_(db, 'CALO3') == [('b001', 'b002', 2, '1.0 0.5'),
+                                      ('b003', 'b005', 3, '1.1 0.5')]
+    assert _changes_(db, 'TASCORR') == [('b001', 'b005', 5, '1.0000')]
+    assert [r[1] for r in db.get_changes()] == [0, 1, 0]
+    assert db.get_ingested_files() == set(['flight-cst_faam_20161130_r0_b%03i.txt' % i for i in range(1, 6)])
+
+
+def _full_rebuild_(db):
+    incremental = db.get_changes()
+    db.refresh_changes()
+    return incremental, db.get_changes()
+
+
+def test_incremental_refresh(db):
+    assert db.refresh_changes([]) == 0
+    db.insert_many(_rows_('b006', 0, 'CALO3 1.2 0.5'))
+    db.insert_many(_rows_('b007', 0, 'CALO3 1.2 0.5'))
+    db.refresh_changes(['b006', 'b007'])
+    assert _changes_(db, 'CALO3')[-1] == ('b006', 'b007', 2, '1.2 0.5')
+    incremental, full = _full_rebuild_(db)
+    assert incremental == full
+
+
+def test_revision_merges_with_previous_range():
+    db = DB(':memory:')
+    db.connect()
+    for i in range(100, 120):
+        db.insert_many([('CALX', 'b%03i' % i, '0', '2016-11-30', 'CALX %s 2.0' % ('1.0' if i < 110 else '3.0'), 'f%i.txt' % i)])
+    db.refresh_changes()
+    assert len(db.get_changes('CALX')) == 2
+    # the second range is revised back to the calibration of the first one
+    fids = ['b%03i' % i for i in range(110, 120)]
+    for fid in fids:
+        db.insert_many([('CALX', fid, '1', '2016-11-30', 'CALX 1.0 2.0', 'f%s_r1.txt' % fid)])
+    db.refresh_changes(fids)
+    assert _changes_(db, 'CALX') == [('b100', 'b119', 20, '1.0 2.0')]
+    incremental, full = _full_rebuild_(db)
+    assert incremental == full
+    db.disconnect()
+
+
+def test_new_revision_splits_range(db):
+    # a new revision of a flight in the middle of a range
+    db.insert_many(_rows_('b002', 1, 'CALO3 0.9 0.5'), fnames=['flight-cst_faam_20161130_r1_b002.txt'])
+    db.refresh_changes(['b002'])
+    assert _changes_(db, 'CALO3') == [('b001', 'b001', 1, '1.0 0.5'),
+                                      ('b002', 'b002', 1, '0.9 0.5'),
+                                      ('b003', 'b005', 3, '1.1 0.5')]
+    incremental, full = _full_rebuild_(db)
+    assert incremental == full
+
+
+def test_parser(tmp_path):
+    filename = tmp_path.joinpath('flight-cst_faam_20161130_r1_b991.txt')
+    filename.write_text(u'! Flight constants - 30 Nov 2016\nCALO3 1.1 0.5\nTASCORR 0.9950\nUNKNOWN 1\n')
+    result = Parser().parse(str(filename))
+    assert sorted(result.keys()) == ['CALO3', 'TASCORR']
+    assert result['CALO3'] == ('b991', 1, '2016-11-30', 'CALO3 1.1 0.5')
+
+
+def test_parser_netcdf(tmp_path):
+    netCDF4 = pytest.importorskip('netCDF4')
+    filename = str(tmp_path.joinpath('core_faam_20161130_v004_r0_b991.nc'))
+    ds = netCDF4.Dataset(filename, 'w')
+    ds.Flight_Constants = 'CALO3 1.1 0.5\nTASCORR 0.9950\n'
+    ds.close()
+    result = Parser().parse(filename)
+    assert result['TASCORR'] == ('b991', 0, '2099-01-01', 'TASCORR 0.9950')
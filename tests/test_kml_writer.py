@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from faampy.core.kml_writer import KML_Writer, linestring_to_kml, format_coordinates
+
+
+KML_NS = '{http://www.opengis.net/kml/2.2}'
+
+
+def _coordinates_(kml):
+    root = ET.fromstring(kml)
+    txt = root.find('.//%scoordinates' % KML_NS).text
+    return np.array([[float(x) for x in p.split(',')] for p in txt.split()])
+
+
+def test_format_coordinates():
+    xyz = np.array([[-3., 52., 100.], [-2.5, 52.5, 200.]])
+    assert format_coordinates(xyz) == '-3.000000,52.000000,100.000000\n-2.500000,52.500000,200.000000'
+    assert format_coordinates(xyz, fmt='%.1f %.1f %.0f', sep=',') == '-3.0 52.0 100,-2.5 52.5 200'
+    assert format_coordinates(xyz[0]) == '-3.000000,52.000000,100.000000'
+    assert format_coordinates(np.zeros((0, 3))) == ''
+
+
+def test_in_memory_linestring():
+    xyz = np.array([[-3., 52., 100.], [-2.5, 52.5, 200.]])
+    with KML_Writer() as kml:
+        kml.begin_placemark('b991')
+        kml.write_linestring(xyz)
+        kml.end_placemark()
+    np.testing.assert_allclose(_coordinates_(kml.getvalue()), xyz)
+
+
+def test_linestring_step():
+    xyz = np.arange(30, dtype=float).reshape((10, 3))
+    txt = linestring_to_kml(xyz, step=3)
+    assert txt.count('\n', txt.index('<coordinates>'), txt.index('</coordinates>')) == 5
+
+
+def test_kmz_with_extra_file(tmp_path):
+    ofile = str(tmp_path.joinpath('test.kmz'))
+    with KML_Writer(ofile) as kml:
+        kml.write_point([-3., 52., 0.])
+        kml.add_file('files/readme.txt', data=b'hello')
+    with zipfile.ZipFile(ofile) as z:
+        assert sorted(z.namelist()) == ['doc.kml', 'files/readme.txt']
+        ET.fromstring(z.read('doc.kml'))
+
+
+def test_dataset_as_kml(faam_dataset, tmp_path):
+    kml_file = str(tmp_path.joinpath('b991.kml'))
+    kmz_file = str(tmp_path.joinpath('b991.kmz'))
+    faam_dataset.as_kml(ofile=kml_file, simplified=False)
+    faam_dataset.as_kml(ofile=kmz_file)
+    with open(kml_file, 'rb') as f:
+        kml = f.read()
+    root = ET.fromstring(kml)
+    assert root.find('.//%sFolder/%sname' % (KML_NS, KML_NS)).text == 'b991-2016-11-30-Flight-Track'
+    assert _coordinates_(kml).shape[0] == faam_dataset.coords.xyz.shape[0]
+    with zipfile.ZipFile(kmz_file) as z:
+        assert z.namelist() == ['doc.kml']
+        assert _coordinates_(z.read('doc.kml')).shape[1] == 3
+    assert 'Flight-Track' in faam_dataset.as_kml()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from faampy.core.resample import resample_array, resample_flag
+
+
+@pytest.fixture
+def data():
+    return np.arange(4*32, dtype=np.float64).reshape((4, 32))
+
+
+def test_divisor(data):
+    np.testing.assert_allclose(resample_array(data), data.mean(axis=1))
+    result = resample_array(data, freq=4)
+    assert result.shape == (4, 4)
+    np.testing.assert_allclose(result[0], [3.5, 11.5, 19.5, 27.5])
+
+
+def test_n_second_average(data):
+    result = resample_array(data, freq=1/3., how='max')
+    # the last block is padded
+    np.testing.assert_allclose(result, [95., 127.])
+
+
+def test_arbitrary_rate(data):
+    result = resample_array(data, freq=10, how='first')
+    assert result.shape == (4, 10)
+    np.testing.assert_allclose(result[1, :4], [32., 36., 39., 42.])
+    assert resample_array(data, freq=2.5).shape == (10,)
+
+
+def test_missing_and_mask(data):
+    data[0, :16] = -9999.
+    mask = np.zeros(data.shape, dtype=bool)
+    mask[1] = True
+    result = resample_array(data, mask=mask)
+    np.testing.assert_allclose(result[0], data[0, 16:].mean())
+    assert np.isnan(result[1])
+    np.testing.assert_allclose(resample_array(data[:, 20]), data[:, 20])
+    with pytest.raises(ValueError):
+        resample_array(data, how='mode')
+
+
+def test_resample_flag():
+    flag = np.zeros((2, 32), dtype='i1')
+    flag[0, 5] = 2
+    result = resample_flag(flag, freq=2)
+    assert result.dtype == flag.dtype
+    np.testing.assert_array_equal(result, [[2, 0], [0, 0]])
+
+
+def test_core_file(faam_dataset):
+    # a 32Hz variable from the synthetic core file
+    tat = faam_dataset.variables['TAT_DI_R'][:]
+    result = resample_array(tat, freq=1)
+    assert result.shape == (tat.shape[0], )
+    np.testing.assert_allclose(result, np.mean(tat, axis=1), rtol=1e-6)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from faampy._3rdparty import rdp
+from faampy.core.simplify import rdp_mask, segment_distances, local_xyz
+
+
+def test_straight_line():
+    xy = np.array([[1, 1], [2, 2], [3, 3], [4, 4]], dtype=float)
+    np.testing.assert_array_equal(rdp_mask(xy, epsilon=0.1, metric='2d'), [1, 0, 0, 1])
+    assert rdp_mask(np.zeros((0, 2))).size == 0
+
+
+def test_same_as_reference():
+    rng = np.random.RandomState(1)
+    xyz = np.cumsum(rng.randn(500, 3), axis=0)
+    expected = rdp.rdp(xyz, epsilon=1.0, return_mask=True)
+    np.testing.assert_array_equal(rdp_mask(xyz, epsilon=1.0), expected)
+
+
+def test_segment_distances():
+    points = np.array([[0., 1., 5.], [2., -3., 0.]])
+    start, end = np.array([0., 0., 0.]), np.array([4., 0., 0.])
+    np.testing.assert_allclose(segment_distances(points, start, end, metric='2d'), [1., 3.])
+    np.testing.assert_allclose(segment_distances(points, start, end), [np.sqrt(26.), 3.])
+    # one degree of latitude on the sphere
+    d = segment_distances(np.array([[0., 1.]]), np.array([-1., 0.]), np.array([1., 0.]), metric='geodesic')
+    np.testing.assert_allclose(d, [111195.], rtol=1e-4)
+    with pytest.raises(ValueError):
+        segment_distances(points, start, end, metric='4d')
+
+
+def test_geodesic_epsilon_in_metres():
+    lon = np.linspace(-3., -2., 101)
+    lat = np.zeros(101)
+    lat[50] += 0.001   # about 111m
+    lonlat = np.column_stack((lon, lat))
+    assert rdp_mask(lonlat, epsilon=50., metric='geodesic')[50]
+    assert not rdp_mask(lonlat, epsilon=200., metric='geodesic')[50]
+
+
+def test_core_track(faam_dataset):
+    xyz = faam_dataset.coords.xyz
+    mask = rdp_mask(xyz, epsilon=0.01)
+    assert mask[0] and mask[-1]
+    assert 2 < mask.sum() < xyz.shape[0]
+
+
+def test_local_xyz():
+    xyz = local_xyz(np.array([[0., 59.5, 100.], [1., 59.5, 200.], [0.5, 60.5, 300.], [0.5, 60.5, 0.]]))
+    # the projection is centred on latitude 60
+    np.testing.assert_allclose(xyz[1]-xyz[0], [55597., 0., 100.], rtol=1e-3)
+    np.testing.assert_allclose(xyz[2, 1]-xyz[0, 1], 111195., rtol=1e-4)
+    assert local_xyz(np.zeros((0, 3))).shape == (0, 3)
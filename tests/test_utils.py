@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from faampy.core.utils import variables_to_dataframe
+
+
+class _Variable(object):
+    """Array wrapper that records how it was sliced"""
+
+    def __init__(self, data):
+        self.data = data
+        self.shape = data.shape
+        self.keys = []
+
+    def __getitem__(self, key):
+        self.keys.append(key)
+        return self.data[key]
+
+
+def _index_(n):
+    return np.datetime64('2016-11-30T10:00:00')+np.arange(n).astype('timedelta64[s]')
+
+
+def test_variables_to_dataframe_first_column():
+    n = 10
+    tat = _Variable(np.arange(n*32, dtype=float).reshape((n, 32)))
+    co = _Variable(np.arange(n, dtype=float))
+    co.data[3] = -9999.
+    df = variables_to_dataframe({'TAT_DI_R': tat, 'CO_AERO': co}, ['TAT_DI_R', 'CO_AERO'], _index_(n))
+    assert list(df.columns) == ['CO_AERO', 'TAT_DI_R']
+    np.testing.assert_array_equal(df['TAT_DI_R'].values, tat.data[:, 0])
+    assert np.isnan(df['CO_AERO'].values[3])
+    # the 32Hz data are not read completely
+    assert tat.keys == [(slice(None), 0)]
+
+
+def test_variables_to_dataframe_full_rate():
+    n = 10
+    tat = _Variable(np.arange(n*32, dtype=float).reshape((n, 32)))
+    co = _Variable(np.arange(n, dtype=float))
+    result = variables_to_dataframe({'TAT_DI_R': tat, 'CO_AERO': co}, ['TAT_DI_R', 'CO_AERO'],
+                                    _index_(n), full_rate=True)
+    assert sorted(result.keys()) == [1, 32]
+    np.testing.assert_array_equal(result[32]['TAT_DI_R'].values, tat.data.ravel())
+    assert result[32].index[1]-result[32].index[0] == np.timedelta64(31250000, 'ns')
+
+
+def test_core_file_to_dataframe(core_file):
+    netCDF4 = pytest.importorskip('netCDF4')
+    ds = netCDF4.Dataset(core_file)
+    try:
+        n = len(ds.dimensions['Time'])
+        df = variables_to_dataframe(ds.variables, ['TAT_DI_R', 'O3_TECO'], _index_(n))
+        assert df.shape == (n, 2)
+        np.testing.assert_allclose(df['TAT_DI_R'].values, ds.variables['TAT_DI_R'][:, 0])
+    finally:
+        ds.close()